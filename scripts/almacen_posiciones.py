@@ -0,0 +1,319 @@
+import glob
+import json
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from datetime import date
+
+# archivos_yaml y log_diario (que cargan yaml) se importan dentro de AlmacenYAML: así las consultas al índice
+# sqlite no pagan la importación de yaml
+# Campos de la posición y de cada pata que se guardan en columnas propias. Cualquier otro campo se conserva
+# en la columna 'extra' (JSON) para no perder datos al ir y volver del YAML.
+CAMPOS_POSICION = ['id', 'nombre_archivo', 'subyacente', 'estrategia', 'fecha_inicio', 'cantidad_rolls',
+                   'credito_debito_inicial', 'credito_debito_actual', 'beta_delta_inicial', 'delta_inicial',
+                   'theta_inicial', 'vega_inicial', 'ivr_inicial', 'pop_inicial', 'fecha_cierre', 'precio_cierre',
+                   'ganancia_perdida_neta', 'duracion_dias']
+CAMPOS_PATA = ['tipo', 'strike', 'vencimiento', 'cantidad', 'precio_apertura', 'precio_actual', 'fecha_cierre',
+               'precio_cierre', 'accion']
+CAMPOS_PATA_FECHA = ('vencimiento', 'fecha_cierre')
+
+ESQUEMA_POSICIONES = """
+CREATE TABLE IF NOT EXISTS posiciones (
+    id TEXT PRIMARY KEY,
+    nombre_archivo TEXT UNIQUE,
+    subyacente TEXT,
+    estrategia TEXT,
+    fecha_inicio TEXT,
+    cantidad_rolls INTEGER,
+    credito_debito_inicial REAL,
+    credito_debito_actual REAL,
+    beta_delta_inicial REAL,
+    delta_inicial REAL,
+    theta_inicial REAL,
+    vega_inicial REAL,
+    ivr_inicial REAL,
+    pop_inicial REAL,
+    fecha_cierre TEXT,
+    precio_cierre REAL,
+    ganancia_perdida_neta REAL,
+    duracion_dias INTEGER,
+    abierta INTEGER NOT NULL,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_posiciones_subyacente ON posiciones (subyacente);
+CREATE INDEX IF NOT EXISTS idx_posiciones_fecha_inicio ON posiciones (fecha_inicio);
+CREATE INDEX IF NOT EXISTS idx_posiciones_estrategia ON posiciones (estrategia);
+CREATE INDEX IF NOT EXISTS idx_posiciones_abierta ON posiciones (abierta, fecha_inicio);
+CREATE TABLE IF NOT EXISTS patas (
+    posicion_id TEXT NOT NULL REFERENCES posiciones (id) ON DELETE CASCADE,
+    indice INTEGER NOT NULL,
+    tipo TEXT,
+    strike REAL,
+    vencimiento TEXT,
+    cantidad REAL,
+    precio_apertura REAL,
+    precio_actual REAL,
+    fecha_cierre TEXT,
+    precio_cierre REAL,
+    accion TEXT,
+    extra TEXT,
+    PRIMARY KEY (posicion_id, indice)
+);
+CREATE INDEX IF NOT EXISTS idx_patas_vencimiento ON patas (vencimiento);
+CREATE TABLE IF NOT EXISTS log_diario (
+    posicion_id TEXT NOT NULL REFERENCES posiciones (id) ON DELETE CASCADE,
+    fecha TEXT NOT NULL,
+    datos TEXT,
+    PRIMARY KEY (posicion_id, fecha)
+);
+"""
+
+
+class AlmacenPosiciones(ABC):
+    """
+    Interfaz común de los almacenes de posiciones. Las posiciones se manejan con el mismo esquema de
+    diccionario que los archivos YAML de data/yaml/posiciones_activas/.
+    """
+
+    @abstractmethod
+    def guardar(self, nombre_archivo, posicion_data):
+        """
+        Guarda (o reemplaza) una posición. nombre_archivo es el nombre de su archivo YAML.
+        """
+
+    @abstractmethod
+    def cargar(self, id_posicion):
+        """
+        Devuelve la posición completa con ese id, o None.
+        """
+
+    @abstractmethod
+    def cargar_archivo(self, nombre_archivo):
+        """
+        Devuelve la posición completa guardada con ese nombre de archivo YAML, o None.
+        """
+
+    @abstractmethod
+    def buscar(self, subyacente=None, estrategia=None, abierta=None, fecha_desde=None, fecha_hasta=None):
+        """
+        Devuelve las posiciones que cumplen todos los filtros indicados. Las fechas son strings YYYYMMDD y se
+        comparan contra fecha_inicio.
+        """
+
+    def confirmar(self):
+        """
+        Hace persistentes los cambios pendientes (si el almacén los agrupa).
+        """
+
+    def cerrar(self):
+        """
+        Libera los recursos del almacén.
+        """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_excepcion, excepcion, traza):
+        self.cerrar()
+
+
+class AlmacenYAML(AlmacenPosiciones):
+    """
+    Almacén de un archivo YAML por posición (el formato original). Las búsquedas recorren todos los archivos.
+    """
+
+    def __init__(self, carpeta_posiciones="data/yaml/posiciones_activas/"):
+        self.carpeta_posiciones = carpeta_posiciones
+
+    def guardar(self, nombre_archivo, posicion_data):
+        from archivos_yaml import escribir_yaml_atomico
+        escribir_yaml_atomico(os.path.join(self.carpeta_posiciones, nombre_archivo), posicion_data)
+
+    def iterar(self):
+        """
+        Genera tuplas (nombre_archivo, posicion_data) para todos los YAML de la carpeta, con las entradas
+        pendientes de sus diarios ya aplicadas.
+        """
+        from log_diario import cargar_posicion
+        for ruta in sorted(glob.glob(os.path.join(self.carpeta_posiciones, "*.yaml"))):
+            yield os.path.basename(ruta), cargar_posicion(ruta)
+
+    def cargar(self, id_posicion):
+        return next((posicion for _, posicion in self.iterar() if posicion.get('id') == id_posicion), None)
+
+    def cargar_archivo(self, nombre_archivo):
+        from log_diario import cargar_posicion
+        ruta = os.path.join(self.carpeta_posiciones, nombre_archivo)
+        return cargar_posicion(ruta) if os.path.isfile(ruta) else None
+
+    def buscar(self, subyacente=None, estrategia=None, abierta=None, fecha_desde=None, fecha_hasta=None):
+        return [posicion for _, posicion in self.iterar()
+                if _cumple_filtros(posicion, subyacente, estrategia, abierta, fecha_desde, fecha_hasta)]
+
+
+class AlmacenSQLite(AlmacenPosiciones):
+    """
+    Almacén de posiciones en una base sqlite3 con tablas de posiciones, patas y log diario, indexadas por
+    subyacente, fecha de inicio, estrategia y estado abierta/cerrada.
+
+    guardar() no confirma: los cambios se hacen persistentes con confirmar(), para poder agrupar muchas
+    posiciones en una única transacción.
+    """
+
+    def __init__(self, ruta_db="data/posiciones.sqlite"):
+        if os.path.dirname(ruta_db):
+            os.makedirs(os.path.dirname(ruta_db), exist_ok=True)
+        self.conexion = sqlite3.connect(ruta_db)
+        self.conexion.row_factory = sqlite3.Row
+        self.conexion.execute("PRAGMA foreign_keys = ON")
+        self.conexion.executescript(ESQUEMA_POSICIONES)
+
+    def cerrar(self):
+        self.conexion.rollback()
+        self.conexion.close()
+
+    def confirmar(self):
+        self.conexion.commit()
+
+    def guardar(self, nombre_archivo, posicion_data):
+        # Una posición reescrita (mismo archivo o mismo id) reemplaza a la anterior con sus patas y log
+        self.conexion.execute("DELETE FROM posiciones WHERE nombre_archivo = ? OR id = ?",
+                              (nombre_archivo, posicion_data.get('id')))
+
+        fila = dict(posicion_data, nombre_archivo=nombre_archivo)
+        extra = {clave: valor for clave, valor in posicion_data.items()
+                 if clave not in CAMPOS_POSICION and clave not in ('patas', 'log_diario')}
+        valores = [fila.get(campo) for campo in CAMPOS_POSICION]
+        self.conexion.execute(
+            f"INSERT INTO posiciones ({', '.join(CAMPOS_POSICION)}, abierta, extra) "
+            f"VALUES ({', '.join('?' * len(CAMPOS_POSICION))}, ?, ?)",
+            valores + [posicion_data.get('fecha_cierre') is None, _a_json(extra)])
+
+        self.conexion.executemany(
+            f"INSERT INTO patas (posicion_id, indice, {', '.join(CAMPOS_PATA)}, extra) "
+            f"VALUES (?, ?, {', '.join('?' * len(CAMPOS_PATA))}, ?)",
+            [[posicion_data['id'], indice] + [_a_texto_fecha(pata.get(campo)) for campo in CAMPOS_PATA] +
+             [_a_json({clave: valor for clave, valor in pata.items() if clave not in CAMPOS_PATA})]
+             for indice, pata in enumerate(posicion_data.get('patas') or [])])
+
+        self.agregar_log_diario(posicion_data['id'], posicion_data.get('log_diario') or {})
+
+    def agregar_log_diario(self, id_posicion, entradas):
+        """
+        Agrega (o reemplaza) entradas del log diario {fecha: datos} de una posición, sin tocar el resto.
+        """
+        self.conexion.executemany(
+            "INSERT OR REPLACE INTO log_diario (posicion_id, fecha, datos) VALUES (?, ?, ?)",
+            [(id_posicion, str(fecha), _a_json(datos)) for fecha, datos in entradas.items()])
+
+    def cargar(self, id_posicion):
+        fila = self.conexion.execute("SELECT * FROM posiciones WHERE id = ?", (id_posicion,)).fetchone()
+        return self._armar_posicion(fila) if fila else None
+
+    def cargar_archivo(self, nombre_archivo):
+        fila = self.conexion.execute("SELECT * FROM posiciones WHERE nombre_archivo = ?",
+                                     (nombre_archivo,)).fetchone()
+        return self._armar_posicion(fila) if fila else None
+
+    def buscar(self, subyacente=None, estrategia=None, abierta=None, fecha_desde=None, fecha_hasta=None):
+        return [self._armar_posicion(fila)
+                for fila in self._filas(subyacente, estrategia, abierta, fecha_desde, fecha_hasta)]
+
+    def filas(self, subyacente=None, estrategia=None, abierta=None, fecha_desde=None, fecha_hasta=None, limite=None):
+        """
+        Como buscar, pero devuelve solo las columnas de la tabla posiciones (sin patas ni log diario) como
+        diccionarios: alcanza para listar y no arma cada posición.
+        """
+        return [dict(fila) for fila in self._filas(subyacente, estrategia, abierta, fecha_desde, fecha_hasta, limite)]
+
+    def _filas(self, subyacente, estrategia, abierta, fecha_desde, fecha_hasta, limite=None):
+        condiciones, parametros = [], []
+        for condicion, valor in (("subyacente = ?", subyacente), ("estrategia = ?", estrategia),
+                                 ("abierta = ?", abierta), ("fecha_inicio >= ?", fecha_desde),
+                                 ("fecha_inicio <= ?", fecha_hasta)):
+            if valor is not None:
+                condiciones.append(condicion)
+                parametros.append(valor)
+        consulta = "SELECT * FROM posiciones"
+        if condiciones:
+            consulta += " WHERE " + " AND ".join(condiciones)
+        consulta += " ORDER BY fecha_inicio, nombre_archivo"
+        if limite is not None:
+            consulta += " LIMIT ?"
+            parametros.append(int(limite))
+        return self.conexion.execute(consulta, parametros)
+
+    def _armar_posicion(self, fila):
+        """
+        Reconstruye el diccionario de una posición (con el esquema del YAML) a partir de su fila y sus patas.
+        """
+        posicion = {campo: fila[campo] for campo in CAMPOS_POSICION if campo != 'nombre_archivo'}
+        posicion.update(json.loads(fila['extra']) if fila['extra'] else {})
+
+        posicion['patas'] = []
+        for pata_fila in self.conexion.execute("SELECT * FROM patas WHERE posicion_id = ? ORDER BY indice",
+                                               (fila['id'],)):
+            pata = {campo: pata_fila[campo] for campo in CAMPOS_PATA}
+            for campo in CAMPOS_PATA_FECHA:
+                if pata[campo] is not None:
+                    pata[campo] = date.fromisoformat(pata[campo])
+            if pata['cantidad'] is not None and float(pata['cantidad']).is_integer():
+                pata['cantidad'] = int(pata['cantidad'])
+            pata.update(json.loads(pata_fila['extra']) if pata_fila['extra'] else {})
+            posicion['patas'].append(pata)
+
+        posicion['log_diario'] = {
+            fecha: json.loads(datos) if datos else {} for fecha, datos in self.conexion.execute(
+                "SELECT fecha, datos FROM log_diario WHERE posicion_id = ? ORDER BY fecha", (fila['id'],))}
+        return posicion
+
+    def importar_yaml(self, carpeta_posiciones="data/yaml/posiciones_activas/"):
+        """
+        Carga en el almacén todas las posiciones YAML de una carpeta. Devuelve la cantidad importada.
+        """
+        cantidad = 0
+        for nombre_archivo, posicion_data in AlmacenYAML(carpeta_posiciones).iterar():
+            self.guardar(nombre_archivo, posicion_data)
+            cantidad += 1
+        self.confirmar()
+        return cantidad
+
+    def exportar_yaml(self, carpeta_posiciones, abierta=None):
+        """
+        Escribe un YAML por posición (con su nombre de archivo original) en la carpeta indicada.
+        Devuelve la cantidad exportada.
+        """
+        os.makedirs(carpeta_posiciones, exist_ok=True)
+        destino = AlmacenYAML(carpeta_posiciones)
+        consulta = "SELECT * FROM posiciones" + (" WHERE abierta = ?" if abierta is not None else "")
+        filas = self.conexion.execute(consulta, (abierta,) if abierta is not None else ()).fetchall()
+        for fila in filas:
+            # Las posiciones de una cuenta (ver cuentas.AlmacenCuenta) vuelven a su subcarpeta
+            os.makedirs(os.path.dirname(os.path.join(carpeta_posiciones, fila['nombre_archivo'])), exist_ok=True)
+            destino.guardar(fila['nombre_archivo'], self._armar_posicion(fila))
+        return len(filas)
+
+
+def _cumple_filtros(posicion, subyacente, estrategia, abierta, fecha_desde, fecha_hasta):
+    """
+    Evalúa los filtros de AlmacenPosiciones.buscar sobre un diccionario de posición.
+    """
+    return (subyacente is None or posicion.get('subyacente') == subyacente) and \
+        (estrategia is None or posicion.get('estrategia') == estrategia) and \
+        (abierta is None or (posicion.get('fecha_cierre') is None) == bool(abierta)) and \
+        (fecha_desde is None or str(posicion.get('fecha_inicio')) >= fecha_desde) and \
+        (fecha_hasta is None or str(posicion.get('fecha_inicio')) <= fecha_hasta)
+
+
+def _a_texto_fecha(valor):
+    """
+    Convierte fechas a texto ISO para guardarlas en sqlite; el resto de los valores quedan igual.
+    """
+    return valor.isoformat() if isinstance(valor, date) else valor
+
+
+def _a_json(datos):
+    """
+    Serializa un diccionario a JSON, o None si está vacío.
+    """
+    return json.dumps(datos, default=str) if datos else None
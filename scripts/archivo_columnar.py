@@ -0,0 +1,333 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from procesar_actividad import calcular_subyacente_base, leer_csv_actividad
+from registro_ingesta import claves_transacciones, hash_archivo
+
+CARPETA_COLUMNAR = "data/columnar/"
+
+# Columnas del archivo y su tipo en disco. Las de COLUMNAS_CODIFICADAS guardan el código (int32) del valor en su
+# diccionario, -1 si falta. fecha es la hora local del export (sin zona horaria) y precio el Average Price del
+# CSV: por contrato y con signo.
+COLUMNAS = {
+    'fecha': 'datetime64[s]',
+    'vencimiento': 'datetime64[D]',
+    'cantidad': 'int32',
+    'precio': 'float64',
+    'strike': 'float64',
+    'total': 'float64',
+    'orden': 'int64',
+    'simbolo': 'int32',
+    'accion': 'int32',
+    'subyacente': 'int32',
+    'tipo': 'int32',
+    'tipo_instrumento': 'int32',
+}
+COLUMNAS_CODIFICADAS = ('simbolo', 'accion', 'subyacente', 'tipo', 'tipo_instrumento')
+
+ARCHIVO_INDICE = "indice.json"
+
+
+def columnas_transacciones(df):
+    """
+    Convierte filas del CSV de actividad (ver procesar_actividad.leer_csv_actividad) en los arrays de COLUMNAS.
+    Las columnas codificadas quedan como arrays de strings (None si faltan): se codifican al agregarlas al
+    archivo, que es quien tiene los diccionarios.
+
+    Returns:
+        dict: Nombre de columna -> numpy.ndarray, todos del largo de df.
+    """
+    def texto(serie):
+        return serie.astype('object').where(serie.notna(), None).to_numpy()
+
+    return {
+        'fecha': pd.to_datetime(df['Date'].str[:19], format='%Y-%m-%dT%H:%M:%S',
+                                errors='coerce').to_numpy('datetime64[s]'),
+        'vencimiento': pd.to_datetime(df['Expiration Date'], format='%m/%d/%y',
+                                      errors='coerce').to_numpy('datetime64[D]'),
+        'cantidad': df['Quantity'].fillna(0).to_numpy('int32'),
+        'precio': df['Average Price'].to_numpy('float64'),
+        'strike': df['Strike Price'].to_numpy('float64'),
+        'total': df['Total'].to_numpy('float64'),
+        'orden': df['Order #'].fillna(-1).to_numpy('int64'),
+        'simbolo': texto(df['Symbol']),
+        'accion': texto(df['Action']),
+        'subyacente': texto(calcular_subyacente_base(df)),
+        'tipo': texto(df['Call or Put']),
+        'tipo_instrumento': texto(df['Instrument Type']),
+    }
+
+
+class ColectorColumnar:
+    """
+    Envuelve un filtro de transacciones (por ejemplo un FiltroTransacciones) y guarda, convertidas con
+    columnas_transacciones, las filas que deja pasar: así el archivo columnar recibe exactamente las
+    transacciones nuevas que ingirió el pipeline, sin volver a leer el CSV. Sin filtro guarda todas las filas.
+    """
+
+    def __init__(self, filtro=None):
+        self.filtro = filtro
+        self.bloques = []
+
+    def __call__(self, bloque):
+        if self.filtro is not None:
+            bloque = self.filtro(bloque)
+        if not bloque.empty:
+            self.bloques.append(columnas_transacciones(bloque))
+        return bloque
+
+    @property
+    def claves(self):
+        return self.filtro.claves
+
+
+class ArchivoColumnar:
+    """
+    Archivo de todas las transacciones ingeridas, en columnas y solo de agregado.
+
+    Cada columna de COLUMNAS es un array binario crudo de numpy por partición mensual (<carpeta>/AAAA-MM/
+    <columna>.bin), y los símbolos, acciones, subyacentes y tipos se guardan como códigos de un diccionario.
+    indice.json tiene los diccionarios, las filas y el rango de fechas de cada partición y los hashes de los
+    archivos ya agregados. Las lecturas usan np.memmap: un rango de fechas solo abre las particiones que lo
+    tocan y solo se leen las páginas de las columnas que se usan.
+
+    Las filas se agregan primero a los .bin y recién después se reescribe el índice (de forma atómica), que es
+    quien dice cuántas filas vale cada partición: una escritura interrumpida deja a lo sumo bytes sobrantes al
+    final de algún .bin, que se ignoran al leer y se descartan en el siguiente agregado a esa partición.
+    """
+
+    def __init__(self, carpeta=CARPETA_COLUMNAR):
+        self.carpeta = carpeta
+        self.indice = self._leer_indice()
+        # valor -> código de cada diccionario, para codificar sin recorrer las listas
+        self.codigos = {columna: {valor: codigo for codigo, valor in enumerate(valores)}
+                        for columna, valores in self.indice['diccionarios'].items()}
+
+    def _leer_indice(self):
+        try:
+            with open(os.path.join(self.carpeta, ARCHIVO_INDICE), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'particiones': {}, 'diccionarios': {columna: [] for columna in COLUMNAS_CODIFICADAS},
+                    'archivos': []}
+
+    def _escribir_indice(self):
+        ruta = os.path.join(self.carpeta, ARCHIVO_INDICE)
+        with open(ruta + '.tmp', 'w') as f:
+            json.dump(self.indice, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(ruta + '.tmp', ruta)
+
+    def __len__(self):
+        return sum(particion['filas'] for particion in self.indice['particiones'].values())
+
+    def contiene(self, hash_contenido):
+        """
+        Indica si las transacciones del archivo con este hash ya se agregaron.
+        """
+        return hash_contenido in self.indice['archivos']
+
+    def agregar(self, bloques, hash_contenido=None):
+        """
+        Agrega transacciones al archivo. Si se indica el hash del CSV de origen y ya se había agregado, no hace
+        nada (así reintentar la ingesta de un archivo no duplica filas).
+
+        Args:
+            bloques (list): Diccionarios de columnas_transacciones (por ejemplo ColectorColumnar.bloques).
+            hash_contenido (str): Hash del CSV de origen (ver registro_ingesta.hash_archivo).
+
+        Returns:
+            int: Cantidad de filas agregadas.
+        """
+        if hash_contenido is not None and self.contiene(hash_contenido):
+            return 0
+        bloques = [bloque for bloque in bloques if len(bloque['fecha'])]
+        filas = 0
+        if bloques:
+            columnas = {columna: np.concatenate([bloque[columna] for bloque in bloques]) for columna in COLUMNAS}
+            for columna in COLUMNAS_CODIFICADAS:
+                columnas[columna] = self._codificar(columna, columnas[columna])
+            validas = ~np.isnat(columnas['fecha'])
+            meses = columnas['fecha'].astype('datetime64[M]')
+            for mes in np.unique(meses[validas]):
+                seleccion = validas & (meses == mes)
+                filas += self._agregar_particion(str(mes), {columna: valores[seleccion]
+                                                            for columna, valores in columnas.items()})
+        if hash_contenido is not None:
+            self.indice['archivos'].append(hash_contenido)
+        os.makedirs(self.carpeta, exist_ok=True)
+        self._escribir_indice()
+        return filas
+
+    def _codificar(self, columna, valores):
+        """
+        Devuelve los códigos de valores en el diccionario de columna, agregando los valores nuevos.
+        """
+        locales, unicos = pd.factorize(valores)
+        codigos = self.codigos[columna]
+        diccionario = self.indice['diccionarios'][columna]
+        for valor in unicos:
+            if valor not in codigos:
+                codigos[valor] = len(diccionario)
+                diccionario.append(valor)
+        tabla = np.array([codigos[valor] for valor in unicos] + [-1], dtype='int32')
+        # factorize marca los faltantes con -1, que en tabla es el último elemento
+        return tabla[locales]
+
+    def _agregar_particion(self, nombre, columnas):
+        carpeta = os.path.join(self.carpeta, nombre)
+        os.makedirs(carpeta, exist_ok=True)
+        particion = self.indice['particiones'].setdefault(nombre, {'filas': 0, 'desde': None, 'hasta': None})
+        for columna, dtype in COLUMNAS.items():
+            with open(os.path.join(carpeta, columna + '.bin'), 'ab') as f:
+                # Descarta lo que haya quedado de un agregado interrumpido
+                f.truncate(particion['filas'] * np.dtype(dtype).itemsize)
+                f.write(np.ascontiguousarray(columnas[columna], dtype=dtype).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        fechas = columnas['fecha']
+        desde, hasta = str(fechas.min()), str(fechas.max())
+        particion['filas'] += len(fechas)
+        particion['desde'] = min(particion['desde'] or desde, desde)
+        particion['hasta'] = max(particion['hasta'] or hasta, hasta)
+        return len(fechas)
+
+    def particiones(self, desde=None, hasta=None):
+        """
+        Devuelve, en orden cronológico, las particiones con transacciones entre desde y hasta (inclusive).
+        """
+        desde, hasta = _limites(desde, hasta)
+        return sorted(nombre for nombre, particion in self.indice['particiones'].items()
+                      if particion['filas'] and np.datetime64(particion['hasta']) >= desde
+                      and np.datetime64(particion['desde']) < hasta)
+
+    def leer(self, particion, columnas=None):
+        """
+        Abre las columnas de una partición con np.memmap (sin copiarlas a memoria).
+
+        Returns:
+            dict: Nombre de columna -> np.memmap de solo lectura. Las codificadas tienen los códigos.
+        """
+        filas = self.indice['particiones'][particion]['filas']
+        carpeta = os.path.join(self.carpeta, particion)
+        return {columna: np.memmap(os.path.join(carpeta, columna + '.bin'), dtype=COLUMNAS[columna], mode='r',
+                                   shape=(filas,))
+                for columna in (columnas or COLUMNAS)}
+
+    def consultar(self, desde=None, hasta=None, columnas=None, **filtros):
+        """
+        Devuelve las transacciones entre desde y hasta (fechas inclusive) que cumplen los filtros.
+
+        Los filtros se indican por nombre de columna codificada (subyacente='/ES', accion=['BUY_TO_OPEN', ...])
+        y se evalúan sobre los códigos, sin decodificar nada; solo se copian a memoria las filas que cumplen.
+
+        Args:
+            desde, hasta: Fechas (date, datetime o 'YYYY-MM-DD').
+            columnas (list): Columnas a devolver (por defecto, todas).
+
+        Returns:
+            pandas.DataFrame: Una fila por transacción, ordenado por fecha; las columnas codificadas como
+            category.
+        """
+        columnas = list(columnas or COLUMNAS)
+        limite_desde, limite_hasta = _limites(desde, hasta)
+        codigos_filtro = {columna: self._codigos_filtro(columna, valores) for columna, valores in filtros.items()}
+        partes = []
+        for nombre in self.particiones(desde, hasta):
+            datos = self.leer(nombre, set(columnas) | set(filtros) | {'fecha'})
+            particion = self.indice['particiones'][nombre]
+            seleccion = np.ones(particion['filas'], dtype=bool)
+            if np.datetime64(particion['desde']) < limite_desde or np.datetime64(particion['hasta']) >= limite_hasta:
+                seleccion &= (datos['fecha'] >= limite_desde) & (datos['fecha'] < limite_hasta)
+            for columna, codigos in codigos_filtro.items():
+                seleccion &= np.isin(datos[columna], codigos)
+            if seleccion.any():
+                partes.append({columna: datos[columna][seleccion] for columna in columnas})
+
+        resultado = pd.DataFrame({columna: np.concatenate([parte[columna] for parte in partes]) if partes
+                                  else np.empty(0, dtype=COLUMNAS[columna]) for columna in columnas})
+        for columna in COLUMNAS_CODIFICADAS:
+            if columna in resultado:
+                resultado[columna] = pd.Categorical.from_codes(resultado[columna],
+                                                               categories=self.indice['diccionarios'][columna])
+        if 'fecha' in resultado:
+            resultado = resultado.sort_values('fecha', kind='stable', ignore_index=True)
+        return resultado
+
+    def _codigos_filtro(self, columna, valores):
+        if columna not in COLUMNAS_CODIFICADAS:
+            raise ValueError(f"Solo se puede filtrar por columnas codificadas ({', '.join(COLUMNAS_CODIFICADAS)}): "
+                             f"{columna}")
+        valores = [valores] if isinstance(valores, str) else valores
+        return np.array([self.codigos[columna][valor] for valor in valores if valor in self.codigos[columna]],
+                        dtype='int32')
+
+
+def _limites(desde=None, hasta=None):
+    """
+    Convierte un rango de fechas inclusive en [desde, hasta) como datetime64[s].
+    """
+    inicio = np.datetime64(pd.Timestamp(desde).date(), 's') if desde is not None else np.datetime64('0001-01-01', 's')
+    fin = (np.datetime64(pd.Timestamp(hasta).date(), 's') + np.timedelta64(1, 'D') if hasta is not None
+           else np.datetime64('9999-12-31', 's'))
+    return inicio, fin
+
+
+def reconstruir_archivo(rutas_csv, carpeta=CARPETA_COLUMNAR):
+    """
+    Reconstruye el archivo columnar desde cero a partir de CSV de actividad (por ejemplo, los de la carpeta de
+    procesados). Los CSV se recorren en orden de nombre y de cada uno se agregan solo las transacciones que no
+    estaban en uno anterior, igual que en la ingesta. Se arma en una carpeta aparte que reemplaza a la anterior
+    recién al terminar.
+
+    Returns:
+        ArchivoColumnar: El archivo reconstruido.
+    """
+    carpeta = carpeta.rstrip(os.sep)
+    temporal = carpeta + ".nuevo"
+    shutil.rmtree(temporal, ignore_errors=True)
+    archivo = ArchivoColumnar(temporal)
+    vistas = set()
+    for ruta in sorted(rutas_csv):
+        df = leer_csv_actividad(ruta)
+        claves, _ = claves_transacciones(df)
+        nuevas = ~claves.isin(vistas).to_numpy()
+        vistas.update(claves[nuevas])
+        filas = archivo.agregar([columnas_transacciones(df[nuevas])], hash_archivo(ruta))
+        print(f"{os.path.basename(ruta)}: {filas} transacciones")
+
+    anterior = carpeta + ".anterior"
+    if os.path.isdir(carpeta):
+        os.replace(carpeta, anterior)
+    os.replace(temporal, carpeta)
+    shutil.rmtree(anterior, ignore_errors=True)
+    return ArchivoColumnar(carpeta)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consulta o reconstruye el archivo columnar de transacciones.")
+    parser.add_argument('--carpeta', default=CARPETA_COLUMNAR, help="Carpeta del archivo columnar")
+    parser.add_argument('--reconstruir', metavar='CARPETA_CSV', default=None,
+                        help="Reconstruir el archivo desde los CSV de esta carpeta (por ejemplo, la de procesados)")
+    parser.add_argument('--desde', default=None, help="Fecha inicial YYYY-MM-DD")
+    parser.add_argument('--hasta', default=None, help="Fecha final YYYY-MM-DD (inclusive)")
+    parser.add_argument('--subyacente', default=None, help="Subyacente base (SPY, /ES, ...)")
+    parser.add_argument('--accion', default=None, help="Acción (BUY_TO_OPEN, SELL_TO_CLOSE, ...)")
+    argumentos = parser.parse_args()
+
+    if argumentos.reconstruir:
+        archivo = reconstruir_archivo(glob.glob(os.path.join(argumentos.reconstruir, '*.csv')), argumentos.carpeta)
+    else:
+        archivo = ArchivoColumnar(argumentos.carpeta)
+    filtros = {columna: valor for columna, valor in (('subyacente', argumentos.subyacente),
+                                                      ('accion', argumentos.accion)) if valor}
+    transacciones = archivo.consultar(argumentos.desde, argumentos.hasta, **filtros)
+    print(transacciones.to_string(max_rows=20))
+    print(f"{len(transacciones)} de {len(archivo)} transacciones")
@@ -0,0 +1,98 @@
+import os
+import tempfile
+
+import yaml
+
+# libyaml (C) si está disponible; si no, las clases equivalentes en Python puro
+try:
+    from yaml import CSafeDumper as DumperYAML, CSafeLoader as LoaderYAML
+except ImportError:
+    from yaml import SafeDumper as DumperYAML, SafeLoader as LoaderYAML
+
+# mkstemp crea los archivos con permisos 0600: se aplican los permisos por defecto del proceso
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def volcar_yaml(datos):
+    """
+    Serializa datos a un string YAML (mismo formato que yaml.dump(..., default_flow_style=False)).
+    """
+    return yaml.dump(datos, Dumper=DumperYAML, default_flow_style=False)
+
+
+def cargar_yaml(ruta):
+    """
+    Lee un archivo YAML con el loader seguro más rápido disponible.
+    """
+    with open(ruta, 'rb') as archivo_yaml:
+        return yaml.load(archivo_yaml.read(), Loader=LoaderYAML)
+
+
+def escribir_yaml_atomico(ruta, datos, sincronizar=True):
+    """
+    Escribe un archivo YAML de forma atómica: se escribe un temporal en la misma carpeta y se renombra sobre
+    el destino, de modo que nunca queda un YAML a medio escribir.
+    """
+    ruta_temporal = _escribir_temporal(ruta, volcar_yaml(datos), sincronizar)
+    os.replace(ruta_temporal, ruta)
+    if sincronizar:
+        _sincronizar_carpeta(os.path.dirname(ruta))
+
+
+class LoteYAML:
+    """
+    Agrupa escrituras de YAML para confirmarlas juntas: todos los temporales se escriben y se vuelcan a disco
+    (fsync de cada uno), y recién entonces se renombran sobre sus destinos. Cada archivo queda escrito de forma
+    atómica, con una sola sincronización por carpeta al final del lote en lugar de una por archivo.
+    """
+
+    def __init__(self):
+        self.pendientes = []
+
+    def agregar(self, ruta, datos):
+        self.pendientes.append((ruta, volcar_yaml(datos)))
+
+    def confirmar(self):
+        """
+        Escribe todas las rutas pendientes y devuelve la lista de rutas escritas.
+        """
+        # fsync de cada temporal (no os.sync, que vuelca todos los sistemas de archivos de la máquina)
+        temporales = [(_escribir_temporal(ruta, contenido, True), ruta) for ruta, contenido in self.pendientes]
+        for ruta_temporal, ruta in temporales:
+            os.replace(ruta_temporal, ruta)
+        for carpeta in {os.path.dirname(ruta) for _, ruta in temporales}:
+            _sincronizar_carpeta(carpeta)
+
+        self.pendientes = []
+        return [ruta for _, ruta in temporales]
+
+
+def _escribir_temporal(ruta, contenido, sincronizar):
+    """
+    Escribe contenido en un temporal junto a ruta y devuelve la ruta del temporal.
+    """
+    descriptor, ruta_temporal = tempfile.mkstemp(dir=os.path.dirname(ruta) or '.', prefix='.tmp_', suffix='.yaml')
+    try:
+        os.chmod(ruta_temporal, 0o666 & ~_UMASK)
+        with os.fdopen(descriptor, 'w') as archivo_yaml:
+            archivo_yaml.write(contenido)
+            if sincronizar:
+                archivo_yaml.flush()
+                os.fsync(archivo_yaml.fileno())
+    except BaseException:
+        os.unlink(ruta_temporal)
+        raise
+    return ruta_temporal
+
+
+def _sincronizar_carpeta(carpeta):
+    """
+    Vuelca a disco la entrada de directorio (para que los renombres sobrevivan a un corte).
+    """
+    descriptor = os.open(carpeta or '.', os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
@@ -0,0 +1,264 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from almacen_posiciones import AlmacenSQLite
+from archivos_yaml import LoteYAML, cargar_yaml
+from decisiones_calendar import DecisionesCalendar
+from generar_actividad import escribir_actividad_sintetica, leer_tamano
+from procesar_actividad import (leer_csv_actividad, asignar_clusters, _separar_clusters, detectar_candidatos_calendar,
+                                construir_posicion, procesar_archivos_actividad)
+from utils import parse_symbols
+
+# Etapas medidas, en el orden del pipeline de ingesta
+ETAPAS = ['lectura_csv', 'parseo_simbolos', 'asignar_clusters', 'separar_clusters', 'detectar_calendars',
+          'construir_posiciones', 'escritura_yaml', 'lectura_yaml', 'arranque_cli', 'consulta_cli',
+          'ingesta_completa']
+
+# Etapas que ejecutan main.py en un proceso aparte: se mide el tiempo de pared, sin tracemalloc
+ETAPAS_CLI = ('arranque_cli', 'consulta_cli')
+
+RUTA_MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+
+
+def medir(funcion, repeticiones=1, memoria=True):
+    """
+    Ejecuta funcion y mide su duración (la mejor de repeticiones) y, si memoria es True, el pico de memoria
+    asignada durante una ejecución adicional bajo tracemalloc (que es más lenta y no se cuenta en el tiempo).
+
+    Returns:
+        tuple: (resultado de la última ejecución, segundos, pico de memoria en MB o None)
+    """
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        segundos = time.perf_counter() - inicio
+        mejor = segundos if mejor is None else min(mejor, segundos)
+
+    pico_mb = None
+    if memoria:
+        tracemalloc.start()
+        try:
+            funcion()
+            pico_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    return resultado, mejor, pico_mb
+
+
+def ejecutar_cli(*argumentos):
+    """
+    Ejecuta main.py con los argumentos indicados en un intérprete nuevo (el arranque incluye las importaciones)
+    y devuelve las líneas de su salida.
+    """
+    salida = subprocess.run([sys.executable, RUTA_MAIN, *argumentos], capture_output=True, text=True, check=True)
+    return salida.stdout.splitlines()
+
+
+def ejecutar_benchmark(ruta_csv, etapas=None, repeticiones=1, memoria=True, workers=None):
+    """
+    Mide cada etapa de la ingesta sobre un CSV de actividad.
+
+    Las etapas intermedias se encadenan (cada una recibe el resultado de la anterior) y 'ingesta_completa'
+    ejecuta procesar_archivos_actividad de punta a punta sobre una copia del archivo en una carpeta temporal,
+    con registro de ingesta propio y los Calendars rechazados sin preguntar. 'lectura_yaml' vuelve a cargar los
+    YAML escritos en 'escritura_yaml'. 'arranque_cli' mide main.py --help y 'consulta_cli' un listado contra un
+    índice sqlite con las posiciones escritas en 'escritura_yaml', los dos en un proceso nuevo para contar el
+    arranque del intérprete y las importaciones.
+
+    Args:
+        ruta_csv (str): CSV de actividad a procesar.
+        etapas (list): Etapas de ETAPAS a medir (por defecto, todas).
+        repeticiones (int): Ejecuciones por etapa; se informa la más rápida.
+        memoria (bool): Si es True, mide también el pico de memoria de cada etapa con tracemalloc.
+        workers (int): Procesos para la ingesta completa (None = en serie).
+
+    Returns:
+        dict: Resultados con metadatos del entorno y, por etapa, segundos, filas por segundo y pico de memoria.
+    """
+    etapas = etapas or ETAPAS
+    resultados = {}
+    carpeta_temporal = tempfile.mkdtemp(prefix='benchmark_')
+    decisiones = DecisionesCalendar('rechazar')
+
+    def registrar(etapa, funcion, filas=None):
+        if etapa not in etapas:
+            return funcion()
+        resultado, segundos, pico_mb = medir(funcion, repeticiones, memoria and etapa not in ETAPAS_CLI)
+        filas = len(resultado) if filas is None else filas
+        resultados[etapa] = {
+            'segundos': segundos,
+            'filas': filas,
+            'filas_por_segundo': filas / segundos if segundos else None,
+            'pico_memoria_mb': pico_mb,
+        }
+        print(f"{etapa:<22} {segundos:10.3f} s {resultados[etapa]['filas_por_segundo'] or 0:14,.0f} filas/s" +
+              (f" {pico_mb:10.1f} MB" if pico_mb is not None else ""))
+        return resultado
+
+    try:
+        df = registrar('lectura_csv', lambda: leer_csv_actividad(ruta_csv))
+        filas = len(df)
+
+        registrar('parseo_simbolos', lambda: parse_symbols(df['Symbol']), filas)
+        clusters = registrar('asignar_clusters', lambda: asignar_clusters(df), filas)
+        trades = registrar('separar_clusters', lambda: _separar_clusters(clusters), len(clusters))
+        registrar('detectar_calendars', lambda: detectar_candidatos_calendar(clusters), len(clusters))
+        posiciones = registrar('construir_posiciones',
+                               lambda: [construir_posicion(patas[0]['Subyacente Base'], patas)
+                                        for patas in trades.values()], len(clusters))
+
+        carpeta_yaml = os.path.join(carpeta_temporal, 'yaml')
+        os.makedirs(carpeta_yaml)
+
+        def escribir_yaml():
+            lote = LoteYAML()
+            for nombre_archivo, posicion_data in filter(None, posiciones):
+                lote.agregar(os.path.join(carpeta_yaml, nombre_archivo), posicion_data.a_yaml())
+            return lote.confirmar()
+
+        rutas_yaml = registrar('escritura_yaml', escribir_yaml, len(clusters))
+        if 'lectura_yaml' in etapas:
+            registrar('lectura_yaml', lambda: [cargar_yaml(ruta) for ruta in rutas_yaml])
+
+        registrar('arranque_cli', lambda: ejecutar_cli('--help'), 1)
+        if 'consulta_cli' in etapas:
+            ruta_indice = os.path.join(carpeta_temporal, 'posiciones.sqlite')
+            if 'escritura_yaml' not in etapas:
+                escribir_yaml()
+            with AlmacenSQLite(ruta_indice) as almacen:
+                almacen.importar_yaml(carpeta_yaml)
+            registrar('consulta_cli', lambda: ejecutar_cli('--indice', ruta_indice, 'listar', '--abiertas',
+                                                           '--limite', '100'), 1)
+
+        def ingesta_completa():
+            carpeta = tempfile.mkdtemp(dir=carpeta_temporal)
+            for subcarpeta in ('csv', 'procesados', 'posiciones'):
+                os.makedirs(os.path.join(carpeta, subcarpeta))
+            shutil.copy(ruta_csv, os.path.join(carpeta, 'csv'))
+            with contextlib.redirect_stdout(io.StringIO()):
+                procesar_archivos_actividad(os.path.join(carpeta, 'csv'), os.path.join(carpeta, 'procesados'),
+                                            os.path.join(carpeta, 'posiciones'),
+                                            archivo_procesados=os.path.join(carpeta, 'procesados.txt'),
+                                            archivo_registro=os.path.join(carpeta, 'registro.sqlite'),
+                                            workers=workers, decisiones_calendar=decisiones)
+
+        registrar('ingesta_completa', ingesta_completa, filas)
+    finally:
+        shutil.rmtree(carpeta_temporal, ignore_errors=True)
+
+    return {
+        'commit': version_git(),
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'archivo': os.path.basename(ruta_csv),
+        'filas': filas,
+        'repeticiones': repeticiones,
+        'workers': workers,
+        'entorno': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'etapas': resultados,
+    }
+
+
+def version_git():
+    """
+    Devuelve el commit actual (con sufijo -dirty si hay cambios sin confirmar), o None fuera de un repo git.
+    """
+    try:
+        salida = subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return salida.stdout.strip()
+
+
+def guardar_resultados(resultados, carpeta="data/benchmarks", etiqueta=None):
+    """
+    Guarda los resultados como JSON, un archivo por commit y tamaño, para compararlos entre versiones.
+
+    Returns:
+        str: Ruta del JSON escrito.
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    etiqueta = etiqueta or f"{resultados['filas']}filas"
+    ruta = os.path.join(carpeta, f"{resultados['commit'] or 'sin_git'}_{etiqueta}.json")
+    with open(ruta, 'w') as f:
+        json.dump(resultados, f, indent=2)
+    return ruta
+
+
+def comparar_resultados(anterior, actual):
+    """
+    Compara dos resultados de ejecutar_benchmark (o rutas a sus JSON) etapa por etapa.
+
+    Returns:
+        dict: {etapa: cociente de segundos actual / anterior}; menos de 1 es una mejora.
+    """
+    if isinstance(anterior, str):
+        with open(anterior, 'r') as f:
+            anterior = json.load(f)
+    if isinstance(actual, str):
+        with open(actual, 'r') as f:
+            actual = json.load(f)
+
+    print(f"Comparación {anterior.get('commit')} -> {actual.get('commit')}")
+    cocientes = {}
+    for etapa in ETAPAS:
+        if etapa not in anterior['etapas'] or etapa not in actual['etapas']:
+            continue
+        cociente = actual['etapas'][etapa]['segundos'] / anterior['etapas'][etapa]['segundos']
+        cocientes[etapa] = cociente
+        print(f"{etapa:<22} {anterior['etapas'][etapa]['segundos']:10.3f} s -> "
+              f"{actual['etapas'][etapa]['segundos']:10.3f} s  x{cociente:.2f}")
+    return cocientes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mide las etapas de la ingesta sobre actividad sintética o real.")
+    parser.add_argument('--filas', default='100k', help="Tamaño del archivo sintético: 1k, 100k, 1M o un número")
+    parser.add_argument('--archivo', default=None, help="CSV de actividad a medir (en lugar de uno sintético)")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla del archivo sintético")
+    parser.add_argument('--etapas', nargs='+', choices=ETAPAS, default=None, help="Etapas a medir")
+    parser.add_argument('--repeticiones', type=int, default=1, help="Ejecuciones por etapa (se toma la mejor)")
+    parser.add_argument('--sin-memoria', action='store_true', help="No medir el pico de memoria")
+    parser.add_argument('--workers', type=int, default=None, help="Procesos para la ingesta completa")
+    parser.add_argument('--resultados', default="data/benchmarks", help="Carpeta de los JSON de resultados")
+    parser.add_argument('--comparar', default=None, help="JSON de un benchmark anterior para comparar")
+    argumentos = parser.parse_args()
+
+    ruta_csv = argumentos.archivo
+    carpeta_sintetica = None
+    if ruta_csv is None:
+        carpeta_sintetica = tempfile.mkdtemp(prefix='actividad_')
+        ruta_csv = escribir_actividad_sintetica(os.path.join(carpeta_sintetica, 'actividad.csv'),
+                                                leer_tamano(argumentos.filas), argumentos.semilla)
+    try:
+        resultados = ejecutar_benchmark(ruta_csv, argumentos.etapas, argumentos.repeticiones,
+                                        not argumentos.sin_memoria, argumentos.workers)
+    finally:
+        if carpeta_sintetica:
+            shutil.rmtree(carpeta_sintetica, ignore_errors=True)
+
+    etiqueta = argumentos.filas if argumentos.archivo is None else os.path.splitext(os.path.basename(ruta_csv))[0]
+    print(f"Resultados guardados en: {guardar_resultados(resultados, argumentos.resultados, etiqueta)}")
+    if argumentos.comparar:
+        comparar_resultados(argumentos.comparar, resultados)
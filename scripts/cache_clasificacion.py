@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import sqlite3
+import types
+from functools import partial
+
+from clasificador import REGLAS, Firma, calcular_firma, clasificar_firma
+
+ARCHIVO_CACHE = "data/cache/clasificacion.sqlite"
+
+ESQUEMA_CACHE = """
+CREATE TABLE IF NOT EXISTS clasificaciones (
+    version TEXT NOT NULL,
+    firma TEXT NOT NULL,
+    estrategia TEXT NOT NULL,
+    PRIMARY KEY (version, firma)
+) WITHOUT ROWID;
+"""
+
+
+def version_reglas(reglas=None):
+    """
+    Calcula la versión de las reglas de clasificación: un hash del nombre y el bytecode (con sus constantes,
+    argumentos fijos y las funciones del módulo que llama) de cada predicado de la tabla, en orden, y del código
+    que arma la firma. Cualquier cambio de una regla, de su orden o de calcular_firma da otra versión; también
+    un cambio de versión de Python, que cambia el bytecode.
+
+    Args:
+        reglas (list): Tabla de reglas (por defecto, REGLAS con las reglas registradas hasta ahora).
+
+    Returns:
+        str: La versión, como hexadecimal.
+    """
+    sha = hashlib.sha256()
+    vistos = set()
+    _actualizar_huella(sha, calcular_firma, vistos)
+    for estrategia, predicado in (REGLAS if reglas is None else reglas):
+        sha.update(estrategia.encode())
+        _actualizar_huella(sha, predicado, vistos)
+    return sha.hexdigest()[:16]
+
+
+def _actualizar_huella(sha, funcion, vistos):
+    """
+    Agrega a sha la huella de una función (o functools.partial) y de las funciones Python que usa.
+    """
+    if isinstance(funcion, partial):
+        sha.update(repr((funcion.args, sorted(funcion.keywords.items()))).encode())
+        _actualizar_huella(sha, funcion.func, vistos)
+        return
+    codigo = getattr(funcion, '__code__', None)
+    if codigo is None:
+        sha.update(getattr(funcion, '__qualname__', repr(funcion)).encode())
+        return
+    if codigo in vistos:
+        return
+    vistos.add(codigo)
+    _actualizar_huella_codigo(sha, codigo)
+    for celda in funcion.__closure__ or ():
+        valor = celda.cell_contents
+        if callable(valor):
+            _actualizar_huella(sha, valor, vistos)
+        else:
+            sha.update(repr(valor).encode())
+    for nombre in codigo.co_names:
+        valor = funcion.__globals__.get(nombre)
+        if isinstance(valor, (types.FunctionType, partial)):
+            _actualizar_huella(sha, valor, vistos)
+
+
+def _actualizar_huella_codigo(sha, codigo):
+    sha.update(codigo.co_code)
+    sha.update(repr(codigo.co_names).encode())
+    for constante in codigo.co_consts:
+        if isinstance(constante, types.CodeType):
+            _actualizar_huella_codigo(sha, constante)
+        else:
+            sha.update(repr(constante).encode())
+
+
+def clave_firma(firma):
+    """
+    Serializa una Firma (que no depende de precios ni cantidades absolutas) como clave del cache.
+    """
+    return json.dumps(firma, separators=(',', ':'), default=lambda valor: valor.item())
+
+
+def firma_de_clave(clave):
+    """
+    Inversa de clave_firma.
+    """
+    return Firma(*(tuple(campo) if isinstance(campo, list) else campo for campo in json.loads(clave)))
+
+
+class CacheClasificacion:
+    """
+    Cache persistente (sqlite3) de la estrategia de cada firma canónica de patas (ver clasificador.Firma).
+
+    Las filas se guardan con la versión de las reglas (ver version_reglas): al abrir el cache se descartan las
+    de otras versiones, así un cambio de reglas lo invalida solo. Las clasificaciones ya conocidas se cargan a
+    memoria al abrirlo, en un diccionario indexado por la Firma misma (buscar ahí es más barato que evaluar las
+    reglas; serializar la firma en cada búsqueda no lo sería); las nuevas se calculan con
+    clasificador.clasificar_firma y se escriben al confirmar.
+    """
+
+    def __init__(self, ruta=ARCHIVO_CACHE, version=None):
+        if os.path.dirname(ruta):
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        self.ruta = ruta
+        self.version = version_reglas() if version is None else version
+        # Sin check_same_thread: el vigilante lo abre en el hilo principal y lo usa en el de ingesta (nunca en
+        # dos hilos a la vez)
+        self.conexion = sqlite3.connect(ruta, timeout=30, check_same_thread=False)
+        self.conexion.executescript(ESQUEMA_CACHE)
+        self.conexion.execute("DELETE FROM clasificaciones WHERE version != ?", (self.version,))
+        self.conexion.commit()
+        self.estrategias = {firma_de_clave(clave): estrategia for clave, estrategia in self.conexion.execute(
+            "SELECT firma, estrategia FROM clasificaciones WHERE version = ?", (self.version,))}
+        self.nuevas = {}
+        self.aciertos = 0
+        self.calculadas = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_excepcion, excepcion, traza):
+        self.cerrar()
+
+    def cerrar(self):
+        """
+        Guarda las clasificaciones nuevas y cierra la conexión.
+        """
+        self.confirmar()
+        self.conexion.close()
+
+    def clasificar_firma(self, firma):
+        """
+        Devuelve la estrategia de la firma, del cache si ya se conoce.
+        """
+        estrategia = self.estrategias.get(firma)
+        if estrategia is not None:
+            self.aciertos += 1
+            return estrategia
+        estrategia = clasificar_firma(firma)
+        self.calculadas += 1
+        self.estrategias[firma] = self.nuevas[firma] = estrategia
+        return estrategia
+
+    def clasificar_patas(self, patas, total=0.0):
+        """
+        Como clasificador.clasificar_patas, pero con el cache.
+        """
+        return self.clasificar_firma(calcular_firma(patas, total))
+
+    def confirmar(self):
+        """
+        Escribe las clasificaciones calculadas desde la última confirmación.
+        """
+        if not self.nuevas:
+            return
+        self.conexion.executemany("INSERT OR IGNORE INTO clasificaciones (version, firma, estrategia) "
+                                  "VALUES (?, ?, ?)",
+                                  ((self.version, clave_firma(firma), estrategia)
+                                   for firma, estrategia in self.nuevas.items()))
+        self.conexion.commit()
+        self.nuevas = {}
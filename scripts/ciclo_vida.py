@@ -0,0 +1,265 @@
+import glob
+import os
+from datetime import datetime
+
+from archivos_yaml import LoteYAML
+from log_diario import cargar_posicion, ruta_diario
+from utils import construir_pata
+
+
+def es_trade_de_cierre(trade_data):
+    """
+    Indica si alguna pata del trade cierra contratos (BUY_TO_CLOSE / SELL_TO_CLOSE).
+    """
+    return any(str(pata_data['Action']).upper().endswith('TO_CLOSE') for pata_data in trade_data)
+
+
+def clave_pata(subyacente, pata):
+    """
+    Clave del índice de patas abiertas: (subyacente base, vencimiento, strike, tipo).
+    """
+    return (subyacente, pata['vencimiento'], float(pata['strike']), pata['tipo'])
+
+
+class CicloVida:
+    """
+    Motor de ciclo de vida de las posiciones: asocia los cierres y rolls con las posiciones abiertas.
+
+    Mantiene en memoria un índice de las patas abiertas de todas las posiciones activas, con clave
+    (subyacente, vencimiento, strike, tipo), de modo que cada ejecución de cierre se asocia en O(1) en lugar de
+    recorrer posiciones_activas. Un proceso que lo mantiene entre ingestas (ver vigilante.py) lo pone al día con
+    refrescar(). Dentro de cada clave se prefieren las posiciones en las que coinciden más patas
+    del mismo trade y, a igualdad, las abiertas antes (FIFO).
+
+    Un cierre parcial parte la pata: la parte cerrada queda como una pata nueva con fecha_cierre y
+    precio_cierre, y la original sigue abierta con el resto. Un trade que cierra patas de una posición y además
+    abre otras es un roll: las patas nuevas se suman a esa posición y se incrementa cantidad_rolls. Cuando una
+    posición no tiene más patas abiertas se completan fecha_cierre, precio_cierre (el total del trade que la
+    cierra), ganancia_perdida_neta (el flujo neto de todos sus trades) y duracion_dias, y al confirmar se mueve
+    a carpeta_cerradas.
+    """
+
+    def __init__(self, carpeta_activas="data/yaml/posiciones_activas/",
+                 carpeta_cerradas="data/yaml/posiciones_cerradas/"):
+        self.carpeta_activas = carpeta_activas
+        self.carpeta_cerradas = carpeta_cerradas
+        self.posiciones = {}
+        self.indice = {}
+        self.modificadas = set()
+        self.cerradas = set()
+        # Firma en disco (mtime del YAML y de su diario) de cada posición cargada; None = tomar la próxima
+        self.firmas = {}
+        for ruta in sorted(glob.glob(os.path.join(carpeta_activas, '*.yaml'))):
+            self.firmas[ruta] = _firma_en_disco(ruta)
+            self.registrar(ruta, cargar_posicion(ruta))
+
+    def refrescar(self):
+        """
+        Pone el índice al día con la carpeta de posiciones activas: recarga las posiciones cuyo YAML o diario
+        cambió desde que se cargaron (por ejemplo, por actualizar_griegas), agrega las nuevas y quita las que ya
+        no están.
+
+        Returns:
+            int: Cantidad de posiciones recargadas, agregadas o quitadas.
+        """
+        rutas = set(glob.glob(os.path.join(self.carpeta_activas, '*.yaml')))
+        cambios = 0
+        for ruta in sorted(set(self.posiciones) - rutas):
+            self._quitar_del_indice(ruta)
+            del self.posiciones[ruta]
+            self.firmas.pop(ruta, None)
+            cambios += 1
+        for ruta in sorted(rutas):
+            firma = _firma_en_disco(ruta)
+            if ruta in self.posiciones and self.firmas.get(ruta) in (None, firma):
+                # Las escritas por este mismo índice adoptan la firma que quedó en disco
+                self.firmas[ruta] = firma
+                continue
+            self.firmas[ruta] = firma
+            self.registrar(ruta, cargar_posicion(ruta))
+            cambios += 1
+        return cambios
+
+    def registrar(self, ruta, posicion_data):
+        """
+        Agrega al índice las patas abiertas de una posición (reemplaza a la que tuviera la misma ruta).
+        """
+        if ruta in self.posiciones:
+            self._quitar_del_indice(ruta)
+        self.posiciones[ruta] = posicion_data
+        self.firmas.setdefault(ruta, None)
+        for pata in posicion_data.get('patas') or []:
+            if pata.get('fecha_cierre') is None:
+                self.indice.setdefault(clave_pata(posicion_data['subyacente'], pata), []).append((ruta, pata))
+
+    def _quitar_del_indice(self, ruta):
+        for pata in self.posiciones[ruta].get('patas') or []:
+            clave = clave_pata(self.posiciones[ruta]['subyacente'], pata)
+            if clave in self.indice:
+                self.indice[clave] = [entrada for entrada in self.indice[clave] if entrada[0] != ruta]
+
+    def aplicar(self, trade_data, metricas=None):
+        """
+        Aplica un trade con patas de cierre a las posiciones abiertas.
+
+        Args:
+            trade_data (list): Filas del trade (como las devuelve agrupar_trades).
+            metricas (Metricas): Si se indica, cuenta patas cerradas, rolls, posiciones cerradas y contratos de
+                cierre que no coinciden con ninguna pata abierta.
+
+        Returns:
+            list: Las filas de apertura del trade que no se pudieron asociar a una posición (un roll de algo que
+            no está en el índice); con ellas se puede crear una posición nueva.
+        """
+        subyacente = trade_data[0]['Subyacente Base']
+        fecha = trade_data[0]['Date'].split('T')[0].replace('-', '')
+        totales = {}
+        aperturas = []
+
+        cierres = []
+        for pata_data in trade_data:
+            if not str(pata_data['Action']).upper().endswith('TO_CLOSE'):
+                aperturas.append(pata_data)
+                continue
+            pata_cierre = construir_pata(pata_data)
+            if pata_cierre is not None:
+                cierres.append((pata_data, pata_cierre, clave_pata(subyacente, pata_cierre)))
+
+        # Se prefieren las posiciones en las que más patas del trade coinciden (con el mismo lado y, mejor aún, la
+        # misma cantidad: el cierre de un spread completo va a su spread) y, a igualdad, las abiertas antes (el
+        # nombre del YAML empieza con el subyacente y la fecha y hora de apertura); nunca una abierta después
+        coincidencias = {}
+        for _, pata_cierre, clave in cierres:
+            for ruta, pata in self.indice.get(clave, []):
+                if (pata['cantidad'] < 0) == (pata_cierre['cantidad'] > 0):
+                    puntos = 2 if abs(pata['cantidad']) == abs(pata_cierre['cantidad']) else 1
+                    coincidencias[ruta] = coincidencias.get(ruta, 0) + puntos
+        prioridad = lambda entrada: (-coincidencias.get(entrada[0], 0), os.path.basename(entrada[0]))
+
+        for pata_data, pata_cierre, clave in cierres:
+            contratos = abs(pata_cierre['cantidad'])
+            pendiente = contratos
+            # BUY_TO_CLOSE cierra patas vendidas (cantidad negativa) y SELL_TO_CLOSE, patas compradas
+            cierra_vendidas = pata_cierre['cantidad'] > 0
+            for ruta, pata in sorted(self.indice.get(clave, []), key=prioridad):
+                if pendiente <= 0:
+                    break
+                if (pata['cantidad'] < 0) != cierra_vendidas or str(self.posiciones[ruta]['fecha_inicio']) > fecha:
+                    continue
+                cantidad = min(pendiente, abs(pata['cantidad']))
+                total = pata_data['Total'] * cantidad / contratos
+                self._cerrar_pata(ruta, pata, cantidad, fecha, pata_data['Average Price'], total)
+                totales[ruta] = totales.get(ruta, 0.0) + total
+                pendiente -= cantidad
+                if metricas is not None:
+                    metricas.contar('patas_cerradas')
+            if pendiente and metricas is not None:
+                metricas.contar('contratos_cierre_sin_posicion', pendiente)
+
+        if aperturas and totales:
+            # Roll: las patas nuevas pasan a la primera posición afectada
+            ruta = next(iter(totales))
+            self._agregar_roll(ruta, aperturas)
+            totales[ruta] += sum(pata_data['Total'] for pata_data in aperturas)
+            aperturas = []
+            if metricas is not None:
+                metricas.contar('rolls')
+
+        for ruta, total in totales.items():
+            posicion_data = self.posiciones[ruta]
+            if any(pata.get('fecha_cierre') is None for pata in posicion_data['patas']):
+                continue
+            posicion_data['fecha_cierre'] = fecha
+            posicion_data['precio_cierre'] = total
+            posicion_data['ganancia_perdida_neta'] = posicion_data['credito_debito_actual']
+            posicion_data['duracion_dias'] = (datetime.strptime(fecha, '%Y%m%d') -
+                                              datetime.strptime(str(posicion_data['fecha_inicio']), '%Y%m%d')).days
+            self.cerradas.add(ruta)
+            if metricas is not None:
+                metricas.contar('posiciones_cerradas')
+
+        return aperturas
+
+    def _cerrar_pata(self, ruta, pata, cantidad, fecha, precio, total):
+        """
+        Cierra cantidad contratos de una pata abierta (partiéndola si el cierre es parcial).
+        """
+        posicion_data = self.posiciones[ruta]
+        signo = 1 if pata['cantidad'] > 0 else -1
+        if cantidad < abs(pata['cantidad']):
+            cerrada = dict(pata, cantidad=signo * cantidad)
+            pata['cantidad'] -= signo * cantidad
+            posicion_data['patas'].append(cerrada)
+        else:
+            cerrada = pata
+            clave = clave_pata(posicion_data['subyacente'], pata)
+            self.indice[clave] = [entrada for entrada in self.indice[clave] if entrada[1] is not pata]
+        cerrada['fecha_cierre'] = fecha
+        cerrada['precio_cierre'] = precio
+        posicion_data['credito_debito_actual'] = (posicion_data.get('credito_debito_actual') or 0.0) + total
+        self.modificadas.add(ruta)
+
+    def _agregar_roll(self, ruta, aperturas):
+        """
+        Suma a una posición las patas abiertas por un roll.
+        """
+        posicion_data = self.posiciones[ruta]
+        for pata_data in aperturas:
+            pata = construir_pata(pata_data)
+            if pata is None:
+                continue
+            pata = pata.a_dict()
+            posicion_data['patas'].append(pata)
+            posicion_data['credito_debito_actual'] = (posicion_data.get('credito_debito_actual') or 0.0) + \
+                pata_data['Total']
+            self.indice.setdefault(clave_pata(posicion_data['subyacente'], pata), []).append((ruta, pata))
+        posicion_data['cantidad_rolls'] = (posicion_data.get('cantidad_rolls') or 0) + 1
+        self.modificadas.add(ruta)
+
+    def confirmar(self):
+        """
+        Escribe las posiciones modificadas: las abiertas se reescriben en su lugar y las cerradas se escriben en
+        carpeta_cerradas y recién entonces se quitan de las activas. Los diarios (ya incluidos en el YAML al
+        cargar la posición) se borran.
+
+        Returns:
+            list: Tuplas (nombre_archivo_yaml, posicion_data) de todas las posiciones modificadas.
+        """
+        lote = LoteYAML()
+        for ruta in sorted(self.modificadas - self.cerradas):
+            lote.agregar(ruta, self.posiciones[ruta])
+        if self.cerradas:
+            os.makedirs(self.carpeta_cerradas, exist_ok=True)
+        for ruta in sorted(self.cerradas):
+            lote.agregar(os.path.join(self.carpeta_cerradas, os.path.basename(ruta)), self.posiciones[ruta])
+        lote.confirmar()
+
+        for ruta in sorted(self.modificadas):
+            for archivo in ([ruta, ruta_diario(ruta)] if ruta in self.cerradas else [ruta_diario(ruta)]):
+                try:
+                    os.remove(archivo)
+                except FileNotFoundError:
+                    pass
+            if ruta in self.cerradas:
+                print(f"Posición cerrada: {os.path.join(self.carpeta_cerradas, os.path.basename(ruta))}")
+
+        actualizadas = [(os.path.basename(ruta), self.posiciones[ruta]) for ruta in sorted(self.modificadas)]
+        for ruta in self.modificadas:
+            self.firmas[ruta] = None
+        for ruta in self.cerradas:
+            del self.posiciones[ruta]
+            del self.firmas[ruta]
+        self.modificadas = set()
+        self.cerradas = set()
+        return actualizadas
+
+
+def _firma_en_disco(ruta):
+    """
+    Devuelve (mtime del YAML, mtime del diario o None) de una posición, para detectar cambios hechos por otros.
+    """
+    try:
+        diario = os.stat(ruta_diario(ruta)).st_mtime_ns
+    except FileNotFoundError:
+        diario = None
+    return os.stat(ruta).st_mtime_ns, diario
@@ -0,0 +1,226 @@
+from collections import namedtuple
+from functools import partial
+from math import gcd
+
+# Firma canónica de una posición. Las patas se ordenan por strike (y luego por vencimiento y tipo) y cada
+# campo por pata es una tupla en ese orden:
+#   - tipos: 'PUT' / 'CALL'
+#   - ratios: cantidad con signo dividida por el MCD de las cantidades (un 2-2-4 es un 1-1-2)
+#   - cantidades: cantidad con signo, sin reducir (las reglas 1-1-2 miden la cantidad neta, como es_1_1_2)
+#   - vencimientos: índice del vencimiento (0 = el más cercano)
+#   - strikes: índice denso del strike (0 = el más bajo)
+#   - aperturas: True si la acción es de apertura (XXX_TO_OPEN)
+# y por posición:
+#   - n_vencimientos / n_strikes: cantidad de vencimientos y strikes distintos
+#   - espaciado: 'simetrico', 'ala_baja_ancha' o 'ala_alta_ancha' comparando la primera y la última distancia
+#     entre strikes (None con menos de 3 strikes)
+#   - signo_total: signo del crédito (+1) o débito (-1) total
+Firma = namedtuple('Firma', ['tipos', 'ratios', 'cantidades', 'vencimientos', 'strikes', 'aperturas', 'n_vencimientos',
+                             'n_strikes', 'espaciado', 'signo_total'])
+
+
+def calcular_firma(patas, total=0.0):
+    """
+    Calcula la firma canónica de una posición.
+
+    Args:
+        patas (list): Lista de patas (Pata o diccionarios con 'tipo', 'strike', 'vencimiento', 'cantidad' y 'accion').
+        total (float): El Total (crédito o débito) de la operación.
+
+    Returns:
+        Firma: La firma de la posición.
+    """
+    vencimientos_unicos = sorted({pata['vencimiento'] for pata in patas}, key=lambda v: (v is None, v or 0))
+    indice_vencimiento = {vencimiento: i for i, vencimiento in enumerate(vencimientos_unicos)}
+    strikes_unicos = sorted({pata['strike'] for pata in patas})
+    indice_strike = {strike: i for i, strike in enumerate(strikes_unicos)}
+
+    ordenadas = sorted(patas, key=lambda pata: (indice_strike[pata['strike']], indice_vencimiento[pata['vencimiento']],
+                                                pata['tipo'] or ''))
+    cantidades = [pata['cantidad'] for pata in ordenadas]
+    divisor = _mcd(cantidades)
+
+    return Firma(
+        tipos=tuple(pata['tipo'] for pata in ordenadas),
+        ratios=tuple(cantidad // divisor if divisor else cantidad for cantidad in cantidades),
+        cantidades=tuple(cantidades),
+        vencimientos=tuple(indice_vencimiento[pata['vencimiento']] for pata in ordenadas),
+        strikes=tuple(indice_strike[pata['strike']] for pata in ordenadas),
+        aperturas=tuple(str(pata['accion']).endswith('TO_OPEN') for pata in ordenadas),
+        n_vencimientos=len(vencimientos_unicos),
+        n_strikes=len(strikes_unicos),
+        espaciado=_clase_espaciado(strikes_unicos),
+        signo_total=(total > 0) - (total < 0),
+    )
+
+
+def _mcd(cantidades):
+    """
+    MCD de los valores absolutos de las cantidades, o 0 si alguna no es entera.
+    """
+    divisor = 0
+    for cantidad in cantidades:
+        if cantidad != int(cantidad):
+            return 0
+        divisor = gcd(divisor, abs(int(cantidad)))
+    return divisor
+
+
+def _clase_espaciado(strikes):
+    """
+    Clasifica la distancia entre strikes comparando la primera y la última (redondeadas para evitar ruido
+    de coma flotante).
+    """
+    if len(strikes) < 3:
+        return None
+    primera = round(strikes[1] - strikes[0], 6)
+    ultima = round(strikes[-1] - strikes[-2], 6)
+    if primera == ultima:
+        return 'simetrico'
+    return 'ala_baja_ancha' if primera > ultima else 'ala_alta_ancha'
+
+
+# Predicados de la tabla de reglas. Reciben una Firma y devuelven bool.
+
+def _es_naked_put(f):
+    return f.tipos == ('PUT',) and f.ratios[0] < 0
+
+
+def _es_1_1_2(f):
+    return len(f.tipos) == 3 and all(tipo == 'PUT' for tipo in f.tipos) and sum(f.cantidades) == -2 and \
+        f.n_vencimientos == 1 and f.n_strikes == 3
+
+
+def es_candidato_calendar(f):
+    """
+    Indica si la firma tiene la forma de un Calendar 1-1-2: 3 PUT en 2 vencimientos, cantidad neta de -2 (sin
+    reducir, como la mide es_1_1_2) y un strike del vencimiento cercano por debajo de uno del lejano.
+
+    No es una regla de REGLAS: un candidato solo es "Calendar1-1-2" si lo confirma DecisionesCalendar (ver
+    procesar_actividad.agrupar_calendars); si no, se clasifica con las reglas como cualquier otra posición.
+    """
+    if len(f.tipos) != 3 or not all(tipo == 'PUT' for tipo in f.tipos) or sum(f.cantidades) != -2 or \
+            f.n_vencimientos != 2:
+        return False
+    if f.cantidades.count(-2) != 0 and f.cantidades.count(-1) != 2 and f.cantidades.count(1) != 1:
+        return False
+    strikes_cercanos = [s for s, v in zip(f.strikes, f.vencimientos) if v == 0]
+    strikes_lejanos = [s for s, v in zip(f.strikes, f.vencimientos) if v == 1]
+    return min(strikes_cercanos) < max(strikes_lejanos)
+
+
+def _es_iron_condor(f):
+    return f.n_vencimientos == 1 and f.n_strikes == 4 and f.tipos == ('PUT', 'PUT', 'CALL', 'CALL') and \
+        f.ratios == (1, -1, -1, 1)
+
+
+def _es_strangle(f):
+    return len(f.tipos) == 2 and f.n_vencimientos == 1 and set(f.tipos) == {'PUT', 'CALL'} and \
+        all(ratio <= 0 for ratio in f.ratios) and f.n_strikes == 2
+
+
+def _es_butterfly_3_patas(f):
+    return len(f.tipos) == 3 and len(set(f.tipos)) == 1 and f.n_vencimientos == 1 and sum(f.ratios) == 0 and \
+        f.ratios.count(1) == 2 and f.ratios.count(-2) == 1 and f.n_strikes == 3
+
+
+def _es_butterfly(f):
+    return _es_butterfly_3_patas(f) and f.espaciado == 'simetrico'
+
+
+def _es_broken_wing_butterfly(f):
+    return _es_butterfly_3_patas(f) and f.espaciado != 'simetrico'
+
+
+def _es_broken_wing_condor(f):
+    return f.tipos == ('PUT',) * 4 and f.n_vencimientos == 1 and f.n_strikes == 4 and all(f.aperturas) and \
+        f.ratios == (1, -1, -1, 1) and f.espaciado == 'ala_baja_ancha'
+
+
+def _es_ratio_spread(f):
+    return len(f.tipos) == 2 and f.n_vencimientos == 1 and f.tipos[0] == f.tipos[1] and \
+        abs(f.ratios[0]) != abs(f.ratios[1])
+
+
+def _es_vertical(f, tipo, signo_total):
+    return len(f.tipos) == 2 and f.tipos == (tipo, tipo) and all(f.aperturas) and \
+        sorted(ratio > 0 for ratio in f.ratios) == [False, True] and f.signo_total == signo_total
+
+
+# Tabla de reglas: se evalúan en orden y gana la primera que coincide. "Calendar1-1-2" no está: solo la asigna
+# la confirmación de los candidatos (ver es_candidato_calendar)
+REGLAS = [
+    ("NakedPut", _es_naked_put),
+    ("1-1-2", _es_1_1_2),
+    ("IronCondor", _es_iron_condor),
+    ("Strangle", _es_strangle),
+    ("Butterfly", _es_butterfly),
+    ("BrokenWingButterfly", _es_broken_wing_butterfly),
+    ("BrokenWingCondor", _es_broken_wing_condor),
+    ("RatioSpread", _es_ratio_spread),
+    ("Credit Put Spread", partial(_es_vertical, tipo='PUT', signo_total=1)),
+    ("Debit Put Spread", partial(_es_vertical, tipo='PUT', signo_total=-1)),
+    ("Credit Call Spread", partial(_es_vertical, tipo='CALL', signo_total=1)),
+    ("Debit Call Spread", partial(_es_vertical, tipo='CALL', signo_total=-1)),
+]
+
+
+def registrar_regla(estrategia, predicado, antes_de=None):
+    """
+    Agrega una regla a la tabla de clasificación.
+
+    Args:
+        estrategia (str): Nombre de la estrategia que se asigna cuando el predicado se cumple.
+        predicado (callable): Función que recibe una Firma y devuelve bool.
+        antes_de (str): Si se indica, la regla se inserta antes de la regla de esa estrategia; si no, al final.
+    """
+    posicion = len(REGLAS)
+    if antes_de is not None:
+        posicion = next(i for i, (nombre, _) in enumerate(REGLAS) if nombre == antes_de)
+    REGLAS.insert(posicion, (estrategia, predicado))
+
+
+def clasificar_firma(firma):
+    """
+    Devuelve la estrategia de la primera regla que coincide con la firma, o "Unknown".
+    """
+    if not firma.tipos:
+        return "Unknown"
+    for estrategia, predicado in REGLAS:
+        if predicado(firma):
+            return estrategia
+    return "Unknown"
+
+
+def clasificar_patas(patas, total=0.0):
+    """
+    Identifica la estrategia de una posición a partir de sus patas.
+
+    Args:
+        patas (list): Lista de patas de la posición.
+        total (float): El Total (crédito o débito) de la operación.
+
+    Returns:
+        str: El nombre de la estrategia, o "Unknown" si ninguna regla coincide.
+    """
+    return clasificar_firma(calcular_firma(patas, total))
+
+
+def clasificar_lote(posiciones):
+    """
+    Clasifica muchas posiciones de una vez. Las firmas repetidas se clasifican una sola vez.
+
+    Args:
+        posiciones (iterable): Tuplas (patas, total).
+
+    Returns:
+        list: El nombre de la estrategia de cada posición, en el mismo orden.
+    """
+    resultados = {}
+    estrategias = []
+    for patas, total in posiciones:
+        firma = calcular_firma(patas, total)
+        if firma not in resultados:
+            resultados[firma] = clasificar_firma(firma)
+        estrategias.append(resultados[firma])
+    return estrategias
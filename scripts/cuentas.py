@@ -0,0 +1,107 @@
+import csv
+import os
+import re
+
+from almacen_posiciones import AlmacenPosiciones, AlmacenYAML
+
+# Nombre de los exports de tastytrade: tastytrade_transactions_history_<cuenta>_<desde>_to_<hasta>.csv
+PATRON_ARCHIVO_CUENTA = re.compile(r'^tastytrade_transactions_history_([A-Za-z0-9]+)_\d{6}_to_\d{6}', re.IGNORECASE)
+
+# Columnas del CSV de las que se toma la cuenta si el nombre del archivo no la trae
+COLUMNAS_CUENTA = ('Account Number', 'Account')
+
+
+def cuenta_de_archivo(ruta_csv):
+    """
+    Devuelve la cuenta de un export de actividad: la del nombre del archivo o, si no la trae, la de la primera
+    fila de una columna de COLUMNAS_CUENTA. None si no se puede saber.
+    """
+    coincidencia = PATRON_ARCHIVO_CUENTA.match(os.path.basename(ruta_csv))
+    if coincidencia:
+        return coincidencia.group(1)
+    try:
+        with open(ruta_csv, 'r', newline='') as f:
+            fila = next(csv.DictReader(f), None)
+    except (OSError, UnicodeDecodeError, csv.Error):
+        return None
+    for columna in COLUMNAS_CUENTA:
+        if fila and fila.get(columna):
+            return re.sub(r'[^A-Za-z0-9]', '', fila[columna]) or None
+    return None
+
+
+def carpeta_cuenta(carpeta_base, cuenta):
+    """
+    Carpeta de la partición de una cuenta dentro de carpeta_base (la misma carpeta_base si cuenta es None).
+    """
+    return os.path.join(carpeta_base, cuenta, '') if cuenta else carpeta_base
+
+
+def listar_cuentas(*carpetas_base):
+    """
+    Devuelve las cuentas que tienen partición (una subcarpeta) en alguna de las carpetas indicadas.
+    """
+    cuentas = set()
+    for carpeta_base in carpetas_base:
+        if os.path.isdir(carpeta_base):
+            cuentas.update(entrada.name for entrada in os.scandir(carpeta_base)
+                           if entrada.is_dir() and not entrada.name.startswith('.'))
+    return sorted(cuentas)
+
+
+def iterar_posiciones(carpeta_base):
+    """
+    Genera tuplas (nombre_archivo, posicion_data) de las posiciones de carpeta_base y de sus particiones por
+    cuenta. Las de una partición se nombran "<cuenta>/<archivo>.yaml" (como en AlmacenCuenta), así
+    os.path.join(carpeta_base, nombre_archivo) es siempre la ruta del YAML.
+    """
+    for cuenta in [None] + listar_cuentas(carpeta_base):
+        for nombre_archivo, posicion_data in AlmacenYAML(carpeta_cuenta(carpeta_base, cuenta)).iterar():
+            yield (f"{cuenta}/{nombre_archivo}" if cuenta else nombre_archivo), posicion_data
+
+
+def firma_particion(*carpetas):
+    """
+    Firma barata del contenido de una partición: cantidad, tamaño total y mtime más reciente de sus YAML y
+    diarios, sin abrir ninguno. Cambia si se agrega, quita, reescribe o anota cualquier posición.
+    """
+    cantidad, tamano, ultimo = 0, 0, 0
+    for carpeta in carpetas:
+        if not os.path.isdir(carpeta):
+            continue
+        for entrada in os.scandir(carpeta):
+            if entrada.is_file() and (entrada.name.endswith('.yaml') or entrada.name.endswith('.jsonl')):
+                estado = entrada.stat()
+                cantidad += 1
+                tamano += estado.st_size
+                ultimo = max(ultimo, estado.st_mtime_ns)
+    return cantidad, tamano, ultimo
+
+
+class AlmacenCuenta(AlmacenPosiciones):
+    """
+    Vista de un almacén compartido para las posiciones de una cuenta: guarda cada posición con el nombre de
+    archivo "<cuenta>/<nombre>.yaml" (la ruta relativa de su partición), así las posiciones de cuentas
+    distintas no chocan aunque sus YAML se llamen igual y exportar_yaml recrea las particiones. Se usa para
+    escribir: cargar y buscar van contra el almacén compartido (buscar devuelve las posiciones de todas las
+    cuentas).
+    """
+
+    def __init__(self, almacen, cuenta):
+        self.almacen = almacen
+        self.cuenta = cuenta
+
+    def guardar(self, nombre_archivo, posicion_data):
+        self.almacen.guardar(f"{self.cuenta}/{nombre_archivo}", posicion_data)
+
+    def cargar(self, id_posicion):
+        return self.almacen.cargar(id_posicion)
+
+    def cargar_archivo(self, nombre_archivo):
+        return self.almacen.cargar_archivo(f"{self.cuenta}/{nombre_archivo}")
+
+    def buscar(self, subyacente=None, estrategia=None, abierta=None, fecha_desde=None, fecha_hasta=None):
+        return self.almacen.buscar(subyacente, estrategia, abierta, fecha_desde, fecha_hasta)
+
+    def confirmar(self):
+        self.almacen.confirmar()
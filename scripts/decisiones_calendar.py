@@ -0,0 +1,164 @@
+import json
+import os
+
+from archivos_yaml import cargar_yaml
+
+MODOS_CALENDAR = ('interactivo', 'aceptar', 'rechazar', 'revisar')
+
+
+class DecisionesCalendar:
+    """
+    Decide si un trade candidato a Calendar 1-1-2 se confirma, sin bloquear la ingesta si no hace falta.
+
+    Para cada candidato se usa, en este orden:
+      1. archivo_decisiones: YAML {Order #: 's'/'n'} con decisiones tomadas de antemano.
+      2. criterio: función opcional que recibe las patas del trade y devuelve True (aceptar), False (rechazar)
+         o None (caso ambiguo).
+      3. modo: 'interactivo' (pregunta por consola), 'aceptar', 'rechazar' o 'revisar' (el trade se deja
+         fuera del lote y se anota en archivo_revision, con enviar_a_revision, para resolverlo después).
+
+    Los objetos son serializables con pickle (el archivo de decisiones se lee en cada proceso la primera vez
+    que se usa), por lo que se pueden pasar a los workers de procesar_archivos_actividad.
+    """
+
+    def __init__(self, modo='interactivo', archivo_decisiones=None, criterio=None,
+                 archivo_revision="data/revision_calendars.jsonl"):
+        if modo not in MODOS_CALENDAR:
+            raise ValueError(f"Modo de decisión de Calendars desconocido: {modo}")
+        self.modo = modo
+        self.archivo_decisiones = archivo_decisiones
+        self.criterio = criterio
+        self.archivo_revision = archivo_revision
+        self._decisiones = None
+
+    def __getstate__(self):
+        estado = self.__dict__.copy()
+        estado['_decisiones'] = None
+        return estado
+
+    def decisiones(self):
+        """
+        Devuelve las decisiones precalculadas como {Order # (int): bool}.
+        """
+        if self._decisiones is None:
+            self._decisiones = {}
+            if self.archivo_decisiones and os.path.exists(self.archivo_decisiones):
+                for orden, decision in (cargar_yaml(self.archivo_decisiones) or {}).items():
+                    self._decisiones[int(orden)] = str(decision).lower() in ('s', 'si', 'sí', 'true', 'y', 'yes')
+        return self._decisiones
+
+    def decidir(self, trade_id, trade):
+        """
+        Devuelve True si el trade se confirma como Calendar 1-1-2, False si no, o None si queda para revisión.
+        En ese caso no se anota todavía en la cola: lo hace quien confirma el lote (ver enviar_a_revision), así
+        un trade que después se descarta (por ejemplo, por estar ya ingerido) no llega a la cola.
+        """
+        decision = self.decision_previa(trade)
+        if decision is not None:
+            return decision
+
+        if self.modo == 'aceptar':
+            return True
+        if self.modo == 'rechazar':
+            return False
+        if self.modo == 'revisar':
+            return None
+
+        print(f"\nPosible Calendar 1-1-2: Trade ID(s): {[t['Order #'] for t in trade]}")
+        for t in trade:
+            print(f"- {t['Date']} - {t['Description']}")
+        confirmacion = input("¿Es este un Calendar 1-1-2? (s/n): ")
+        return confirmacion.lower() == 's'
+
+    def decision_previa(self, trade):
+        """
+        Decide un trade solo con el archivo de decisiones y el criterio. Devuelve None si ninguno decide.
+        """
+        decisiones = self.decisiones()
+        for orden in _ordenes(trade):
+            if orden in decisiones:
+                return decisiones[orden]
+        if self.criterio is not None:
+            decision = self.criterio(trade)
+            if decision is not None:
+                return bool(decision)
+        return None
+
+    def enviar_a_revision(self, trades, cuenta=None):
+        """
+        Agrega trades a la cola de revisión (una línea JSON por trade, con sus patas completas y la cuenta de la
+        partición de posiciones a la que pertenecen, None si no se particiona por cuenta). Se omiten los
+        que ya están en la cola (por Order # o, si no tienen, por trade_id), así volver a confirmar un archivo
+        después de un corte no los duplica.
+
+        Args:
+            trades (list): Tuplas (trade_id, patas).
+            cuenta (str): Cuenta de los trades (ver cuentas.cuenta_de_archivo).
+
+        Returns:
+            int: Cantidad de trades agregados.
+        """
+        encolados = set()
+        for item in leer_revision(self.archivo_revision):
+            encolados.update(_claves_revision(item['trade_id'], item.get('ordenes')))
+        lineas = []
+        for trade_id, trade in trades:
+            ordenes = _ordenes(trade)
+            claves = _claves_revision(trade_id, ordenes)
+            if encolados & claves:
+                continue
+            encolados |= claves
+            lineas.append(json.dumps({'trade_id': trade_id, 'ordenes': ordenes, 'cuenta': cuenta,
+                                      'patas': [dict(pata) for pata in trade]}, default=str) + '\n')
+            print(f"Posible Calendar 1-1-2 enviado a revisión: {trade_id}")
+        if not lineas:
+            return 0
+        if os.path.dirname(self.archivo_revision):
+            os.makedirs(os.path.dirname(self.archivo_revision), exist_ok=True)
+        # Una sola escritura en modo append: las líneas de varios procesos no se mezclan
+        with open(self.archivo_revision, 'a') as cola:
+            cola.write(''.join(lineas))
+        return len(lineas)
+
+
+def leer_revision(archivo_revision="data/revision_calendars.jsonl"):
+    """
+    Devuelve la lista de trades pendientes de revisión como diccionarios {trade_id, ordenes, cuenta, patas}
+    (sin cuenta en las líneas anteriores a que se guardara).
+    """
+    try:
+        with open(archivo_revision, 'r') as cola:
+            return [json.loads(linea) for linea in cola if linea.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def guardar_revision(pendientes, archivo_revision="data/revision_calendars.jsonl"):
+    """
+    Reemplaza la cola de revisión por los trades pendientes indicados (como los devuelve leer_revision). Se
+    escribe un temporal y se renombra sobre la cola, así nunca queda a medio escribir.
+    """
+    temporal = archivo_revision + '.tmp'
+    with open(temporal, 'w') as cola:
+        for item in pendientes:
+            cola.write(json.dumps(item, default=str) + '\n')
+    os.replace(temporal, archivo_revision)
+
+
+def _ordenes(trade):
+    """
+    Devuelve los Order # (enteros, sin repetir) de las patas de un trade.
+    """
+    ordenes = []
+    for pata in trade:
+        orden = pata.get('Order #')
+        if orden is not None and orden == orden and int(orden) not in ordenes:
+            ordenes.append(int(orden))
+    return ordenes
+
+
+def _claves_revision(trade_id, ordenes):
+    """
+    Claves con las que se reconoce un trade ya encolado: sus Order # o, si no tiene, su trade_id.
+    """
+    return {('orden', orden) for orden in ordenes} if ordenes else {('trade_id', trade_id)}
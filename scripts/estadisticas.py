@@ -0,0 +1,266 @@
+import argparse
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from almacen_posiciones import AlmacenSQLite, AlmacenYAML
+from cuentas import carpeta_cuenta, firma_particion, listar_cuentas
+from utils import MULTIPLICADORES, MULTIPLICADOR_ACCIONES
+
+CARPETAS_POSICIONES = ["data/yaml/posiciones_activas/", "data/yaml/posiciones_cerradas/"]
+
+# Tablas de posiciones ya armadas por partición de cuenta, con la firma de la partición al leerla
+CARPETA_CACHE = "data/cache/estadisticas/"
+# Cambia cuando cambia cómo se arma la tabla, así no se reutilizan tablas guardadas con el cálculo anterior
+VERSION_TABLA = 2
+
+# Columnas de la tabla por las que se puede agrupar con un nombre corto
+AGRUPACIONES = {'estrategia': 'estrategia', 'subyacente': 'subyacente', 'mes': 'mes_cierre', 'cuenta': 'cuenta'}
+
+CAMPOS_TABLA = ['id', 'subyacente', 'estrategia', 'fecha_inicio', 'fecha_cierre', 'cantidad_rolls',
+                'credito_debito_inicial', 'credito_debito_actual', 'ganancia_perdida_neta', 'duracion_dias']
+
+
+def cargar_tabla_posiciones(fuente=None):
+    """
+    Carga todas las posiciones una sola vez en una tabla columnar (una fila por posición) sobre la que se
+    calculan las estadísticas.
+
+    Args:
+        fuente: Un AlmacenSQLite (se lee con dos consultas, sin armar cada posición), cualquier otro
+            AlmacenPosiciones, una carpeta de YAML o una lista de carpetas/almacenes. Por defecto, las
+            carpetas de posiciones activas y cerradas.
+
+    Returns:
+        pandas.DataFrame: Columnas de CAMPOS_TABLA con tipos numéricos y fechas, más cerrada, ganadora,
+        mes_inicio, mes_cierre, capital (ver _capital_por_posicion) y cuenta (la de su partición en el almacén,
+        ver cuentas.AlmacenCuenta; vacía para los YAML y las posiciones sin cuenta).
+    """
+    if fuente is None:
+        fuente = CARPETAS_POSICIONES
+    if isinstance(fuente, AlmacenSQLite):
+        posiciones = pd.read_sql_query(f"SELECT {', '.join(CAMPOS_TABLA)}, nombre_archivo FROM posiciones",
+                                       fuente.conexion)
+        posiciones['cuenta'] = posiciones.pop('nombre_archivo').str.rpartition('/')[0]
+        patas = pd.read_sql_query("SELECT posicion_id AS id, tipo, strike, cantidad, fecha_cierre FROM patas",
+                                  fuente.conexion)
+        return _armar_tabla(posiciones, patas)
+
+    filas, filas_patas = [], []
+    for almacen in ([fuente] if not isinstance(fuente, (list, tuple)) else fuente):
+        if isinstance(almacen, str):
+            almacen = AlmacenYAML(almacen)
+        for posicion in almacen.buscar():
+            filas.append([posicion.get(campo) for campo in CAMPOS_TABLA])
+            filas_patas.extend((posicion.get('id'), pata.get('tipo'), pata.get('strike'), pata.get('cantidad'),
+                                pata.get('fecha_cierre')) for pata in posicion.get('patas') or [])
+    return _armar_tabla(pd.DataFrame(filas, columns=CAMPOS_TABLA),
+                        pd.DataFrame(filas_patas, columns=['id', 'tipo', 'strike', 'cantidad', 'fecha_cierre']))
+
+
+def cargar_tabla_cuentas(carpeta_activas=CARPETAS_POSICIONES[0], carpeta_cerradas=CARPETAS_POSICIONES[1],
+                         carpeta_cache=CARPETA_CACHE):
+    """
+    Carga la tabla de posiciones de todas las cuentas (las carpetas base y cada partición <carpeta>/<cuenta>/,
+    ver cuentas.py) con la columna cuenta, para reportes que cruzan cuentas.
+
+    La tabla de cada partición se guarda en carpeta_cache junto con su firma (ver cuentas.firma_particion) y se
+    reutiliza mientras la firma no cambie: solo se vuelven a leer los YAML de las cuentas que tuvieron
+    movimiento. Con carpeta_cache=None no se usa cache.
+
+    Returns:
+        pandas.DataFrame: La misma tabla que cargar_tabla_posiciones, de todas las particiones juntas.
+    """
+    tablas = []
+    for cuenta in [None] + listar_cuentas(carpeta_activas, carpeta_cerradas):
+        carpetas = [carpeta_cuenta(carpeta_activas, cuenta), carpeta_cuenta(carpeta_cerradas, cuenta)]
+        firma = firma_particion(*carpetas)
+        if not firma[0]:
+            continue
+        ruta_cache = os.path.join(carpeta_cache, f"{cuenta or '_base'}.pkl") if carpeta_cache else None
+        tabla = _leer_cache(ruta_cache, firma)
+        if tabla is None:
+            tabla = cargar_tabla_posiciones([carpeta for carpeta in carpetas if os.path.isdir(carpeta)])
+            _escribir_cache(ruta_cache, firma, tabla)
+        tablas.append(tabla.assign(cuenta=cuenta or ''))
+    if not tablas:
+        return cargar_tabla_posiciones([])
+    tabla = pd.concat(tablas, ignore_index=True)
+    for campo in ('subyacente', 'estrategia', 'cuenta'):
+        tabla[campo] = tabla[campo].astype(str).astype('category')
+    return tabla
+
+
+def _leer_cache(ruta_cache, firma):
+    """
+    Devuelve la tabla guardada en ruta_cache si se armó con la misma firma de partición y VERSION_TABLA, o None.
+    """
+    if ruta_cache is None:
+        return None
+    try:
+        with open(ruta_cache, 'rb') as f:
+            guardado = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if guardado.get('firma') != firma or guardado.get('version') != VERSION_TABLA:
+        return None
+    return guardado['tabla']
+
+
+def _escribir_cache(ruta_cache, firma, tabla):
+    if ruta_cache is None:
+        return
+    os.makedirs(os.path.dirname(ruta_cache), exist_ok=True)
+    temporal = ruta_cache + '.tmp'
+    with open(temporal, 'wb') as f:
+        pickle.dump({'firma': firma, 'version': VERSION_TABLA, 'tabla': tabla}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporal, ruta_cache)
+
+
+def _armar_tabla(posiciones, patas):
+    """
+    Convierte los tipos de la tabla de posiciones y agrega las columnas derivadas.
+    """
+    # Una posición que se cerró mientras se copiaba puede estar en las dos carpetas: vale la última (cerradas)
+    tabla = posiciones.drop_duplicates('id', keep='last').reset_index(drop=True)
+    if 'cuenta' not in tabla:
+        tabla['cuenta'] = ''
+    for campo in ('cantidad_rolls', 'credito_debito_inicial', 'credito_debito_actual', 'ganancia_perdida_neta',
+                  'duracion_dias'):
+        tabla[campo] = pd.to_numeric(tabla[campo], errors='coerce').astype('float64')
+    for campo in ('fecha_inicio', 'fecha_cierre'):
+        tabla[campo] = pd.to_datetime(tabla[campo].astype(str), format='%Y%m%d', errors='coerce')
+    for campo in ('subyacente', 'estrategia', 'cuenta'):
+        tabla[campo] = tabla[campo].astype('category')
+
+    tabla['cerrada'] = tabla['fecha_cierre'].notna()
+    # Las cerradas sin resultado guardado toman el flujo neto de sus trades; las abiertas no tienen resultado
+    tabla['ganancia_perdida_neta'] = tabla['ganancia_perdida_neta'].fillna(tabla['credito_debito_actual']) \
+        .where(tabla['cerrada'])
+    tabla['duracion_dias'] = tabla['duracion_dias'].fillna(
+        (tabla['fecha_cierre'] - tabla['fecha_inicio']).dt.days).where(tabla['cerrada'])
+    tabla['ganadora'] = (tabla['ganancia_perdida_neta'] > 0).where(tabla['cerrada']).astype('float64')
+    tabla['mes_inicio'] = tabla['fecha_inicio'].dt.to_period('M')
+    tabla['mes_cierre'] = tabla['fecha_cierre'].dt.to_period('M')
+    tabla['capital'] = _capital_por_posicion(tabla, patas)
+    return tabla
+
+
+def _capital_por_posicion(tabla, patas):
+    """
+    Estima el capital que usa cada posición a partir de sus patas, sin recorrerlas una por una.
+
+    Por tipo (PUT/CALL), las patas vendidas cubiertas por al menos tantas compradas arriesgan el ancho entre
+    strikes; las puts vendidas descubiertas, su strike (como si estuvieran aseguradas con efectivo), y las calls
+    vendidas descubiertas no tienen riesgo acotado (NaN). Con crédito, el capital es el mayor riesgo menos el
+    crédito recibido; con débito, el débito pagado más el riesgo de las patas descubiertas.
+
+    En las posiciones abiertas solo cuentan las patas abiertas: las que cerró el ciclo de vida (la parte cerrada
+    de un cierre parcial, las patas viejas de un roll) siguen en la posición con fecha_cierre.
+
+    Returns:
+        numpy.ndarray: Capital por fila de tabla (NaN si no está acotado o la posición no tiene patas).
+    """
+    abiertas = tabla.loc[~tabla['cerrada'], 'id']
+    patas = patas[patas['id'].isin(tabla['id']) & ~(patas['id'].isin(abiertas) & patas['fecha_cierre'].notna())].copy()
+    patas['strike'] = pd.to_numeric(patas['strike'], errors='coerce')
+    patas['cantidad'] = pd.to_numeric(patas['cantidad'], errors='coerce').fillna(0)
+    subyacentes = tabla.set_index('id')['subyacente'].astype(object)
+    patas['multiplicador'] = patas['id'].map(subyacentes).map(MULTIPLICADORES).fillna(MULTIPLICADOR_ACCIONES)
+    patas['vendidas'] = (-patas['cantidad']).clip(lower=0)
+    patas['compradas'] = patas['cantidad'].clip(lower=0)
+    patas['strike_vendido'] = patas['strike'].where(patas['vendidas'] > 0)
+
+    lados = patas.groupby(['id', 'tipo'], sort=False).agg(
+        vendidas=('vendidas', 'sum'), compradas=('compradas', 'sum'), strike_min=('strike', 'min'),
+        strike_max=('strike', 'max'), strike_vendido=('strike_vendido', 'max'),
+        multiplicador=('multiplicador', 'first')).reset_index()
+    cubierto = lados['compradas'] >= lados['vendidas']
+    lados['riesgo_cubierto'] = np.where(
+        cubierto, (lados['strike_max'] - lados['strike_min']) * lados['vendidas'] * lados['multiplicador'], 0.0)
+    lados['riesgo_descubierto'] = np.where(
+        cubierto | (lados['vendidas'] == 0), 0.0,
+        np.where(lados['tipo'] == 'PUT', lados['strike_vendido'] * lados['vendidas'] * lados['multiplicador'],
+                 np.inf))
+    riesgo = lados.groupby('id', sort=False).agg(cubierto=('riesgo_cubierto', 'max'),
+                                                   descubierto=('riesgo_descubierto', 'sum'))
+    cubierto = tabla['id'].map(riesgo['cubierto']).to_numpy(dtype='float64')
+    descubierto = tabla['id'].map(riesgo['descubierto']).to_numpy(dtype='float64')
+
+    credito = tabla['credito_debito_inicial'].fillna(0).to_numpy()
+    capital = np.where(credito >= 0, np.maximum(np.maximum(cubierto, descubierto) - credito, 0.0),
+                       descubierto - credito)
+    capital[np.isinf(capital)] = np.nan
+    return capital
+
+
+def estadisticas(tabla, por='estrategia'):
+    """
+    Calcula estadísticas agrupadas sobre la tabla de cargar_tabla_posiciones con operaciones vectorizadas.
+
+    Args:
+        tabla (pandas.DataFrame): Tabla de posiciones.
+        por (str|list): 'estrategia', 'subyacente', 'mes' (de cierre), cualquier columna de la tabla, una lista
+            de ellas, o None para toda la cartera.
+
+    Returns:
+        pandas.DataFrame: Por grupo, cantidad de posiciones (abiertas y cerradas), win rate, ganancia total,
+        promedio, mejor y peor de las cerradas, duración promedio en días, capital promedio en uso de las
+        abiertas y retorno de las cerradas sobre su capital.
+    """
+    if por is None:
+        columnas = [pd.Series('cartera', index=tabla.index, name='grupo')]
+    else:
+        columnas = [AGRUPACIONES.get(columna, columna) for columna in ([por] if isinstance(por, str) else por)]
+
+    datos = tabla.assign(abierta=~tabla['cerrada'],
+                         capital_abiertas=tabla['capital'].where(~tabla['cerrada']),
+                         capital_cerradas=tabla['capital'].where(tabla['cerrada'] &
+                                                                 tabla['ganancia_perdida_neta'].notna()))
+    resultado = datos.groupby(columnas, observed=True, sort=True).agg(
+        posiciones=('id', 'size'),
+        abiertas=('abierta', 'sum'),
+        cerradas=('cerrada', 'sum'),
+        ganadoras=('ganadora', 'sum'),
+        ganancia_total=('ganancia_perdida_neta', 'sum'),
+        ganancia_promedio=('ganancia_perdida_neta', 'mean'),
+        mejor=('ganancia_perdida_neta', 'max'),
+        peor=('ganancia_perdida_neta', 'min'),
+        duracion_promedio=('duracion_dias', 'mean'),
+        capital_en_uso=('capital_abiertas', 'sum'),
+        capital_promedio=('capital', 'mean'),
+        capital_cerradas=('capital_cerradas', 'sum'),
+    )
+    resultado['win_rate'] = resultado['ganadoras'] / resultado['cerradas'].where(resultado['cerradas'] > 0)
+    resultado['retorno_capital'] = resultado['ganancia_total'] / \
+        resultado['capital_cerradas'].where(resultado['capital_cerradas'] > 0)
+    return resultado.drop(columns=['ganadoras', 'capital_cerradas'])
+
+
+def imprimir_estadisticas(resultado):
+    """
+    Imprime una tabla de estadísticas con los montos redondeados y el win rate en porcentaje.
+    """
+    formatos = {'win_rate': '{:.1%}'.format, 'retorno_capital': '{:.1%}'.format}
+    print(resultado.to_string(formatters=formatos, float_format='{:,.2f}'.format, na_rep='-'))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estadísticas de P&L de las posiciones.")
+    parser.add_argument('--almacen', default=None, help="Base sqlite de posiciones (por defecto, los YAML)")
+    parser.add_argument('--carpetas', nargs='+', default=CARPETAS_POSICIONES, help="Carpetas de posiciones YAML")
+    parser.add_argument('--cuentas', action='store_true',
+                        help="Leer también las particiones por cuenta de las carpetas (con cache por partición)")
+    parser.add_argument('--por', nargs='+', default=['estrategia'],
+                        help="Agrupar por estrategia, subyacente, mes, cuenta u otra columna (cartera = sin agrupar)")
+    argumentos = parser.parse_args()
+
+    if argumentos.almacen:
+        tabla = cargar_tabla_posiciones(AlmacenSQLite(argumentos.almacen))
+    elif argumentos.cuentas:
+        tabla = cargar_tabla_cuentas(*argumentos.carpetas[:2])
+    else:
+        tabla = cargar_tabla_posiciones(argumentos.carpetas)
+    imprimir_estadisticas(estadisticas(tabla, None if argumentos.por == ['cartera'] else argumentos.por))
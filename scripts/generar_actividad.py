@@ -0,0 +1,291 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Columnas del export de transacciones de tastytrade, en su orden original
+COLUMNAS_ACTIVIDAD = ['Date', 'Type', 'Sub Type', 'Action', 'Symbol', 'Instrument Type', 'Description', 'Value',
+                      'Quantity', 'Average Price', 'Commissions', 'Fees', 'Multiplier', 'Root Symbol',
+                      'Underlying Symbol', 'Expiration Date', 'Strike Price', 'Call or Put', 'Order #', 'Total',
+                      'Currency']
+
+# Tamaños de referencia para generar y medir
+TAMANOS = {'1k': 1_000, '100k': 100_000, '1M': 1_000_000}
+
+# Subyacentes sintéticos: (root, tipo de instrumento, spot, distancia entre strikes, multiplicador, comisión y
+# fees por contrato). Los futuros usan la raíz con "/" (/ES, /NQ) como en los exports reales.
+SUBYACENTES = [
+    ('SPY', 'Equity Option', 560.0, 5.0, 100, 1.00, 0.12),
+    ('QQQ', 'Equity Option', 480.0, 5.0, 100, 1.00, 0.12),
+    ('IWM', 'Equity Option', 220.0, 2.0, 100, 1.00, 0.12),
+    ('AAPL', 'Equity Option', 225.0, 2.5, 100, 1.00, 0.12),
+    ('TSLA', 'Equity Option', 250.0, 5.0, 100, 1.00, 0.12),
+    ('/ES', 'Future Option', 5800.0, 25.0, 50, 1.25, 0.52),
+    ('/NQ', 'Future Option', 20000.0, 100.0, 20, 1.25, 0.52),
+]
+
+# Forma de cada estrategia que reconoce el clasificador, como lista de patas
+# (tipo, strikes de distancia al strike ATM, cantidad con signo por lote, índice de vencimiento).
+ESTRATEGIAS = {
+    'NakedPut': [('PUT', -2, -1, 0)],
+    '1-1-2': [('PUT', 0, 1, 0), ('PUT', -2, -1, 0), ('PUT', -4, -2, 0)],
+    'Calendar1-1-2': [('PUT', 0, 1, 1), ('PUT', -2, -1, 1), ('PUT', -4, -2, 0)],
+    'IronCondor': [('PUT', -6, 1, 0), ('PUT', -4, -1, 0), ('CALL', 4, -1, 0), ('CALL', 6, 1, 0)],
+    'Strangle': [('PUT', -4, -1, 0), ('CALL', 4, -1, 0)],
+    'Butterfly': [('CALL', 0, 1, 0), ('CALL', 2, -2, 0), ('CALL', 4, 1, 0)],
+    'BrokenWingButterfly': [('PUT', 0, 1, 0), ('PUT', -2, -2, 0), ('PUT', -6, 1, 0)],
+    'BrokenWingCondor': [('PUT', -10, 1, 0), ('PUT', -6, -1, 0), ('PUT', -4, -1, 0), ('PUT', -2, 1, 0)],
+    'RatioSpread': [('PUT', -2, 1, 0), ('PUT', -4, -2, 0)],
+    'Credit Put Spread': [('PUT', -2, -1, 0), ('PUT', -4, 1, 0)],
+    'Debit Put Spread': [('PUT', -2, 1, 0), ('PUT', -4, -1, 0)],
+    'Credit Call Spread': [('CALL', 2, -1, 0), ('CALL', 4, 1, 0)],
+    'Debit Call Spread': [('CALL', 2, 1, 0), ('CALL', 4, -1, 0)],
+}
+
+# Lotes de cada trade: de 1 a LOTES_MAXIMOS, salvo en las estrategias que el clasificador reconoce por su cantidad
+# neta sin reducir (el 1-1-2 y el Calendar 1-1-2 suman -2 contratos, como en utils.es_1_1_2), que van con 1 lote.
+LOTES_MAXIMOS = 3
+LOTES_POR_ESTRATEGIA = {'1-1-2': 1, 'Calendar1-1-2': 1}
+
+LETRAS_MES = np.array(list('FGHJKMNQUVXZ'))
+
+
+def generar_actividad(filas=1000, semilla=0, fecha_inicio='2024-01-02 09:30', fraccion_cierres=0.3,
+                      fraccion_movimientos=0.01, estrategias=None):
+    """
+    Genera de forma vectorizada un export sintético de transacciones de tastytrade.
+
+    Cada trade es una orden con las patas de una estrategia de ESTRATEGIAS sobre un subyacente de SUBYACENTES
+    (acciones y opciones sobre futuros), con 1 a LOTES_MAXIMOS lotes (o los de LOTES_POR_ESTRATEGIA), precios
+    coherentes con la distancia al spot y el vencimiento, y un Order # único. Una fracción de los trades se
+    cierra con una segunda orden (XXX_TO_CLOSE) antes del vencimiento, y se agregan algunos movimientos de
+    dinero sin subyacente. Las órdenes quedan a más de 3 minutos entre sí, así que el agrupador debería
+    reconstruir cada trade tal cual.
+
+    Args:
+        filas (int): Cantidad aproximada de filas (se corta en el límite de un trade).
+        semilla (int): Semilla del generador aleatorio; la misma semilla produce el mismo archivo.
+        fecha_inicio (str): Fecha y hora (ET) del primer trade.
+        fraccion_cierres (float): Fracción de trades que tienen orden de cierre.
+        fraccion_movimientos (float): Fracción de filas que son movimientos de dinero.
+        estrategias (list): Nombres de ESTRATEGIAS a usar (por defecto, todas con la misma probabilidad).
+
+    Returns:
+        pd.DataFrame: Filas con las columnas de COLUMNAS_ACTIVIDAD, de la más nueva a la más vieja.
+    """
+    rng = np.random.default_rng(semilla)
+    nombres = list(estrategias or ESTRATEGIAS)
+
+    # Tabla plana de patas de todas las plantillas
+    plantillas = [ESTRATEGIAS[nombre] for nombre in nombres]
+    largos = np.array([len(patas) for patas in plantillas])
+    inicios = np.concatenate([[0], np.cumsum(largos)[:-1]])
+    planas = [pata for patas in plantillas for pata in patas]
+    tipo_plano = np.array([pata[0] for pata in planas])
+    distancia_plana = np.array([pata[1] for pata in planas])
+    cantidad_plana = np.array([pata[2] for pata in planas])
+    vencimiento_plano = np.array([pata[3] for pata in planas])
+
+    # Trades: estrategia, subyacente, lotes, fecha, vencimiento y (si corresponde) fecha de cierre
+    filas_trades = max(filas * (1 - fraccion_movimientos), 1)
+    n_trades = int(np.ceil(filas_trades / (largos.mean() * (1 + fraccion_cierres)))) + 1
+    plantilla = rng.integers(0, len(nombres), n_trades)
+    cierra = rng.random(n_trades) < fraccion_cierres
+    filas_por_trade = largos[plantilla] * (1 + cierra)
+    n_trades = max(int(np.searchsorted(np.cumsum(filas_por_trade), filas_trades, side='right')), 1)
+    plantilla, cierra = plantilla[:n_trades], cierra[:n_trades]
+
+    subyacente = rng.integers(0, len(SUBYACENTES), n_trades)
+    lotes_maximos = np.array([LOTES_POR_ESTRATEGIA.get(nombre, LOTES_MAXIMOS) for nombre in nombres])
+    lotes = rng.integers(1, lotes_maximos[plantilla] + 1)
+    apertura = pd.Timestamp(fecha_inicio) + pd.to_timedelta(np.cumsum(rng.integers(240, 1800, n_trades)), unit='s')
+    dte = rng.integers(7, 61, n_trades)
+    vencimiento = _viernes(apertura.to_numpy().astype('datetime64[D]') + dte)
+    dias_abierta = np.minimum(rng.integers(1, 30, n_trades), dte - 1)
+    cierre = apertura + pd.to_timedelta(dias_abierta, unit='D') + pd.to_timedelta(rng.integers(0, 3600, n_trades),
+                                                                                 unit='s')
+
+    spot_base = np.array([s[2] for s in SUBYACENTES])[subyacente]
+    paso = np.array([s[3] for s in SUBYACENTES])[subyacente]
+    spot = spot_base * np.exp(rng.normal(0, 0.05, n_trades))
+    atm = np.round(spot / paso) * paso
+    spot_cierre = spot * np.exp(rng.normal(0, 0.03, n_trades))
+
+    # Patas de apertura: se expanden los trades a una fila por pata de su plantilla
+    patas_por_trade = largos[plantilla]
+    trade = np.repeat(np.arange(n_trades), patas_por_trade)
+    posicion = np.arange(trade.size) - np.repeat(np.cumsum(patas_por_trade) - patas_por_trade, patas_por_trade)
+    pata = inicios[plantilla][trade] + posicion
+
+    tipo = tipo_plano[pata]
+    strike = atm[trade] + distancia_plana[pata] * paso[trade]
+    cantidad = cantidad_plana[pata] * lotes[trade]
+    vencimiento_pata = vencimiento[trade] + vencimiento_plano[pata] * np.timedelta64(28, 'D')
+    fecha = apertura[trade] + pd.to_timedelta(rng.integers(0, 2, trade.size), unit='s')
+    dias = (vencimiento_pata - fecha.to_numpy().astype('datetime64[D]')).astype(int)
+    precio = _precio_opcion(tipo, strike, spot[trade], dias)
+    aperturas = _filas_trade(trade, subyacente[trade], fecha, tipo, strike, vencimiento_pata, cantidad, precio,
+                             al_abrir=True)
+
+    # Patas de cierre: las mismas patas, con la acción opuesta, más tarde y con otro precio
+    cerradas = cierra[trade]
+    trade_c = trade[cerradas]
+    fecha_c = cierre[trade_c] + pd.to_timedelta(rng.integers(0, 2, trade_c.size), unit='s')
+    dias_c = np.maximum((vencimiento_pata[cerradas] - fecha_c.to_numpy().astype('datetime64[D]')).astype(int), 0)
+    precio_c = _precio_opcion(tipo[cerradas], strike[cerradas], spot_cierre[trade_c], dias_c)
+    cierres = _filas_trade(trade_c + n_trades, subyacente[trade_c], fecha_c, tipo[cerradas], strike[cerradas],
+                           vencimiento_pata[cerradas], -cantidad[cerradas], precio_c, al_abrir=False)
+
+    # Movimientos de dinero (sin subyacente: el agrupador los descarta)
+    n_movimientos = int(round(filas * fraccion_movimientos))
+    fechas_mov = apertura[rng.integers(0, n_trades, n_movimientos)] - pd.Timedelta(seconds=30)
+    movimientos = pd.DataFrame({
+        'Date': fechas_mov, 'Type': 'Money Movement', 'Sub Type': 'Balance Adjustment',
+        'Description': 'Regulatory fee adjustment', 'Value': -0.01, 'Quantity': 0, 'Commissions': 0.0,
+        'Fees': 0.0, 'Total': -0.01, 'Currency': 'USD',
+    })
+
+    df = pd.concat([aperturas, cierres, movimientos], ignore_index=True)
+    df = df.sort_values('Date', ascending=False, kind='mergesort').reset_index(drop=True)
+    df['Date'] = np.char.add(np.datetime_as_string(df['Date'].to_numpy(), unit='s'), '-0500')
+    df[['Multiplier', 'Order #']] = df[['Multiplier', 'Order #']].astype('Int64')
+    return df.reindex(columns=COLUMNAS_ACTIVIDAD)
+
+
+def escribir_actividad_sintetica(ruta=None, filas=1000, semilla=0, cuenta='SINTETICO', **opciones):
+    """
+    Genera un export sintético y lo guarda como CSV. Si no se indica ruta, se usa el formato de nombre de los
+    exports de tastytrade en data/csv/sintetico/.
+
+    Returns:
+        str: Ruta del CSV escrito.
+    """
+    df = generar_actividad(filas, semilla, **opciones)
+    if ruta is None:
+        desde = df['Date'].iloc[-1][2:10].replace('-', '')
+        hasta = df['Date'].iloc[0][2:10].replace('-', '')
+        ruta = os.path.join("data/csv/sintetico", f"tastytrade_transactions_history_{cuenta}_{desde}_to_{hasta}.csv")
+    if os.path.dirname(ruta):
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    df.to_csv(ruta, index=False, float_format='%.2f')
+    return ruta
+
+
+def leer_tamano(valor):
+    """
+    Convierte un tamaño ('1k', '100k', '1M' o un número) en cantidad de filas.
+    """
+    if valor in TAMANOS:
+        return TAMANOS[valor]
+    multiplicadores = {'k': 1_000, 'M': 1_000_000}
+    if valor and valor[-1] in multiplicadores:
+        return int(float(valor[:-1]) * multiplicadores[valor[-1]])
+    return int(valor)
+
+
+def _viernes(fechas):
+    """
+    Lleva cada fecha (datetime64[D]) al viernes siguiente (o la deja si ya es viernes).
+    """
+    dia_semana = (fechas.astype('int64') + 3) % 7  # 1970-01-01 fue jueves; lunes = 0
+    return fechas + ((4 - dia_semana) % 7).astype('timedelta64[D]')
+
+
+def _formatear_fechas(fechas, formato):
+    """
+    Formatea un array de fechas con strftime, una sola vez por fecha distinta (hay pocos vencimientos).
+    """
+    unicas, inverso = np.unique(fechas, return_inverse=True)
+    return pd.Series(unicas).dt.strftime(formato).to_numpy()[inverso]
+
+
+def _precio_opcion(tipo, strike, spot, dias):
+    """
+    Precio aproximado de una opción: valor intrínseco más un valor tiempo que decae con la distancia al spot
+    (volatilidad fija del 20%). No pretende ser exacto, solo ordenar bien los precios entre strikes y plazos.
+    """
+    desvio = 0.2 * spot * np.sqrt(np.maximum(dias, 1) / 365)
+    distancia = strike - spot
+    intrinseco = np.where(tipo == 'PUT', np.maximum(distancia, 0), np.maximum(-distancia, 0))
+    valor_tiempo = 0.4 * desvio * np.exp(-0.5 * (distancia / desvio) ** 2)
+    return np.maximum(np.round((intrinseco + valor_tiempo) * 20) / 20, 0.05)
+
+
+def _filas_trade(orden, subyacente, fecha, tipo, strike, vencimiento, cantidad, precio, al_abrir):
+    """
+    Arma las filas del CSV (una por pata) de órdenes de apertura o de cierre.
+    """
+    root = np.array([s[0] for s in SUBYACENTES])[subyacente]
+    es_futuro = np.array([s[1] == 'Future Option' for s in SUBYACENTES])[subyacente]
+    multiplicador = np.array([s[4] for s in SUBYACENTES])[subyacente]
+    comision = np.array([s[5] for s in SUBYACENTES])[subyacente]
+    fee = np.array([s[6] for s in SUBYACENTES])[subyacente]
+
+    vende = cantidad < 0
+    contratos = np.abs(cantidad)
+    sufijo = 'OPEN' if al_abrir else 'CLOSE'
+    accion = np.where(vende, f'SELL_TO_{sufijo}', f'BUY_TO_{sufijo}')
+    sub_tipo = np.where(vende, f'Sell to {sufijo.title()}', f'Buy to {sufijo.title()}')
+    valor = np.round(np.where(vende, 1, -1) * precio * multiplicador * contratos, 2)
+    comisiones = np.where(al_abrir, -comision * contratos, 0.0)
+    fees = np.round(-fee * contratos, 2)
+
+    venc = pd.Series(vencimiento)
+    yymmdd = _formatear_fechas(vencimiento, '%y%m%d')
+    letra = np.where(tipo == 'PUT', 'P', 'C')
+    tipo_texto = np.where(tipo == 'PUT', 'Put', 'Call')
+
+    # Futuro trimestral (H, M, U, Z) del vencimiento y código de la serie semanal de la opción
+    mes = venc.dt.month.to_numpy()
+    anio = (venc.dt.year.to_numpy() % 10).astype(str)
+    futuro = root + LETRAS_MES[((mes - 1) // 3) * 3 + 2] + anio
+    codigo = 'EW' + ((venc.dt.day.to_numpy() - 1) // 7 + 1).astype(str) + LETRAS_MES[mes - 1] + anio
+
+    strike_texto = pd.Series(strike).map('{:g}'.format).to_numpy()
+    strike_occ = pd.Series((strike * 1000).round().astype('int64')).astype(str).str.zfill(8).to_numpy()
+    simbolo = np.where(es_futuro,
+                       '.' + futuro + ' ' + codigo + ' ' + yymmdd + letra + strike_texto,
+                       pd.Series(root).str.ljust(6).to_numpy() + yymmdd + letra + strike_occ)
+    nombre = np.where(es_futuro, futuro + ' ' + codigo, root)
+    descripcion = (np.where(vende, 'Sold ', 'Bought ') + contratos.astype(str) + ' ' + nombre + ' ' +
+                   _formatear_fechas(vencimiento, '%m/%d/%y') + ' ' + tipo_texto + ' ' +
+                   pd.Series(strike).map('{:.2f}'.format).to_numpy() + ' @ ' +
+                   pd.Series(precio).map('{:.2f}'.format).to_numpy())
+
+    return pd.DataFrame({
+        'Date': fecha,
+        'Type': 'Trade',
+        'Sub Type': sub_tipo,
+        'Action': accion,
+        'Symbol': simbolo,
+        'Instrument Type': np.where(es_futuro, 'Future Option', 'Equity Option'),
+        'Description': descripcion,
+        'Value': valor,
+        'Quantity': contratos,
+        'Average Price': np.round(-valor / contratos, 2),
+        'Commissions': comisiones,
+        'Fees': fees,
+        'Multiplier': multiplicador,
+        'Root Symbol': np.where(es_futuro, '.' + root, root),
+        'Underlying Symbol': np.where(es_futuro, futuro, root),
+        'Expiration Date': _formatear_fechas(vencimiento, '%m/%d/%y'),
+        'Strike Price': strike_texto,
+        'Call or Put': tipo,
+        'Order #': 300000000 + orden,
+        'Total': np.round(valor + comisiones + fees, 2),
+        'Currency': 'USD',
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera un export sintético de transacciones de tastytrade.")
+    parser.add_argument('--filas', default='1k', help="Cantidad de filas: 1k, 100k, 1M o un número (por defecto 1k)")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla del generador (por defecto 0)")
+    parser.add_argument('--salida', default=None, help="Ruta del CSV (por defecto, data/csv/sintetico/...)")
+    parser.add_argument('--cierres', type=float, default=0.3, help="Fracción de trades con orden de cierre")
+    argumentos = parser.parse_args()
+
+    ruta = escribir_actividad_sintetica(argumentos.salida, leer_tamano(argumentos.filas), argumentos.semilla,
+                                        fraccion_cierres=argumentos.cierres)
+    print(f"Archivo de actividad sintético creado: {ruta}")
@@ -0,0 +1,311 @@
+import argparse
+import math
+import os
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from archivos_yaml import LoteYAML
+from cuentas import iterar_posiciones
+from log_diario import agregar_entradas_diarias, ruta_diario
+from utils import MULTIPLICADORES, MULTIPLICADOR_ACCIONES
+
+# Datos de mercado por subyacente: columnas subyacente, precio, iv (en tanto por uno) y, opcional, tasa
+ARCHIVO_MERCADO = "data/mercado/datos_mercado.csv"
+TASA_LIBRE_RIESGO = 0.045
+DIAS_ANIO = 365.0
+
+# Cuadratura de la normal estándar con la que se integra el resultado al vencimiento para estimar el POP
+Z_POP = np.linspace(-5.0, 5.0, 201)
+PESOS_POP = np.exp(-Z_POP ** 2 / 2)
+PESOS_POP /= PESOS_POP.sum()
+
+
+def cargar_datos_mercado(ruta=ARCHIVO_MERCADO):
+    """
+    Lee el archivo local de datos de mercado.
+
+    Returns:
+        pandas.DataFrame: Indexado por subyacente, con precio, iv y tasa (TASA_LIBRE_RIESGO si falta).
+    """
+    datos = pd.read_csv(ruta, dtype={'subyacente': 'string'})
+    if 'tasa' not in datos:
+        datos['tasa'] = TASA_LIBRE_RIESGO
+    datos['tasa'] = datos['tasa'].fillna(TASA_LIBRE_RIESGO)
+    return datos.drop_duplicates('subyacente', keep='last').set_index('subyacente')[['precio', 'iv', 'tasa']]
+
+
+def _cdf_normal(x):
+    # Abramowitz y Stegun 7.1.26 (error absoluto < 1.5e-7), para no depender de scipy
+    t = 1.0 / (1.0 + 0.3275911 * np.abs(x) / math.sqrt(2.0))
+    polinomio = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    return 0.5 * (1.0 + np.sign(x) * (1.0 - polinomio * np.exp(-x * x / 2.0)))
+
+
+def black_scholes(es_call, spot, strike, anios, iv, tasa, futuro):
+    """
+    Precio y griegas de opciones europeas, elemento a elemento sobre arrays (se aplica broadcasting).
+
+    Las opciones sobre acciones usan Black-Scholes y las opciones sobre futuros Black-76 (el mismo modelo con
+    costo de carry cero). Las opciones vencidas (anios <= 0) valen su valor intrínseco.
+
+    Returns:
+        dict: Arrays 'precio', 'delta', 'theta' (por día calendario) y 'vega' (por punto de IV), por unidad
+        del subyacente (sin multiplicador ni cantidad).
+    """
+    es_call, spot, strike, anios, iv, tasa, futuro = np.broadcast_arrays(
+        np.asarray(es_call, dtype=bool), *(np.asarray(valor, dtype='float64')
+                                           for valor in (spot, strike, anios, iv, tasa)),
+        np.asarray(futuro, dtype=bool))
+    signo = np.where(es_call, 1.0, -1.0)
+    vigente = (anios > 0) & (iv > 0)
+    t = np.where(vigente, anios, 1.0)
+    sigma = np.where(vigente, iv, 1.0)
+    carry = np.where(futuro, 0.0, tasa)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        raiz_t = np.sqrt(t)
+        d1 = (np.log(spot / strike) + (carry + sigma ** 2 / 2) * t) / (sigma * raiz_t)
+        d2 = d1 - sigma * raiz_t
+        spot_descontado = spot * np.exp((carry - tasa) * t)
+        strike_descontado = strike * np.exp(-tasa * t)
+        n_d1 = _cdf_normal(signo * d1)
+        n_d2 = _cdf_normal(signo * d2)
+        densidad_d1 = np.exp(-d1 ** 2 / 2) / math.sqrt(2 * math.pi)
+
+        precio = signo * (spot_descontado * n_d1 - strike_descontado * n_d2)
+        delta = signo * np.exp((carry - tasa) * t) * n_d1
+        theta = (-spot_descontado * densidad_d1 * sigma / (2 * raiz_t) - signo * (carry - tasa) * spot_descontado *
+                 n_d1 - signo * tasa * strike_descontado * n_d2) / DIAS_ANIO
+        vega = spot_descontado * densidad_d1 * raiz_t / 100.0
+
+    intrinseco = np.maximum(signo * (spot - strike), 0.0)
+    return {
+        'precio': np.where(vigente, precio, intrinseco),
+        'delta': np.where(vigente, delta, np.where(intrinseco > 0, signo, 0.0)),
+        'theta': np.where(vigente, theta, 0.0),
+        'vega': np.where(vigente, vega, 0.0),
+    }
+
+
+class MotorGriegas:
+    """
+    Calcula las griegas de las patas y posiciones con los datos de mercado de una fecha.
+
+    Los resultados por pata se guardan en un cache con clave (strike, vencimiento, tipo, spot, iv, tasa,
+    futuro): la fecha de valuación es fija para cada motor, así que un mismo contrato con el mismo mercado no
+    se vuelve a calcular, y los que faltan se calculan todos juntos en una sola pasada vectorizada.
+    """
+
+    def __init__(self, datos_mercado=None, fecha=None):
+        if datos_mercado is None or isinstance(datos_mercado, str):
+            datos_mercado = cargar_datos_mercado(datos_mercado or ARCHIVO_MERCADO)
+        self.mercado = datos_mercado
+        self.fecha = fecha or date.today()
+        self.cache = {}
+        self.aciertos = 0
+        self.calculadas = 0
+
+    def griegas_patas(self, subyacentes, tipos, strikes, vencimientos):
+        """
+        Devuelve las griegas por unidad de cada pata (NaN si no hay datos de mercado de su subyacente).
+
+        Returns:
+            dict: Arrays 'precio', 'delta', 'theta', 'vega' y los datos usados: 'spot', 'iv', 'tasa',
+            'futuro' y 'anios' (años al vencimiento).
+        """
+        cantidad = len(strikes)
+        mercado = self.mercado.reindex(pd.Index(subyacentes, dtype='string'))
+        datos = {
+            'spot': mercado['precio'].to_numpy(dtype='float64'),
+            'iv': mercado['iv'].to_numpy(dtype='float64'),
+            'tasa': mercado['tasa'].to_numpy(dtype='float64'),
+            'futuro': np.fromiter((str(subyacente).startswith('/') for subyacente in subyacentes), bool, cantidad),
+            'anios': np.fromiter(((vencimiento - self.fecha).days / DIAS_ANIO for vencimiento in vencimientos),
+                                 'float64', cantidad),
+        }
+        claves = list(zip(strikes, vencimientos, tipos, datos['spot'], datos['iv'], datos['tasa'], datos['futuro']))
+
+        faltantes = {}
+        for indice, clave in enumerate(claves):
+            if clave not in self.cache and not math.isnan(clave[3]) and not math.isnan(clave[4]):
+                faltantes.setdefault(clave, indice)
+        if faltantes:
+            indices = np.fromiter(faltantes.values(), np.intp, len(faltantes))
+            calculo = black_scholes(np.asarray(tipos, dtype=object)[indices] == 'CALL',
+                                    datos['spot'][indices], np.asarray(strikes, dtype='float64')[indices],
+                                    datos['anios'][indices], datos['iv'][indices], datos['tasa'][indices],
+                                    datos['futuro'][indices])
+            filas = np.column_stack([calculo['precio'], calculo['delta'], calculo['theta'], calculo['vega']])
+            self.cache.update(zip(faltantes, map(tuple, filas)))
+            self.calculadas += len(faltantes)
+        self.aciertos += cantidad - len(faltantes)
+
+        sin_datos = (math.nan,) * 4
+        valores = np.array([self.cache.get(clave, sin_datos) for clave in claves], dtype='float64').reshape(-1, 4)
+        datos.update(precio=valores[:, 0], delta=valores[:, 1], theta=valores[:, 2], vega=valores[:, 3])
+        return datos
+
+    def valuar_posiciones(self, posiciones):
+        """
+        Calcula delta, theta, vega y POP de cada posición sumando sus patas abiertas en una sola pasada.
+
+        Delta, theta y vega son la suma de cantidad * multiplicador * griega de cada pata. El POP es la
+        probabilidad (lognormal, con la IV del subyacente) de que el resultado al vencimiento más cercano sea
+        positivo: el flujo neto de la posición más el valor teórico de sus patas en ese momento.
+
+        Args:
+            posiciones (list): Diccionarios de posición (con el esquema del YAML).
+
+        Returns:
+            pandas.DataFrame: Una fila por posición con delta, theta, vega, pop y dte_cercano (NaN si la
+            posición no tiene patas abiertas o falta su subyacente en los datos de mercado).
+        """
+        indice_posicion, subyacentes, tipos, strikes, vencimientos, cantidades = [], [], [], [], [], []
+        for numero, posicion_data in enumerate(posiciones):
+            for pata in posicion_data.get('patas') or []:
+                if pata.get('fecha_cierre') is None and pata.get('vencimiento') is not None:
+                    indice_posicion.append(numero)
+                    subyacentes.append(posicion_data['subyacente'])
+                    tipos.append(pata['tipo'])
+                    strikes.append(float(pata['strike']))
+                    vencimientos.append(_a_fecha(pata['vencimiento']))
+                    cantidades.append(float(pata['cantidad']))
+
+        cantidad_posiciones = len(posiciones)
+        resultado = pd.DataFrame(np.nan, index=range(cantidad_posiciones),
+                                 columns=['delta', 'theta', 'vega', 'pop', 'dte_cercano'])
+        if not indice_posicion:
+            return resultado
+
+        indice_posicion = np.asarray(indice_posicion)
+        patas = self.griegas_patas(subyacentes, tipos, strikes, vencimientos)
+        peso = np.asarray(cantidades) * np.fromiter(
+            (MULTIPLICADORES.get(subyacente, MULTIPLICADOR_ACCIONES) for subyacente in subyacentes), 'float64',
+            len(subyacentes))
+        for griega in ('delta', 'theta', 'vega'):
+            resultado[griega] = np.bincount(indice_posicion, peso * patas[griega], cantidad_posiciones)
+        sin_datos = np.bincount(indice_posicion, np.isnan(patas['delta']), cantidad_posiciones) > 0
+        sin_patas = np.bincount(indice_posicion, minlength=cantidad_posiciones) == 0
+
+        # Vencimiento más cercano de cada posición y valor de todas sus patas en ese momento, sobre una grilla
+        # de precios del subyacente (una fila por pata, una columna por punto de la cuadratura)
+        anios_cercano = np.full(cantidad_posiciones, np.inf)
+        np.minimum.at(anios_cercano, indice_posicion, patas['anios'])
+        t = np.maximum(anios_cercano[indice_posicion], 0.0)[:, None]
+        carry = np.where(patas['futuro'], 0.0, patas['tasa'])[:, None]
+        iv = patas['iv'][:, None]
+        spot_vencimiento = patas['spot'][:, None] * np.exp((carry - iv ** 2 / 2) * t + iv * np.sqrt(t) * Z_POP)
+        es_call = np.asarray(tipos, dtype=object) == 'CALL'
+        strikes = np.asarray(strikes)
+        valor = np.maximum(np.where(es_call, 1.0, -1.0)[:, None] * (spot_vencimiento - strikes[:, None]), 0.0)
+        # Solo las patas que vencen después (calendars, diagonales) conservan valor temporal
+        posteriores = patas['anios'] > t[:, 0]
+        if posteriores.any():
+            valor[posteriores] = black_scholes(
+                es_call[posteriores, None], spot_vencimiento[posteriores], strikes[posteriores, None],
+                (patas['anios'] - t[:, 0])[posteriores, None], iv[posteriores], patas['tasa'][posteriores, None],
+                patas['futuro'][posteriores, None])['precio']
+        resultado_vencimiento = np.zeros((cantidad_posiciones, len(Z_POP)))
+        np.add.at(resultado_vencimiento, indice_posicion, peso[:, None] * valor)
+        flujo = np.array([posicion_data.get('credito_debito_actual') or 0.0 for posicion_data in posiciones])
+        resultado['pop'] = ((resultado_vencimiento + flujo[:, None]) > 0) @ PESOS_POP
+        resultado['dte_cercano'] = np.floor(anios_cercano * DIAS_ANIO + 0.5)
+
+        resultado.loc[sin_datos | sin_patas] = np.nan
+        return resultado
+
+
+def actualizar_griegas(carpeta_posiciones="data/yaml/posiciones_activas/", datos_mercado=None, fecha=None,
+                       motor=None):
+    """
+    Calcula las griegas de todas las posiciones activas (también las de las particiones por cuenta) y las
+    registra.
+
+    Cada posición recibe una entrada de log_diario para la fecha de valuación (delta, theta, pop_estimado y
+    dte_cercano, conservando los demás datos que ya tuviera ese día), que se agrega a su diario. Las posiciones
+    que todavía no tienen griegas iniciales completan además delta_inicial, theta_inicial, vega_inicial y
+    pop_inicial, y en ese caso su YAML se reescribe con la entrada ya incluida.
+
+    Args:
+        carpeta_posiciones (str): Carpeta de las posiciones activas.
+        datos_mercado: Ruta del archivo de datos de mercado o DataFrame de cargar_datos_mercado.
+        fecha (date): Fecha de valuación (por defecto, hoy).
+        motor (MotorGriegas): Motor a usar (y su cache); por defecto se crea uno para la fecha.
+
+    Returns:
+        pandas.DataFrame: Las griegas por posición, indexadas por nombre de archivo (relativo a la carpeta).
+    """
+    if motor is None:
+        motor = MotorGriegas(datos_mercado, fecha)
+    fecha_texto = motor.fecha.strftime('%Y%m%d')
+
+    posiciones = list(iterar_posiciones(carpeta_posiciones))
+    resultado = motor.valuar_posiciones([posicion_data for _, posicion_data in posiciones])
+    resultado.index = [nombre_archivo for nombre_archivo, _ in posiciones]
+
+    lote = LoteYAML()
+    reescritas = []
+    entradas = []
+    for (nombre_archivo, posicion_data), fila in zip(posiciones, resultado.itertuples(index=False)):
+        if math.isnan(fila.delta):
+            continue
+        ruta = os.path.join(carpeta_posiciones, nombre_archivo)
+        log_diario = posicion_data.get('log_diario') or {}
+        entrada = {
+            'credito_debito': posicion_data.get('credito_debito_actual'),
+            'mark_precio_spread': None,
+            'beta_delta': None,
+            'ivr_promedio': None,
+            **(log_diario.get(fecha_texto) or {}),
+            'dte_cercano': int(fila.dte_cercano),
+            'delta': round(float(fila.delta), 4),
+            'theta': round(float(fila.theta), 4),
+            'pop_estimado': round(float(fila.pop), 4),
+        }
+        if all(posicion_data.get(campo) is None for campo in ('delta_inicial', 'theta_inicial', 'vega_inicial',
+                                                               'pop_inicial')):
+            posicion_data.update(delta_inicial=entrada['delta'], theta_inicial=entrada['theta'],
+                                 vega_inicial=round(float(fila.vega), 4), pop_inicial=entrada['pop_estimado'])
+            posicion_data['log_diario'] = {**log_diario, fecha_texto: entrada}
+            lote.agregar(ruta, posicion_data)
+            reescritas.append(ruta)
+        else:
+            entradas.append((ruta, fecha_texto, entrada))
+
+    lote.confirmar()
+    # Los YAML reescritos ya incluyen las entradas de sus diarios (cargar_posicion las aplicó)
+    for ruta in reescritas:
+        try:
+            os.remove(ruta_diario(ruta))
+        except FileNotFoundError:
+            pass
+    agregar_entradas_diarias(entradas)
+
+    sin_datos = int(resultado['delta'].isna().sum())
+    print(f"Griegas actualizadas: {len(posiciones) - sin_datos} posiciones ({len(reescritas)} con griegas "
+          f"iniciales nuevas, {sin_datos} sin datos de mercado o sin patas abiertas)")
+    return resultado
+
+
+def _a_fecha(valor):
+    """
+    Convierte un vencimiento (date, datetime o texto YYYY-MM-DD) a date.
+    """
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return datetime.strptime(str(valor), '%Y-%m-%d').date()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calcula las griegas de las posiciones activas.")
+    parser.add_argument('--carpeta', default="data/yaml/posiciones_activas/", help="Carpeta de posiciones activas")
+    parser.add_argument('--mercado', default=ARCHIVO_MERCADO, help="CSV de datos de mercado: subyacente,precio,iv,tasa")
+    parser.add_argument('--fecha', default=None, help="Fecha de valuación YYYYMMDD (por defecto, hoy)")
+    argumentos = parser.parse_args()
+
+    fecha = datetime.strptime(argumentos.fecha, '%Y%m%d').date() if argumentos.fecha else None
+    actualizar_griegas(argumentos.carpeta, argumentos.mercado, fecha)
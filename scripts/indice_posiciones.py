@@ -0,0 +1,290 @@
+import argparse
+import os
+import time
+from datetime import date
+
+import numpy as np
+
+from cuentas import carpeta_cuenta, listar_cuentas
+from log_diario import SUFIJO_DIARIO, cargar_posicion
+
+# Campos con índice hash (valor -> ids de las posiciones)
+CAMPOS_HASH = ('subyacente', 'estrategia')
+
+# Sin vencimiento abierto (o sin fecha de inicio legible): queda fuera de las búsquedas por rango
+SIN_FECHA = np.iinfo(np.int64).max
+
+IDS_VACIOS = np.empty(0, dtype=np.int64)
+
+
+class IndicePosiciones:
+    """
+    Índice en memoria de las posiciones de una carpeta (y de sus particiones por cuenta, ver cuentas.py) para
+    consultas repetidas, como las de un tablero, sin abrir ningún YAML.
+
+    Cada posición se carga una vez (con su diario aplicado, ver log_diario.cargar_posicion) y refrescar() solo
+    vuelve a leer las que cambiaron: la firma de cada una es el mtime y tamaño de su YAML y de su diario, que
+    salen de un único os.scandir por carpeta. Sobre las posiciones en memoria se mantienen:
+
+    - un índice hash por subyacente y por estrategia (valor -> array de ids),
+    - arrays ordenados por vencimiento abierto más cercano y por fecha_inicio, para rangos con searchsorted,
+    - una columna por campo (códigos de subyacente y estrategia, vencimiento, fecha_inicio y abierta).
+
+    Una consulta parte del candidato más chico (un bucket del hash o un tramo de un array ordenado) y aplica
+    el resto de los filtros de forma vectorizada sobre las columnas, así su costo depende de cuántas
+    posiciones cumplen y no de cuántas hay. Los índices se rearman en memoria la primera vez que se consulta
+    después de un refresco con cambios.
+    """
+
+    def __init__(self, carpeta_posiciones="data/yaml/posiciones_activas/"):
+        self.carpeta_posiciones = carpeta_posiciones
+        self.posiciones = {}
+        # Lo que usan los índices de cada posición: (subyacente, estrategia, vencimiento, fecha_inicio, abierta, id)
+        self.registros = {}
+        # Firma en disco de cada posición cargada: ((mtime, tamaño) del YAML, (mtime, tamaño) del diario o None)
+        self.firmas = {}
+        self._indices = None
+        self.refrescar()
+
+    def __len__(self):
+        return len(self.posiciones)
+
+    def refrescar(self):
+        """
+        Pone el índice al día con la carpeta: recarga las posiciones cuyo YAML o diario cambió de mtime o de
+        tamaño, agrega las nuevas y quita las que ya no están.
+
+        Returns:
+            int: Cantidad de posiciones recargadas, agregadas o quitadas.
+        """
+        firmas = {}
+        for carpeta in [self.carpeta_posiciones] + [carpeta_cuenta(self.carpeta_posiciones, cuenta)
+                                                    for cuenta in listar_cuentas(self.carpeta_posiciones)]:
+            firmas.update(_firmas_carpeta(carpeta))
+
+        cambios = 0
+        for ruta in set(self.posiciones) - set(firmas):
+            self._quitar(ruta)
+            cambios += 1
+        for ruta, firma in firmas.items():
+            if self.firmas.get(ruta) == firma:
+                continue
+            try:
+                posicion = cargar_posicion(ruta)
+            except FileNotFoundError:
+                # Se movió (por ejemplo, a cerradas) entre el scandir y la lectura
+                if ruta in self.posiciones:
+                    self._quitar(ruta)
+                    cambios += 1
+                continue
+            self.posiciones[ruta] = posicion
+            self.registros[ruta] = _registro(posicion)
+            self.firmas[ruta] = firma
+            cambios += 1
+        if cambios:
+            self._indices = None
+        return cambios
+
+    def _quitar(self, ruta):
+        del self.posiciones[ruta]
+        del self.registros[ruta]
+        del self.firmas[ruta]
+
+    def buscar(self, subyacente=None, estrategia=None, abierta=None, fecha_desde=None, fecha_hasta=None,
+               vencimiento_desde=None, vencimiento_hasta=None, dte_min=None, dte_max=None, hoy=None):
+        """
+        Devuelve las posiciones que cumplen todos los filtros indicados, en orden de ruta.
+
+        Los filtros subyacente, estrategia, abierta, fecha_desde y fecha_hasta son los de
+        AlmacenPosiciones.buscar (fechas YYYYMMDD contra fecha_inicio). vencimiento_desde y vencimiento_hasta
+        (date o 'YYYY-MM-DD') y dte_min y dte_max (días desde hoy) se comparan contra el vencimiento abierto más
+        cercano de la posición; todos los rangos son inclusive.
+        """
+        indices = self._indices_al_dia()
+        ids = self._seleccionar(indices, subyacente, estrategia, abierta, fecha_desde, fecha_hasta,
+                                vencimiento_desde, vencimiento_hasta, dte_min, dte_max, hoy)
+        rutas = indices['rutas']
+        return [self.posiciones[rutas[i]] for i in np.sort(ids).tolist()]
+
+    def contar(self, **filtros):
+        """
+        Devuelve cuántas posiciones cumplen los filtros de buscar, sin armar la lista.
+        """
+        indices = self._indices_al_dia()
+        return len(self._seleccionar(indices, **filtros))
+
+    def rutas(self, **filtros):
+        """
+        Devuelve las rutas de los YAML de las posiciones que cumplen los filtros de buscar.
+        """
+        indices = self._indices_al_dia()
+        return [indices['rutas'][i] for i in np.sort(self._seleccionar(indices, **filtros)).tolist()]
+
+    def cargar(self, id_posicion):
+        """
+        Devuelve la posición con ese id, o None.
+        """
+        ruta = self._indices_al_dia()['por_id'].get(id_posicion)
+        return self.posiciones[ruta] if ruta is not None else None
+
+    def _seleccionar(self, indices, subyacente=None, estrategia=None, abierta=None, fecha_desde=None,
+                     fecha_hasta=None, vencimiento_desde=None, vencimiento_hasta=None, dte_min=None, dte_max=None,
+                     hoy=None):
+        """
+        Devuelve los ids (posiciones en indices['rutas']) de las posiciones que cumplen los filtros, sin ordenar.
+        """
+        rangos = {}
+        if any(valor is not None for valor in (vencimiento_desde, vencimiento_hasta, dte_min, dte_max)):
+            desde, hasta = _a_dia(vencimiento_desde, -1), _a_dia(vencimiento_hasta, SIN_FECHA - 1)
+            hoy = _a_dia(hoy or date.today(), None)
+            if dte_min is not None:
+                desde = max(desde, hoy + dte_min)
+            if dte_max is not None:
+                hasta = min(hasta, hoy + dte_max)
+            rangos['vencimiento'] = (desde, hasta)
+        if fecha_desde is not None or fecha_hasta is not None:
+            rangos['fecha_inicio'] = (_a_numero(fecha_desde, -1), _a_numero(fecha_hasta, SIN_FECHA - 1))
+
+        # Candidatos: el bucket o tramo más chico
+        candidatos = []
+        for campo, valor in (('subyacente', subyacente), ('estrategia', estrategia)):
+            if valor is not None:
+                candidatos.append(indices['hash'][campo].get(valor, IDS_VACIOS))
+        for campo, (desde, hasta) in rangos.items():
+            claves, orden = indices['ordenados'][campo]
+            candidatos.append(orden[np.searchsorted(claves, desde, 'left'):np.searchsorted(claves, hasta, 'right')])
+        ids = min(candidatos, key=len) if candidatos else np.arange(len(indices['rutas']))
+        if len(candidatos) <= 1 and abierta is None:
+            return ids
+
+        seleccion = np.ones(len(ids), dtype=bool)
+        columnas = indices['columnas']
+        for campo, valor in (('subyacente', subyacente), ('estrategia', estrategia)):
+            if valor is not None:
+                seleccion &= columnas[campo][ids] == indices['codigos'][campo].get(valor, -1)
+        for campo, (desde, hasta) in rangos.items():
+            valores = columnas[campo][ids]
+            seleccion &= (valores >= desde) & (valores <= hasta)
+        if abierta is not None:
+            seleccion &= columnas['abierta'][ids] == bool(abierta)
+        return ids[seleccion]
+
+    def _indices_al_dia(self):
+        if self._indices is None:
+            self._indices = self._armar_indices()
+        return self._indices
+
+    def _armar_indices(self):
+        """
+        Arma columnas, índices hash y arrays ordenados a partir de los registros de las posiciones en memoria.
+        """
+        rutas = sorted(self.registros)
+        subyacentes, estrategias, vencimientos, fechas, abiertas, ids = zip(*map(self.registros.get, rutas)) \
+            if rutas else ((),) * 6
+        columnas = {'vencimiento': np.array(vencimientos, dtype=np.int64),
+                    'fecha_inicio': np.array(fechas, dtype=np.int64),
+                    'abierta': np.array(abiertas, dtype=bool)}
+        codigos, hash_ = {}, {}
+        for campo, valores in zip(CAMPOS_HASH, (subyacentes, estrategias)):
+            codigos[campo] = {}
+            columnas[campo] = np.array([codigos[campo].setdefault(valor, len(codigos[campo])) for valor in valores],
+                                       dtype=np.int64)
+            orden = np.argsort(columnas[campo], kind='stable')
+            cortes = np.searchsorted(columnas[campo][orden], np.arange(len(codigos[campo]) + 1))
+            hash_[campo] = {valor: orden[cortes[codigo]:cortes[codigo + 1]]
+                            for valor, codigo in codigos[campo].items()}
+        ordenados = {}
+        for campo in ('vencimiento', 'fecha_inicio'):
+            orden = np.argsort(columnas[campo], kind='stable')
+            ordenados[campo] = (columnas[campo][orden], orden)
+        return {'rutas': rutas, 'columnas': columnas, 'codigos': codigos, 'hash': hash_, 'ordenados': ordenados,
+                'por_id': dict(zip(ids, rutas))}
+
+
+def _firmas_carpeta(carpeta):
+    """
+    Devuelve {ruta del YAML: firma} de las posiciones de una carpeta, con un único os.scandir.
+    """
+    if not os.path.isdir(carpeta):
+        return {}
+    yamls, diarios = {}, {}
+    for entrada in os.scandir(carpeta):
+        if entrada.name.endswith('.yaml'):
+            estado = entrada.stat()
+            yamls[entrada.path] = (estado.st_mtime_ns, estado.st_size)
+        elif entrada.name.endswith(SUFIJO_DIARIO):
+            estado = entrada.stat()
+            diarios[entrada.path[:-len(SUFIJO_DIARIO)] + '.yaml'] = (estado.st_mtime_ns, estado.st_size)
+    return {ruta: (estado, diarios.get(ruta)) for ruta, estado in yamls.items()}
+
+
+def _registro(posicion):
+    """
+    Devuelve lo que los índices usan de una posición: (subyacente, estrategia, vencimiento abierto más cercano,
+    fecha_inicio, abierta, id).
+    """
+    return (posicion.get('subyacente'), posicion.get('estrategia'), _vencimiento_cercano(posicion),
+            _a_numero(posicion.get('fecha_inicio'), SIN_FECHA), posicion.get('fecha_cierre') is None,
+            posicion.get('id'))
+
+
+def _vencimiento_cercano(posicion):
+    """
+    Vencimiento abierto más cercano de la posición, en días desde 1970 (SIN_FECHA si no tiene patas abiertas).
+    """
+    vencimientos = [_a_dia(pata.get('vencimiento'), SIN_FECHA) for pata in posicion.get('patas') or []
+                    if pata.get('fecha_cierre') is None]
+    return min(vencimientos, default=SIN_FECHA)
+
+
+def _a_dia(valor, defecto):
+    """
+    Convierte una fecha (date o 'YYYY-MM-DD') en días desde 1970; defecto si es None o no se puede leer.
+    """
+    if valor is None:
+        return defecto
+    if not isinstance(valor, date):
+        try:
+            valor = date.fromisoformat(str(valor)[:10])
+        except ValueError:
+            return defecto
+    return valor.toordinal() - 719163
+
+
+def _a_numero(valor, defecto):
+    """
+    Convierte una fecha YYYYMMDD (texto o número) en entero; defecto si es None o no se puede leer.
+    """
+    try:
+        return int(valor) if valor is not None else defecto
+    except (TypeError, ValueError):
+        return defecto
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga el índice en memoria de posiciones y mide una consulta.")
+    parser.add_argument('--carpeta', default="data/yaml/posiciones_activas/", help="Carpeta de posiciones activas")
+    parser.add_argument('--subyacente', default=None)
+    parser.add_argument('--estrategia', default=None)
+    parser.add_argument('--dte-min', type=int, default=None, help="DTE mínimo del vencimiento más cercano")
+    parser.add_argument('--dte-max', type=int, default=None, help="DTE máximo del vencimiento más cercano")
+    parser.add_argument('--desde', default=None, help="Fecha de inicio mínima (YYYYMMDD)")
+    parser.add_argument('--hasta', default=None, help="Fecha de inicio máxima (YYYYMMDD)")
+    parser.add_argument('--repeticiones', type=int, default=1000, help="Repeticiones para medir la consulta")
+    argumentos = parser.parse_args()
+
+    inicio = time.perf_counter()
+    indice = IndicePosiciones(argumentos.carpeta)
+    print(f"{len(indice)} posiciones cargadas en {time.perf_counter() - inicio:.2f} s")
+    inicio = time.perf_counter()
+    cambios = indice.refrescar()
+    print(f"Refresco: {cambios} cambios en {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+    filtros = dict(subyacente=argumentos.subyacente, estrategia=argumentos.estrategia, dte_min=argumentos.dte_min,
+                   dte_max=argumentos.dte_max, fecha_desde=argumentos.desde, fecha_hasta=argumentos.hasta)
+    cantidad = indice.contar(**filtros)
+    inicio = time.perf_counter()
+    for _ in range(argumentos.repeticiones):
+        indice.contar(**filtros)
+    print(f"{cantidad} posiciones; {(time.perf_counter() - inicio) / argumentos.repeticiones * 1e6:.1f} µs por "
+          f"consulta")
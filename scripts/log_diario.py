@@ -0,0 +1,168 @@
+import glob
+import json
+import os
+
+from archivos_yaml import cargar_yaml, escribir_yaml_atomico
+
+# Cada posición "X.yaml" puede tener un diario "X.diario.jsonl" con las entradas de log_diario agregadas desde
+# la última compactación, una por línea: {"fecha": "YYYYMMDD", "entrada": {...}}. Agregar una entrada cuesta
+# O(1) (un append) sin importar cuánta historia tenga la posición; compactar_diario las pasa al YAML.
+SUFIJO_DIARIO = '.diario.jsonl'
+# Mientras se compacta, el diario se renombra a "X.diario.jsonl.compactando": los appends que lleguen en el medio
+# van a un diario nuevo y no se pierden al borrar el compactado
+SUFIJO_COMPACTANDO = '.compactando'
+
+
+def ruta_diario(ruta_posicion):
+    """
+    Devuelve la ruta del diario de una posición.
+    """
+    base, _ = os.path.splitext(ruta_posicion)
+    return base + SUFIJO_DIARIO
+
+
+def agregar_entrada_diaria(ruta_posicion, fecha, entrada, sincronizar=True):
+    """
+    Agrega una entrada de log_diario al diario de la posición, sin leer ni reescribir su YAML.
+
+    Args:
+        ruta_posicion (str): Ruta del YAML de la posición.
+        fecha (str): Fecha de la entrada (YYYYMMDD). Una fecha repetida reemplaza a la anterior.
+        entrada (dict): Datos del día (credito_debito, mark_precio_spread, dte_cercano, ...).
+        sincronizar (bool): Si es True, fuerza el volcado a disco antes de volver.
+    """
+    with open(ruta_diario(ruta_posicion), 'a') as diario:
+        diario.write(_linea_diario(fecha, entrada))
+        if sincronizar:
+            diario.flush()
+            os.fsync(diario.fileno())
+
+
+def agregar_entradas_diarias(entradas, sincronizar=True):
+    """
+    Agrega muchas entradas de una vez (por ejemplo, el snapshot diario de todas las posiciones activas),
+    sincronizando cada diario al escribirlo (fsync del archivo, no os.sync de toda la máquina).
+
+    Args:
+        entradas (iterable): Tuplas (ruta_posicion, fecha, entrada).
+        sincronizar (bool): Si es True, fuerza el volcado a disco antes de volver.
+
+    Returns:
+        int: Cantidad de entradas agregadas.
+    """
+    cantidad = 0
+    for ruta_posicion, fecha, entrada in entradas:
+        agregar_entrada_diaria(ruta_posicion, fecha, entrada, sincronizar)
+        cantidad += 1
+    return cantidad
+
+
+def leer_diario(ruta_posicion):
+    """
+    Devuelve las entradas pendientes del diario de una posición como {fecha: entrada}, incluidas las de un diario
+    que se está compactando (o que dejó a medias una compactación cortada), que son anteriores.
+    Las líneas incompletas (por un corte durante un append) se ignoran.
+    """
+    diario = ruta_diario(ruta_posicion)
+    return {**_leer_entradas(diario + SUFIJO_COMPACTANDO), **_leer_entradas(diario)}
+
+
+def _leer_entradas(ruta):
+    entradas = {}
+    try:
+        with open(ruta, 'r') as diario:
+            for linea in diario:
+                if not linea.strip():
+                    continue
+                try:
+                    registro = json.loads(linea)
+                except json.JSONDecodeError:
+                    continue
+                entradas[registro['fecha']] = registro['entrada']
+    except FileNotFoundError:
+        pass
+    return entradas
+
+
+def cargar_posicion(ruta_posicion):
+    """
+    Lee el YAML de una posición con las entradas pendientes de su diario ya aplicadas a log_diario.
+    """
+    posicion_data = cargar_yaml(ruta_posicion)
+    pendientes = leer_diario(ruta_posicion)
+    if pendientes:
+        posicion_data['log_diario'] = {**(posicion_data.get('log_diario') or {}), **pendientes}
+    return posicion_data
+
+
+def compactar_diario(ruta_posicion):
+    """
+    Pasa las entradas del diario al log_diario del YAML de la posición y borra el diario.
+
+    Antes de leerlo, el diario se renombra (de forma atómica) a X.diario.jsonl.compactando, y lo que se borra al
+    final es ese archivo: una entrada que se agrega mientras tanto (por ejemplo, desde una revaluación) va a un
+    diario nuevo que queda para la próxima compactación. El YAML se reescribe de forma atómica antes de borrar
+    el compactado, así que un corte en el medio solo provoca que las mismas entradas se vuelvan a aplicar; si
+    quedó un compactado de un corte anterior, se compacta primero ese.
+
+    Returns:
+        int: Cantidad de entradas compactadas.
+    """
+    diario = ruta_diario(ruta_posicion)
+    compactando = diario + SUFIJO_COMPACTANDO
+    compactadas = 0
+    if os.path.exists(compactando):
+        compactadas += _compactar_archivo(ruta_posicion, compactando)
+    try:
+        os.replace(diario, compactando)
+    except FileNotFoundError:
+        return compactadas
+    return compactadas + _compactar_archivo(ruta_posicion, compactando)
+
+
+def _compactar_archivo(ruta_posicion, compactando):
+    pendientes = _leer_entradas(compactando)
+    if pendientes:
+        posicion_data = cargar_yaml(ruta_posicion)
+        posicion_data['log_diario'] = {**(posicion_data.get('log_diario') or {}), **pendientes}
+        escribir_yaml_atomico(ruta_posicion, posicion_data)
+    _borrar_si_existe(compactando)
+    return len(pendientes)
+
+
+def compactar_carpeta(carpeta_posiciones="data/yaml/posiciones_activas/", minimo_entradas=1):
+    """
+    Compacta los diarios de una carpeta de posiciones que tengan al menos minimo_entradas líneas, y los que
+    dejó a medias una compactación cortada.
+
+    Returns:
+        int: Cantidad de posiciones compactadas.
+    """
+    compactadas = 0
+    for diario in glob.glob(os.path.join(carpeta_posiciones, '*' + SUFIJO_DIARIO)):
+        ruta_posicion = diario[:-len(SUFIJO_DIARIO)] + '.yaml'
+        if not os.path.exists(ruta_posicion) or os.path.exists(diario + SUFIJO_COMPACTANDO):
+            continue
+        with open(diario, 'r') as f:
+            lineas = sum(1 for linea in f if linea.strip())
+        if lineas >= minimo_entradas:
+            compactar_diario(ruta_posicion)
+            compactadas += 1
+    for compactando in glob.glob(os.path.join(carpeta_posiciones, '*' + SUFIJO_DIARIO + SUFIJO_COMPACTANDO)):
+        ruta_posicion = compactando[:-len(SUFIJO_DIARIO + SUFIJO_COMPACTANDO)] + '.yaml'
+        if os.path.exists(ruta_posicion):
+            compactar_diario(ruta_posicion)
+            compactadas += 1
+    return compactadas
+
+
+def _linea_diario(fecha, entrada):
+    # El salto de línea va adelante: si la línea anterior quedó cortada, la nueva empieza igual en su propia línea
+    return '\n' + json.dumps({'fecha': str(fecha), 'entrada': entrada}, default=str)
+
+
+def _borrar_si_existe(ruta):
+    try:
+        os.remove(ruta)
+    except FileNotFoundError:
+        pass
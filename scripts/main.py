@@ -0,0 +1,376 @@
+import argparse
+import os
+import sys
+import time
+
+# Se toma antes de cualquier otra cosa para poder informar el tiempo de arranque con --tiempos
+_INICIO = time.perf_counter()
+
+# Solo módulos livianos a nivel de módulo: pandas, numpy y yaml se importan dentro de los comandos que los usan,
+# así las consultas de solo lectura contra el índice sqlite no pagan su importación (medio segundo con pandas)
+from almacen_posiciones import AlmacenSQLite, AlmacenYAML
+
+ARCHIVO_INDICE = "data/posiciones.sqlite"
+CARPETA_ACTIVAS = "data/yaml/posiciones_activas/"
+CARPETA_CERRADAS = "data/yaml/posiciones_cerradas/"
+# La de archivo_columnar.CARPETA_COLUMNAR, repetida para no importar ese módulo (y pandas) al arrancar
+CARPETA_COLUMNAR = "data/columnar/"
+
+# Columnas de la tabla posiciones que muestra 'listar', con su ancho
+COLUMNAS_LISTADO = [('fecha_inicio', 8), ('subyacente', 10), ('estrategia', 24), ('fecha_cierre', 8),
+                    ('credito_debito_inicial', 10), ('ganancia_perdida_neta', 10), ('id', 36)]
+
+
+def comando_ingerir(argumentos):
+    """
+    Ingiere los CSV de actividad nuevos (ver procesar_archivos_actividad). Las posiciones nuevas y las que
+    cambian por cierres o rolls se guardan también en el índice sqlite, salvo con --sin-indice, y las
+    transacciones nuevas en el archivo columnar, salvo con --sin-columnar. Las estrategias de las firmas de
+    patas ya clasificadas salen del cache de clasificación, salvo con --sin-cache-clasificacion.
+
+    Con --por-cuenta cada cuenta tiene su partición de posiciones y, si no se indica --workers ni se preguntan
+    los Calendars por consola, los archivos de cuentas distintas se preparan en paralelo (un proceso por cuenta).
+    """
+    import glob
+
+    from archivo_columnar import ArchivoColumnar
+    from cache_clasificacion import CacheClasificacion
+    from cuentas import cuenta_de_archivo
+    from decisiones_calendar import DecisionesCalendar
+    from procesar_actividad import procesar_archivos_actividad
+
+    workers = argumentos.workers
+    if argumentos.por_cuenta and workers is None and argumentos.calendars != 'interactivo':
+        cuentas = {cuenta_de_archivo(ruta) for ruta in glob.glob(os.path.join(argumentos.carpeta, '*.csv'))}
+        workers = min(len(cuentas), os.cpu_count() or 1)
+
+    os.makedirs(argumentos.activas, exist_ok=True)
+    almacen = None if argumentos.sin_indice else AlmacenSQLite(argumentos.indice)
+    cache_clasificacion = None if argumentos.sin_cache_clasificacion else CacheClasificacion()
+    try:
+        procesar_archivos_actividad(argumentos.carpeta, argumentos.procesados, argumentos.activas,
+                                    workers=workers, chunksize=argumentos.chunksize, almacen=almacen,
+                                    decisiones_calendar=DecisionesCalendar(argumentos.calendars),
+                                    carpeta_cerradas=argumentos.cerradas, por_cuenta=argumentos.por_cuenta,
+                                    archivo_columnar=None if argumentos.sin_columnar else
+                                    ArchivoColumnar(argumentos.columnar),
+                                    cache_clasificacion=cache_clasificacion)
+    finally:
+        if almacen is not None:
+            almacen.cerrar()
+        if cache_clasificacion is not None:
+            cache_clasificacion.cerrar()
+
+
+def comando_listar(argumentos):
+    """
+    Lista las posiciones que cumplen los filtros, una por línea. Usa el índice sqlite si existe (sin cargar
+    ningún YAML); si no, recorre las carpetas de posiciones y sus particiones por cuenta.
+    """
+    abierta = True if argumentos.abiertas else False if argumentos.cerradas_solo else None
+    filtros = dict(subyacente=argumentos.subyacente, estrategia=argumentos.estrategia, abierta=abierta,
+                   fecha_desde=argumentos.desde, fecha_hasta=argumentos.hasta)
+    if os.path.exists(argumentos.indice):
+        with AlmacenSQLite(argumentos.indice) as almacen:
+            posiciones = almacen.filas(limite=argumentos.limite, **filtros)
+    else:
+        posiciones = []
+        for carpeta in _carpetas_posiciones(argumentos):
+            posiciones.extend(AlmacenYAML(carpeta).buscar(**filtros))
+        posiciones.sort(key=lambda posicion: str(posicion.get('fecha_inicio')))
+        posiciones = posiciones[:argumentos.limite] if argumentos.limite is not None else posiciones
+
+    print(" ".join(f"{campo[:ancho]:<{ancho}}" for campo, ancho in COLUMNAS_LISTADO))
+    for posicion in posiciones:
+        print(" ".join(f"{_formatear(posicion.get(campo)):<{ancho}}" for campo, ancho in COLUMNAS_LISTADO))
+    print(f"{len(posiciones)} posiciones")
+
+
+def comando_ver(argumentos):
+    """
+    Muestra una posición completa (patas y log diario incluidos) en formato YAML, buscándola por id o por
+    nombre de archivo.
+    """
+    from archivos_yaml import volcar_yaml
+
+    posicion = None
+    if os.path.exists(argumentos.indice):
+        with AlmacenSQLite(argumentos.indice) as almacen:
+            posicion = almacen.cargar(argumentos.posicion) or almacen.cargar_archivo(argumentos.posicion)
+    else:
+        for carpeta in _carpetas_posiciones(argumentos):
+            almacen = AlmacenYAML(carpeta)
+            posicion = almacen.cargar_archivo(argumentos.posicion) or almacen.cargar(argumentos.posicion)
+            if posicion is not None:
+                break
+    if posicion is None:
+        print(f"No se encontró la posición {argumentos.posicion}", file=sys.stderr)
+        return 1
+    print(volcar_yaml(posicion), end='')
+
+
+def comando_estadisticas(argumentos):
+    """
+    Imprime las estadísticas de P&L agrupadas (ver estadisticas.py). Sin índice sqlite, las tablas de cada
+    partición por cuenta salen del cache mientras la partición no cambie.
+    """
+    from estadisticas import cargar_tabla_cuentas, cargar_tabla_posiciones, estadisticas, imprimir_estadisticas
+
+    if os.path.exists(argumentos.indice):
+        with AlmacenSQLite(argumentos.indice) as almacen:
+            tabla = cargar_tabla_posiciones(almacen)
+    else:
+        tabla = cargar_tabla_cuentas(argumentos.activas, argumentos.cerradas)
+    imprimir_estadisticas(estadisticas(tabla, None if argumentos.por == ['cartera'] else argumentos.por))
+
+
+def comando_reindexar(argumentos):
+    """
+    Reconstruye el índice sqlite desde cero a partir de los YAML de posiciones activas y cerradas (y de sus
+    particiones por cuenta). Se arma en un archivo aparte y reemplaza al anterior recién al terminar, así las
+    consultas nunca ven un índice a medias.
+    """
+    from cuentas import AlmacenCuenta, carpeta_cuenta, listar_cuentas
+
+    temporal = argumentos.indice + ".nuevo"
+    if os.path.exists(temporal):
+        os.remove(temporal)
+    cantidad = 0
+    with AlmacenSQLite(temporal) as almacen:
+        for cuenta in [None] + listar_cuentas(argumentos.activas, argumentos.cerradas):
+            destino = AlmacenCuenta(almacen, cuenta) if cuenta else almacen
+            for carpeta in (carpeta_cuenta(argumentos.activas, cuenta), carpeta_cuenta(argumentos.cerradas, cuenta)):
+                for nombre_archivo, posicion_data in AlmacenYAML(carpeta).iterar():
+                    destino.guardar(nombre_archivo, posicion_data)
+                    cantidad += 1
+        almacen.confirmar()
+    os.replace(temporal, argumentos.indice)
+    print(f"Índice {argumentos.indice} reconstruido con {cantidad} posiciones")
+
+
+def comando_revaluar(argumentos):
+    """
+    Revalúa a mercado las posiciones activas con un snapshot de cotizaciones (ver revaluacion.py).
+    """
+    from datetime import datetime
+
+    from revaluacion import revaluar_carpeta
+
+    fecha = datetime.strptime(argumentos.fecha, '%Y%m%d').date() if argumentos.fecha else None
+    revaluar_carpeta(argumentos.activas, argumentos.cotizaciones, fecha, argumentos.actualizar_patas)
+
+
+def comando_calendars(argumentos):
+    """
+    Resuelve la cola de revisión de Calendars 1-1-2 (ver procesar_actividad.resolver_revision_calendars) con un
+    archivo de decisiones y, para los trades que no figuran en él, con --modo. Las posiciones se guardan como en
+    la ingesta: en la carpeta de activas (en la partición de la cuenta con la que se encoló cada trade), en el
+    índice sqlite salvo con --sin-indice y clasificadas con el cache de clasificación salvo con
+    --sin-cache-clasificacion. Con --cuenta solo se resuelven los trades de esa cuenta. El índice del ciclo de
+    vida se arma desde esas carpetas en cada ingesta, así que ahí ya las encuentra.
+    """
+    from cache_clasificacion import CacheClasificacion
+    from decisiones_calendar import DecisionesCalendar
+    from procesar_actividad import resolver_revision_calendars
+
+    decisiones = DecisionesCalendar(argumentos.modo, argumentos.decisiones, archivo_revision=argumentos.cola)
+    os.makedirs(argumentos.activas, exist_ok=True)
+    almacen = None if argumentos.sin_indice else AlmacenSQLite(argumentos.indice)
+    cache_clasificacion = None if argumentos.sin_cache_clasificacion else CacheClasificacion()
+    try:
+        resueltos = resolver_revision_calendars(decisiones, argumentos.activas, almacen,
+                                                cache_clasificacion=cache_clasificacion, cuenta=argumentos.cuenta)
+    finally:
+        if almacen is not None:
+            almacen.cerrar()
+        if cache_clasificacion is not None:
+            cache_clasificacion.cerrar()
+    print(f"Calendars resueltos: {resueltos}")
+
+
+def comando_compactar(argumentos):
+    """
+    Pasa las entradas de los diarios (.diario.jsonl) de las posiciones activas y cerradas, y de sus particiones
+    por cuenta, al log_diario de sus YAML (ver log_diario.compactar_carpeta).
+    """
+    from log_diario import compactar_carpeta
+
+    compactadas = sum(compactar_carpeta(carpeta, argumentos.minimo_entradas)
+                      for carpeta in _carpetas_posiciones(argumentos))
+    print(f"Diarios compactados: {compactadas}")
+
+
+def comando_vigilar(argumentos):
+    """
+    Vigila la carpeta de actividad e ingiere los CSV nuevos (ver vigilante.py).
+    """
+    import asyncio
+
+    from archivo_columnar import ArchivoColumnar
+    from cache_clasificacion import CacheClasificacion
+    from decisiones_calendar import DecisionesCalendar
+    from vigilante import Vigilante, ejecutar
+
+    archivo_columnar = None if argumentos.sin_columnar else ArchivoColumnar(argumentos.columnar)
+    cache_clasificacion = None if argumentos.sin_cache_clasificacion else CacheClasificacion()
+    asyncio.run(ejecutar(Vigilante(argumentos.carpeta, argumentos.intervalo, argumentos.espera,
+                                    DecisionesCalendar(argumentos.calendars), argumentos.activas,
+                                    argumentos.cerradas, carpeta_procesados=argumentos.procesados,
+                                    chunksize=argumentos.chunksize, archivo_columnar=archivo_columnar,
+                                    cache_clasificacion=cache_clasificacion)))
+
+
+def comando_historial(argumentos):
+    """
+    Lista las transacciones del archivo columnar entre dos fechas, filtradas por subyacente, acción o símbolo,
+    sin leer ningún CSV (ver archivo_columnar.py).
+    """
+    from archivo_columnar import ArchivoColumnar
+
+    archivo = ArchivoColumnar(argumentos.columnar)
+    filtros = {columna: valores for columna, valores in (('subyacente', argumentos.subyacente),
+                                                          ('accion', argumentos.accion),
+                                                          ('simbolo', argumentos.simbolo)) if valores}
+    transacciones = archivo.consultar(argumentos.desde, argumentos.hasta, **filtros)
+    if argumentos.limite is not None:
+        transacciones = transacciones.head(argumentos.limite)
+    if len(transacciones):
+        print(transacciones.to_string(index=False))
+    print(f"{len(transacciones)} transacciones")
+
+
+def _carpetas_posiciones(argumentos):
+    """
+    Carpetas de posiciones activas y cerradas con sus particiones por cuenta (ver cuentas.py).
+    """
+    from cuentas import carpeta_cuenta, listar_cuentas
+
+    return [carpeta_cuenta(carpeta, cuenta)
+            for cuenta in [None] + listar_cuentas(argumentos.activas, argumentos.cerradas)
+            for carpeta in (argumentos.activas, argumentos.cerradas)]
+
+
+def _formatear(valor):
+    if valor is None:
+        return '-'
+    if isinstance(valor, float):
+        return f"{valor:.2f}"
+    return str(valor)
+
+
+def crear_parser():
+    """
+    Arma el parser de la línea de comandos. Cada subcomando tiene su nombre en castellano y un alias en inglés.
+    """
+    parser = argparse.ArgumentParser(description="Diario de trading: ingesta y consultas de posiciones.")
+    parser.add_argument('--indice', default=ARCHIVO_INDICE, help="Índice sqlite de posiciones")
+    parser.add_argument('--activas', default=CARPETA_ACTIVAS, help="Carpeta de posiciones activas")
+    parser.add_argument('--cerradas', default=CARPETA_CERRADAS, help="Carpeta de posiciones cerradas")
+    parser.add_argument('--columnar', default=CARPETA_COLUMNAR, help="Carpeta del archivo columnar de transacciones")
+    parser.add_argument('--tiempos', action='store_true', help="Informar en stderr el tiempo de arranque y total")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    opciones_ingesta = argparse.ArgumentParser(add_help=False)
+    opciones_ingesta.add_argument('--carpeta', default="data/csv/actividad/", help="Carpeta de exports de actividad")
+    opciones_ingesta.add_argument('--procesados', default="data/csv/actividad/procesados/",
+                                  help="Carpeta de CSV procesados")
+    opciones_ingesta.add_argument('--chunksize', type=int, default=None, help="Filas por bloque al leer cada CSV")
+    opciones_ingesta.add_argument('--sin-columnar', action='store_true',
+                                  help="No agregar las transacciones al archivo columnar")
+    opciones_ingesta.add_argument('--sin-cache-clasificacion', action='store_true',
+                                  help="Clasificar todas las posiciones sin usar el cache de clasificación")
+
+    ingerir = subparsers.add_parser('ingerir', aliases=['ingest'], parents=[opciones_ingesta],
+                                    help="Ingiere los CSV de actividad nuevos")
+    ingerir.add_argument('--workers', type=int, default=None, help="Procesos para leer y agrupar los archivos")
+    # Los modos de Calendar (MODOS_CALENDAR) se repiten acá para no importar decisiones_calendar (y yaml)
+    ingerir.add_argument('--calendars', choices=['interactivo', 'aceptar', 'rechazar', 'revisar'],
+                         default='interactivo', help="Qué hacer con los candidatos a Calendar 1-1-2")
+    ingerir.add_argument('--sin-indice', action='store_true', help="No actualizar el índice sqlite")
+    ingerir.add_argument('--por-cuenta', action='store_true',
+                         help="Separar las posiciones en una partición por cuenta (la del nombre del export)")
+    ingerir.set_defaults(funcion=comando_ingerir)
+
+    listar = subparsers.add_parser('listar', aliases=['list-positions'], help="Lista posiciones")
+    listar.add_argument('--subyacente', default=None)
+    listar.add_argument('--estrategia', default=None)
+    estado = listar.add_mutually_exclusive_group()
+    estado.add_argument('--abiertas', action='store_true', help="Solo posiciones abiertas")
+    estado.add_argument('--solo-cerradas', dest='cerradas_solo', action='store_true', help="Solo posiciones cerradas")
+    listar.add_argument('--desde', default=None, help="Fecha de inicio mínima (YYYYMMDD)")
+    listar.add_argument('--hasta', default=None, help="Fecha de inicio máxima (YYYYMMDD)")
+    listar.add_argument('--limite', type=int, default=None, help="Cantidad máxima de posiciones")
+    listar.set_defaults(funcion=comando_listar)
+
+    ver = subparsers.add_parser('ver', aliases=['show'], help="Muestra una posición completa")
+    ver.add_argument('posicion', help="Id o nombre de archivo YAML de la posición")
+    ver.set_defaults(funcion=comando_ver)
+
+    estadisticas = subparsers.add_parser('estadisticas', aliases=['stats'], help="Estadísticas de P&L")
+    estadisticas.add_argument('--por', nargs='+', default=['estrategia'],
+                              help="Agrupar por estrategia, subyacente, mes u otra columna (cartera = sin agrupar)")
+    estadisticas.set_defaults(funcion=comando_estadisticas)
+
+    reindexar = subparsers.add_parser('reindexar', aliases=['reindex'],
+                                      help="Reconstruye el índice sqlite desde los YAML")
+    reindexar.set_defaults(funcion=comando_reindexar)
+
+    revaluar = subparsers.add_parser('revaluar', aliases=['revalue'], help="Revalúa a mercado las posiciones activas")
+    revaluar.add_argument('--cotizaciones', default="data/mercado/cotizaciones.csv",
+                          help="CSV de cotizaciones: subyacente,vencimiento,tipo,strike,mark (o bid,ask)")
+    revaluar.add_argument('--fecha', default=None, help="Fecha de referencia YYYYMMDD (por defecto, hoy)")
+    revaluar.add_argument('--actualizar-patas', action='store_true', help="Guardar el precio_actual de las patas")
+    revaluar.set_defaults(funcion=comando_revaluar)
+
+    calendars = subparsers.add_parser('calendars', aliases=['resolve-calendars'],
+                                      help="Resuelve la cola de revisión de Calendars 1-1-2")
+    calendars.add_argument('--decisiones', default=None, help="YAML {Order #: s/n} con las decisiones")
+    calendars.add_argument('--modo', choices=['interactivo', 'aceptar', 'rechazar', 'revisar'], default='revisar',
+                           help="Qué hacer con los trades sin decisión en el archivo (revisar = dejarlos en la cola)")
+    calendars.add_argument('--cola', default="data/revision_calendars.jsonl", help="Cola de revisión")
+    calendars.add_argument('--cuenta', default=None, help="Resolver solo los trades de la cola de esa cuenta")
+    calendars.add_argument('--sin-indice', action='store_true', help="No actualizar el índice sqlite")
+    calendars.add_argument('--sin-cache-clasificacion', action='store_true',
+                           help="Clasificar sin usar el cache de clasificación")
+    calendars.set_defaults(funcion=comando_calendars)
+
+    compactar = subparsers.add_parser('compactar', aliases=['compact'],
+                                      help="Pasa los diarios de las posiciones a sus YAML")
+    compactar.add_argument('--minimo-entradas', type=int, default=1,
+                           help="Compactar solo los diarios con al menos esta cantidad de entradas")
+    compactar.set_defaults(funcion=comando_compactar)
+
+    vigilar = subparsers.add_parser('vigilar', aliases=['watch'], parents=[opciones_ingesta],
+                                    help="Ingiere automáticamente los CSV nuevos")
+    vigilar.add_argument('--intervalo', type=float, default=1.0, help="Segundos entre revisiones de la carpeta")
+    vigilar.add_argument('--espera', type=float, default=2.0, help="Segundos sin cambios para dar un CSV por completo")
+    vigilar.add_argument('--calendars', choices=['aceptar', 'rechazar', 'revisar'], default='revisar',
+                         help="Qué hacer con los candidatos a Calendar 1-1-2")
+    vigilar.set_defaults(funcion=comando_vigilar)
+
+    historial = subparsers.add_parser('historial', aliases=['fills'],
+                                      help="Consulta las transacciones del archivo columnar")
+    historial.add_argument('--desde', default=None, help="Fecha inicial YYYY-MM-DD")
+    historial.add_argument('--hasta', default=None, help="Fecha final YYYY-MM-DD (inclusive)")
+    historial.add_argument('--subyacente', nargs='+', default=None, help="Subyacentes base (SPY, /ES, ...)")
+    historial.add_argument('--accion', nargs='+', default=None, help="Acciones (BUY_TO_OPEN, SELL_TO_CLOSE, ...)")
+    historial.add_argument('--simbolo', nargs='+', default=None, help="Símbolos de los contratos")
+    historial.add_argument('--limite', type=int, default=None, help="Cantidad máxima de transacciones")
+    historial.set_defaults(funcion=comando_historial)
+    return parser
+
+
+def main(argv=None):
+    argumentos = crear_parser().parse_args(argv)
+    arranque = time.perf_counter()
+    try:
+        return argumentos.funcion(argumentos)
+    finally:
+        if argumentos.tiempos:
+            fin = time.perf_counter()
+            print(f"arranque {(arranque - _INICIO) * 1000:.1f} ms, comando {(fin - arranque) * 1000:.1f} ms, "
+                  f"total {(fin - _INICIO) * 1000:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class Metricas:
+    """
+    Tiempos por etapa y contadores de una ejecución del pipeline de ingesta.
+
+    Cada etapa acumula segundos de reloj y cantidad de llamadas; los contadores son enteros por nombre y las
+    estrategias cuentan las posiciones por resultado de la clasificación. Las métricas de cada archivo se
+    juntan en las de la ejecución con agregar_archivo (también las que vuelven de los workers, que son
+    serializables con pickle). Con workers, los segundos por etapa son la suma de todos los procesos y pueden
+    superar la duración total de la ejecución.
+    """
+
+    def __init__(self):
+        self.inicio = time.time()
+        self.etapas = {}
+        self.contadores = {}
+        self.estrategias = {}
+        self.archivos = []
+
+    @contextmanager
+    def etapa(self, nombre):
+        """
+        Mide el tiempo de reloj del bloque with y lo suma a la etapa nombre.
+        """
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sumar_tiempo(nombre, time.perf_counter() - inicio)
+
+    def sumar_tiempo(self, nombre, segundos, llamadas=1):
+        etapa = self.etapas.setdefault(nombre, {'segundos': 0.0, 'llamadas': 0})
+        etapa['segundos'] += segundos
+        etapa['llamadas'] += llamadas
+
+    def medir_iterador(self, nombre, iterable):
+        """
+        Recorre iterable sumando a la etapa nombre solo el tiempo que tarda cada next() (por ejemplo, la lectura
+        de cada bloque de un CSV), no el que pasa el consumidor entre un elemento y el siguiente.
+        """
+        iterador = iter(iterable)
+        while True:
+            inicio = time.perf_counter()
+            try:
+                elemento = next(iterador)
+            except StopIteration:
+                self.sumar_tiempo(nombre, time.perf_counter() - inicio)
+                return
+            self.sumar_tiempo(nombre, time.perf_counter() - inicio)
+            yield elemento
+
+    def contar(self, nombre, cantidad=1):
+        self.contadores[nombre] = self.contadores.get(nombre, 0) + int(cantidad)
+
+    def contar_estrategia(self, estrategia):
+        self.estrategias[estrategia] = self.estrategias.get(estrategia, 0) + 1
+
+    def agregar_archivo(self, nombre_archivo, metricas_archivo):
+        """
+        Suma las métricas de un archivo a las de la ejecución y guarda su resumen por archivo.
+        """
+        for nombre, etapa in metricas_archivo.etapas.items():
+            self.sumar_tiempo(nombre, etapa['segundos'], etapa['llamadas'])
+        for nombre, cantidad in metricas_archivo.contadores.items():
+            self.contar(nombre, cantidad)
+        for estrategia, cantidad in metricas_archivo.estrategias.items():
+            self.estrategias[estrategia] = self.estrategias.get(estrategia, 0) + cantidad
+        self.archivos.append({
+            'archivo': nombre_archivo,
+            'segundos': sum(etapa['segundos'] for etapa in metricas_archivo.etapas.values()),
+            'etapas': {nombre: etapa['segundos'] for nombre, etapa in metricas_archivo.etapas.items()},
+            'contadores': dict(metricas_archivo.contadores),
+        })
+
+    def documento(self):
+        """
+        Devuelve las métricas como un diccionario serializable a JSON.
+        """
+        fin = time.time()
+        return {
+            'inicio': datetime.fromtimestamp(self.inicio).isoformat(timespec='seconds'),
+            'fin': datetime.fromtimestamp(fin).isoformat(timespec='seconds'),
+            'duracion_segundos': fin - self.inicio,
+            'etapas': self.etapas,
+            'contadores': self.contadores,
+            'estrategias': self.estrategias,
+            'archivos': self.archivos,
+        }
+
+    def guardar(self, carpeta="data/metricas"):
+        """
+        Guarda el documento de métricas como JSON en carpeta, con la fecha de inicio (con microsegundos) y el PID
+        en el nombre, para que dos ejecuciones seguidas o simultáneas no se pisen.
+
+        Returns:
+            str: Ruta del JSON escrito.
+        """
+        os.makedirs(carpeta, exist_ok=True)
+        inicio = datetime.fromtimestamp(self.inicio).strftime('%Y%m%dT%H%M%S_%f')
+        ruta = os.path.join(carpeta, f"metricas_{inicio}_{os.getpid()}.json")
+        with open(ruta, 'x') as f:
+            json.dump(self.documento(), f, indent=2)
+        return ruta
+
+    def imprimir_resumen(self):
+        """
+        Imprime el tiempo por etapa (de mayor a menor) y los contadores.
+        """
+        for nombre, etapa in sorted(self.etapas.items(), key=lambda item: -item[1]['segundos']):
+            print(f"{nombre:<22} {etapa['segundos']:10.3f} s  ({etapa['llamadas']} llamadas)")
+        for nombre, cantidad in self.contadores.items():
+            print(f"{nombre:<22} {cantidad:>10}")
+
+
+@contextmanager
+def perfilar(ruta_base, memoria=True, lineas=30):
+    """
+    Perfila el bloque with con cProfile y, si memoria es True, con tracemalloc.
+
+    Escribe ruta_base.prof (para pstats o snakeviz), ruta_base.perfil.txt con las funciones de mayor tiempo
+    acumulado y, con memoria, ruta_base.memoria.txt con el pico y las líneas que más memoria tenían asignada
+    al terminar.
+    """
+    if os.path.dirname(ruta_base):
+        os.makedirs(os.path.dirname(ruta_base), exist_ok=True)
+    perfil = cProfile.Profile()
+    if memoria:
+        tracemalloc.start()
+    perfil.enable()
+    try:
+        yield
+    finally:
+        perfil.disable()
+        if memoria:
+            instantanea = tracemalloc.take_snapshot()
+            pico = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        perfil.dump_stats(ruta_base + '.prof')
+        texto = io.StringIO()
+        pstats.Stats(perfil, stream=texto).sort_stats('cumulative').print_stats(lineas)
+        with open(ruta_base + '.perfil.txt', 'w') as f:
+            f.write(texto.getvalue())
+
+        if memoria:
+            with open(ruta_base + '.memoria.txt', 'w') as f:
+                f.write(f"Pico de memoria: {pico / 2 ** 20:.1f} MB\n")
+                for estadistica in instantanea.statistics('lineno')[:lineas]:
+                    f.write(f"{estadistica}\n")
+        print(f"Perfil guardado en: {ruta_base}.prof")
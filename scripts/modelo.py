@@ -0,0 +1,207 @@
+from dataclasses import dataclass, field
+
+# Columna del CSV de actividad -> atributo de Transaccion. Son las únicas columnas que usa el pipeline después
+# de agrupar las filas en trades, más las que agrega él mismo ('Subyacente Base', 'Trade ID', 'Calendar Confirmado').
+COLUMNAS_TRANSACCION = {
+    'Date': 'fecha',
+    'Action': 'accion',
+    'Symbol': 'simbolo',
+    'Description': 'descripcion',
+    'Quantity': 'cantidad',
+    'Average Price': 'precio_promedio',
+    'Expiration Date': 'vencimiento',
+    'Strike Price': 'strike',
+    'Order #': 'orden',
+    'Total': 'total',
+    'Subyacente Base': 'subyacente_base',
+    'Trade ID': 'trade_id',
+    'Calendar Confirmado': 'calendar_confirmado',
+}
+
+# Campos de los arrays estructurados de patas (una fila por pata, con el índice de su posición). numpy se
+# importa recién en registros_patas, para que las clases del modelo se puedan usar sin cargarlo.
+CAMPOS_REGISTRO_PATA = [('posicion', 'i4'), ('tipo', 'U4'), ('strike', 'f8'), ('vencimiento', 'M8[D]'),
+                        ('cantidad', 'f8'), ('precio_apertura', 'f8'), ('precio_actual', 'f8'),
+                        ('fecha_cierre', 'M8[D]'), ('precio_cierre', 'f8'), ('accion', 'U13')]
+
+
+class _ComoDiccionario:
+    """
+    Acceso por clave (obj['campo'], obj.get, 'campo' in obj, dict(obj)) sobre los atributos de las clases del
+    modelo, para que el código escrito para los diccionarios de siempre las acepte sin cambios.
+    """
+    __slots__ = ()
+
+    def _atributo(self, clave):
+        return clave
+
+    def __getitem__(self, clave):
+        try:
+            return getattr(self, self._atributo(clave))
+        except (AttributeError, TypeError):
+            raise KeyError(clave) from None
+
+    def __setitem__(self, clave, valor):
+        try:
+            setattr(self, self._atributo(clave), valor)
+        except (AttributeError, TypeError):
+            raise KeyError(clave) from None
+
+    def __contains__(self, clave):
+        return clave in self.keys()
+
+    def get(self, clave, defecto=None):
+        try:
+            return self[clave]
+        except KeyError:
+            return defecto
+
+    def keys(self):
+        return list(self.__slots__)
+
+
+@dataclass(slots=True)
+class Transaccion(_ComoDiccionario):
+    """
+    Una fila de actividad de tastytrade dentro de un trade, solo con las columnas que usa el pipeline.
+    Se accede por atributo o por el nombre de la columna del CSV (transaccion['Average Price']).
+    """
+    fecha: str = None
+    accion: str = None
+    simbolo: str = None
+    descripcion: str = None
+    cantidad: int = None
+    precio_promedio: float = None
+    vencimiento: str = None
+    strike: float = None
+    orden: float = None
+    total: float = None
+    subyacente_base: str = None
+    trade_id: str = None
+    calendar_confirmado: bool = None
+
+    def _atributo(self, columna):
+        return COLUMNAS_TRANSACCION[columna]
+
+    def keys(self):
+        return list(COLUMNAS_TRANSACCION)
+
+    @classmethod
+    def desde_dataframe(cls, df):
+        """
+        Convierte las filas de un DataFrame de actividad en transacciones, columna a columna (las columnas que
+        falten quedan en None).
+        """
+        columnas = [df[columna].tolist() if columna in df else [None] * len(df) for columna in COLUMNAS_TRANSACCION]
+        return [cls(*valores) for valores in zip(*columnas)]
+
+
+@dataclass(slots=True)
+class Pata(_ComoDiccionario):
+    """
+    Una pata de una posición, con los mismos campos que cada elemento de 'patas' en el YAML.
+    """
+    tipo: str
+    strike: float
+    vencimiento: object
+    cantidad: float
+    precio_apertura: float = None
+    precio_actual: float = None
+    fecha_cierre: object = None
+    precio_cierre: float = None
+    accion: str = None
+
+    def a_dict(self):
+        return {campo: getattr(self, campo) for campo in self.__slots__}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        return cls(**{campo: datos.get(campo) for campo in cls.__slots__})
+
+
+@dataclass(slots=True)
+class Posicion(_ComoDiccionario):
+    """
+    Una posición con el esquema de los YAML de data/yaml/posiciones_activas/. Los campos del YAML que no
+    tienen atributo propio se conservan en extra.
+    """
+    id: str
+    fecha_inicio: str
+    subyacente: str
+    estrategia: str
+    cantidad_rolls: int = 0
+    credito_debito_inicial: float = None
+    credito_debito_actual: float = None
+    patas: list = field(default_factory=list)
+    beta_delta_inicial: float = None
+    delta_inicial: float = None
+    theta_inicial: float = None
+    vega_inicial: float = None
+    ivr_inicial: float = None
+    pop_inicial: float = None
+    log_diario: dict = field(default_factory=dict)
+    fecha_cierre: str = None
+    precio_cierre: float = None
+    ganancia_perdida_neta: float = None
+    duracion_dias: int = None
+    extra: dict = None
+
+    def a_yaml(self):
+        """
+        Devuelve la posición como el diccionario que se guarda en su YAML.
+        """
+        datos = {campo: getattr(self, campo) for campo in self.__slots__ if campo != 'extra'}
+        datos['patas'] = [pata.a_dict() if isinstance(pata, Pata) else pata for pata in self.patas]
+        datos.update(self.extra or {})
+        return datos
+
+    @classmethod
+    def desde_yaml(cls, datos):
+        """
+        Arma una posición a partir del diccionario de su YAML.
+        """
+        campos = {campo: datos[campo] for campo in cls.__slots__ if campo in datos and campo != 'extra'}
+        campos['patas'] = [Pata.desde_dict(pata) for pata in datos.get('patas') or []]
+        campos['log_diario'] = dict(datos.get('log_diario') or {})
+        extra = {clave: valor for clave, valor in datos.items() if clave not in cls.__slots__}
+        return cls(**campos, extra=extra or None)
+
+
+def registros_patas(posiciones):
+    """
+    Junta las patas de muchas posiciones en un solo array estructurado (CAMPOS_REGISTRO_PATA) para operar en
+    bloque.
+
+    Args:
+        posiciones (list): Posiciones (Posicion o diccionarios del YAML).
+
+    Returns:
+        numpy.ndarray: Una fila por pata; 'posicion' es el índice de su posición en la lista.
+    """
+    import numpy as np
+
+    dtype = np.dtype(CAMPOS_REGISTRO_PATA)
+    filas = [(numero, pata['tipo'], pata['strike'], pata['vencimiento'], pata['cantidad'], pata.get('precio_apertura'),
+              pata.get('precio_actual'), pata.get('fecha_cierre'), pata.get('precio_cierre'), pata.get('accion') or '')
+             for numero, posicion in enumerate(posiciones) for pata in posicion['patas'] or []]
+    registros = np.empty(len(filas), dtype=dtype)
+    for indice, campo in enumerate(dtype.names):
+        valores = [fila[indice] for fila in filas]
+        if dtype[campo].kind == 'M':
+            valores = [_a_dia(valor) for valor in valores]
+        elif dtype[campo].kind == 'f':
+            valores = [np.nan if valor is None else valor for valor in valores]
+        registros[campo] = np.array(valores, dtype=dtype[campo])
+    return registros
+
+
+def _a_dia(valor):
+    """
+    Convierte una fecha del YAML (date, 'YYYY-MM-DD' o 'YYYYMMDD') a texto ISO para datetime64; None es NaT.
+    """
+    if valor is None:
+        return 'NaT'
+    texto = str(valor)[:10]
+    if len(texto) == 8 and texto.isdigit():
+        texto = f"{texto[:4]}-{texto[4:6]}-{texto[6:]}"
+    return texto
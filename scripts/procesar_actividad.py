@@ -1,209 +1,829 @@
+import numpy as np
 import pandas as pd
-import yaml
 import os
 import uuid
 from datetime import datetime, timedelta
-from collections import defaultdict
 import re  # Importar la biblioteca de expresiones regulares
 import glob  # Para buscar archivos
 import shutil  # Para mover archivos
-
-from utils import parse_symbol_improved, calcular_dte_pata, es_1_1_2, es_calendar_1_1_2, es_iron_condor, es_strangle, identificar_spread, es_butterfly, es_broken_wing_butterfly, es_broken_wing_condor, es_ratio_spread  # Asegúrate de importar todas las funciones de utils
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+
+from utils import parse_symbols, calcular_dte_pata, construir_pata
+from modelo import Posicion, Transaccion
+from clasificador import calcular_firma, clasificar_patas, es_candidato_calendar
+from archivos_yaml import LoteYAML, escribir_yaml_atomico
+from decisiones_calendar import DecisionesCalendar, guardar_revision, leer_revision
+from registro_ingesta import RegistroIngesta, FiltroTransacciones, hash_archivo
+from metricas import Metricas, perfilar
+from ciclo_vida import CicloVida, es_trade_de_cierre
+from cuentas import AlmacenCuenta, carpeta_cuenta, cuenta_de_archivo
+
+
+# Columnas del CSV de tastytrade que usa el pipeline, con tipos compactos
+TIPOS_ACTIVIDAD = {
+    'Date': 'object',
+    'Action': 'category',
+    'Symbol': 'object',
+    'Instrument Type': 'category',
+    'Description': 'object',
+    'Quantity': 'Int32',
+    'Average Price': 'float64',
+    'Root Symbol': 'object',
+    'Underlying Symbol': 'object',
+    'Expiration Date': 'object',
+    'Strike Price': 'float64',
+    'Call or Put': 'category',
+    'Order #': 'float64',
+    'Total': 'float64',
+}
+
+# Cantidad máxima de posiciones que se acumulan en memoria antes de escribir un lote de YAML
+TAMANO_LOTE_YAML = 1000
 
 
 def procesar_archivos_actividad(carpeta_csv="data/csv/actividad/", carpeta_procesados="data/csv/actividad/procesados/",
-                             carpeta_posiciones="data/yaml/posiciones_activas/", archivo_procesados="data/procesados.txt"):
+                             carpeta_posiciones="data/yaml/posiciones_activas/", archivo_procesados="data/procesados.txt",
+                             workers=None, chunksize=None, archivo_registro="data/registro_ingesta.sqlite",
+                             almacen=None, decisiones_calendar=None, metricas=None, carpeta_metricas="data/metricas",
+                             perfilar_archivo=None, carpeta_cerradas="data/yaml/posiciones_cerradas/", archivos=None,
+                             ciclo_vida=None, por_cuenta=False, archivo_columnar=None, cache_clasificacion=None):
     """
     Procesa todos los archivos CSV de actividad en una carpeta, evitando reprocesar los ya procesados.
     Mueve los archivos procesados a la carpeta 'procesados'.
+
+    Los archivos y transacciones ya ingeridos se llevan en un RegistroIngesta (sqlite) en archivo_registro: un
+    archivo con el mismo contenido que otro ya ingerido se descarta, y de un export que se solapa con otros solo
+    se procesan las filas nuevas. Los nombres del antiguo archivo_procesados se importan y se siguen respetando.
+
+    Con workers=N (N > 1) la lectura, agrupación y clasificación de los archivos se hace en paralelo en un pool
+    de N procesos. La escritura de resultados se hace siempre en el
+    proceso principal y en orden alfabético de archivo: primero los YAML de posiciones, luego el registro y por
+    último el movimiento del CSV, de modo que una ejecución interrumpida nunca marca como procesado un archivo
+    sin sus YAML.
+
+    Con chunksize=N cada archivo se lee en bloques de N filas (ver iterar_trades_actividad) y, en modo serie, las
+    posiciones se escriben a medida que se cierran: la memoria depende del tamaño de bloque y no del archivo.
+
+    Si se indica un almacen (por ejemplo un AlmacenSQLite), las posiciones se guardan también ahí, además de
+    los YAML de carpeta_posiciones.
+
+    decisiones_calendar (DecisionesCalendar) indica cómo confirmar los candidatos a Calendar 1-1-2; por defecto
+    se pregunta por consola, o se rechazan si se usa workers (los workers no pueden preguntar).
+
+    Cada etapa (lectura, filtro del registro, agrupación, Calendars, clasificación, serialización y escritura de
+    YAML, registro) se mide en un objeto Metricas junto con contadores de filas, trades, posiciones y estrategias;
+    al terminar se guarda como JSON en carpeta_metricas (None para no guardarlo) y se devuelve. Con
+    perfilar_archivo (nombre de uno de los CSV) ese archivo se procesa bajo cProfile y tracemalloc y el perfil
+    queda también en carpeta_metricas.
+
+    Los trades con patas de cierre (XXX_TO_CLOSE) no crean posiciones: se asocian con las posiciones abiertas
+    mediante un CicloVida (ver ciclo_vida.py), que completa los datos de cierre y mueve las posiciones cerradas
+    a carpeta_cerradas. Con carpeta_cerradas=None se conserva el comportamiento anterior (todo trade crea una
+    posición). Se puede pasar un ciclo_vida ya cargado para no reconstruir su índice en cada llamada.
+
+    Con archivos (lista de rutas) se procesan solo esos CSV en lugar de todos los de carpeta_csv.
+
+    Con por_cuenta=True las posiciones de cada cuenta (la del nombre del export, ver cuentas.cuenta_de_archivo)
+    van a su propia partición, <carpeta_posiciones>/<cuenta>/ y <carpeta_cerradas>/<cuenta>/, con su propio
+    índice de ciclo de vida: los cierres de una cuenta solo se asocian con posiciones de esa cuenta. En el
+    almacen se guardan con el nombre "<cuenta>/<archivo>.yaml". Los archivos sin cuenta reconocible usan las
+    carpetas base. Con workers, los archivos de cuentas distintas se preparan en paralelo. ciclo_vida puede ser
+    entonces un diccionario {cuenta: CicloVida} que se completa con los índices que se vayan cargando. Los
+    Calendars que quedan para revisión se encolan con su cuenta y se resuelven en esa partición (ver
+    resolver_revision_calendars).
+
+    Con un archivo_columnar (ver archivo_columnar.ArchivoColumnar), las transacciones nuevas de cada archivo se
+    agregan también a ese archivo histórico, antes de registrar el CSV como ingerido.
+
+    Con un cache_clasificacion (ver cache_clasificacion.CacheClasificacion), las estrategias de las firmas de
+    patas ya vistas (con la misma versión de las reglas) no se vuelven a calcular. Con workers, cada proceso
+    abre el mismo cache y guarda ahí lo que clasifica.
+    """
+    if metricas is None:
+        metricas = Metricas()
+    ciclos_vida = ciclo_vida if isinstance(ciclo_vida, dict) else {} if ciclo_vida is None else {None: ciclo_vida}
+
+    def destino(archivo_csv_ruta):
+        # Carpeta de posiciones, almacen y ciclo de vida de la partición del archivo
+        cuenta = cuenta_de_archivo(archivo_csv_ruta) if por_cuenta else None
+        if cuenta not in ciclos_vida and carpeta_cerradas:
+            with metricas.etapa('indice_ciclo_vida'):
+                ciclos_vida[cuenta] = CicloVida(carpeta_cuenta(carpeta_posiciones, cuenta),
+                                                carpeta_cuenta(carpeta_cerradas, cuenta))
+        if cuenta is None:
+            return cuenta, carpeta_posiciones, almacen, ciclos_vida.get(cuenta)
+        os.makedirs(carpeta_cuenta(carpeta_posiciones, cuenta), exist_ok=True)
+        return (cuenta, carpeta_cuenta(carpeta_posiciones, cuenta), almacen and AlmacenCuenta(almacen, cuenta),
+                ciclos_vida.get(cuenta))
+
+    with RegistroIngesta(archivo_registro) as registro:
+        registro.importar_procesados_txt(archivo_procesados)
+
+        if archivos is None:
+            archivos = glob.glob(os.path.join(carpeta_csv, "*.csv"))
+        archivos_csv = sorted(ruta for ruta in archivos if not registro.nombre_registrado(os.path.basename(ruta)))
+
+        if workers and workers > 1 and len(archivos_csv) > 1:
+            if decisiones_calendar is None:
+                decisiones_calendar = DecisionesCalendar('rechazar')
+            elif decisiones_calendar.modo == 'interactivo':
+                raise ValueError("El modo interactivo de Calendars no se puede usar con workers")
+            with ProcessPoolExecutor(max_workers=workers) as ejecutor:
+                # map devuelve los resultados en el orden de envío: el commit es determinista
+                preparar = partial(preparar_archivo_actividad, decisiones_calendar=decisiones_calendar,
+                                   chunksize=chunksize, perfilar_archivo=perfilar_archivo,
+                                   carpeta_perfil=carpeta_metricas,
+                                   separar_cierres=bool(carpeta_cerradas or ciclos_vida),
+                                   archivar=archivo_columnar is not None,
+                                   ruta_cache_clasificacion=cache_clasificacion and cache_clasificacion.ruta)
+                resultados = ejecutor.map(preparar, archivos_csv)
+                for archivo_csv_ruta, resultado in zip(archivos_csv, resultados):
+                    hash_contenido, claves, posiciones, cierres, revision, transacciones, metricas_archivo = resultado
+                    cuenta, carpeta_archivo, almacen_archivo, ciclo_vida = destino(archivo_csv_ruta)
+                    if registro.archivo_registrado(hash_contenido):
+                        posiciones, cierres, revision, transacciones = [], None, [], None
+                        metricas_archivo = Metricas()
+                        metricas_archivo.contar('archivos_duplicados')
+                    elif registro.claves_existentes(claves):
+                        # Se solapa con algo ya ingerido: se rehace solo con las filas nuevas
+                        filtro, transacciones = _filtro_archivo(registro, hash_contenido, archivo_columnar is not None)
+                        metricas_archivo = Metricas()
+                        cierres = [] if ciclo_vida is not None else None
+                        revision = []
+                        posiciones = iterar_posiciones_actividad(archivo_csv_ruta, decisiones_calendar, chunksize,
+                                                                 filtro, metricas_archivo, cierres,
+                                                                 cache_clasificacion, revision)
+                    else:
+                        registro.agregar_claves(claves, hash_contenido)
+                    confirmar_archivo_actividad(archivo_csv_ruta, hash_contenido, posiciones, carpeta_procesados,
+                                                carpeta_archivo, registro, almacen_archivo, metricas_archivo, cierres,
+                                                ciclo_vida, archivo_columnar, transacciones, cache_clasificacion,
+                                                decisiones_calendar, revision, cuenta)
+                    metricas.agregar_archivo(os.path.basename(archivo_csv_ruta), metricas_archivo)
+        else:
+            for archivo_csv_ruta in archivos_csv:
+                metricas_archivo = Metricas()
+                cuenta, carpeta_archivo, almacen_archivo, ciclo_vida = destino(archivo_csv_ruta)
+                with _contexto_perfil(archivo_csv_ruta, perfilar_archivo, carpeta_metricas):
+                    with metricas_archivo.etapa('hash_archivo'):
+                        hash_contenido = hash_archivo(archivo_csv_ruta)
+                    cierres = [] if ciclo_vida is not None else None
+                    revision = []
+                    if registro.archivo_registrado(hash_contenido):
+                        posiciones, transacciones = [], None
+                        metricas_archivo.contar('archivos_duplicados')
+                    else:
+                        filtro, transacciones = _filtro_archivo(registro, hash_contenido, archivo_columnar is not None)
+                        posiciones = iterar_posiciones_actividad(archivo_csv_ruta, decisiones_calendar, chunksize,
+                                                                 filtro, metricas_archivo, cierres,
+                                                                 cache_clasificacion, revision)
+                    confirmar_archivo_actividad(archivo_csv_ruta, hash_contenido, posiciones, carpeta_procesados,
+                                                carpeta_archivo, registro, almacen_archivo, metricas_archivo, cierres,
+                                                ciclo_vida, archivo_columnar, transacciones, cache_clasificacion,
+                                                decisiones_calendar, revision, cuenta)
+                metricas.agregar_archivo(os.path.basename(archivo_csv_ruta), metricas_archivo)
+
+    if carpeta_metricas:
+        print(f"Métricas guardadas en: {metricas.guardar(carpeta_metricas)}")
+    return metricas
+
+
+def preparar_archivo_actividad(archivo_csv_ruta, decisiones_calendar=None, chunksize=None, perfilar_archivo=None,
+                               carpeta_perfil="data/metricas", separar_cierres=False, archivar=False,
+                               ruta_cache_clasificacion=None):
+    """
+    Lee, agrupa y clasifica un archivo CSV de actividad sin escribir nada en disco. Se puede ejecutar en un
+    proceso aparte. Si el archivo es perfilar_archivo, se procesa bajo perfilar (ver metricas.perfilar).
+    Devuelve una tupla (hash_contenido, claves, posiciones, cierres, revision, transacciones, metricas), donde
+    claves son las claves de todas sus transacciones, posiciones una lista de tuplas (nombre_archivo_yaml,
+    posicion_data), cierres la lista de trades de cierre (None si no se pidió separar_cierres), revision los
+    candidatos a Calendar que quedaron para revisión (tuplas (trade_id, patas), que se encolan al confirmar el
+    archivo), transacciones los bloques de columnas para el archivo columnar (None si no se pidió archivar) y
+    metricas las Metricas del archivo.
+    Con ruta_cache_clasificacion se usa ese CacheClasificacion, y es lo único que se escribe: las
+    clasificaciones nuevas, al terminar el archivo.
+    """
+    metricas = Metricas()
+    filtro, transacciones = _filtro_archivo(None, None, archivar)
+    cierres = [] if separar_cierres else None
+    revision = []
+    with _contexto_perfil(archivo_csv_ruta, perfilar_archivo, carpeta_perfil), \
+            _abrir_cache(ruta_cache_clasificacion) as cache:
+        posiciones = list(iterar_posiciones_actividad(archivo_csv_ruta, decisiones_calendar, chunksize, filtro,
+                                                      metricas, cierres, cache, revision))
+        with metricas.etapa('hash_archivo'):
+            hash_contenido = hash_archivo(archivo_csv_ruta)
+    return hash_contenido, filtro.claves, posiciones, cierres, revision, transacciones, metricas
+
+
+def _abrir_cache(ruta_cache_clasificacion):
     """
-    try:
-        with open(archivo_procesados, 'r') as f:
-            archivos_procesados = f.read().splitlines()
-    except FileNotFoundError:
-        archivos_procesados = []
+    Abre el CacheClasificacion de la ruta indicada, o devuelve un contexto vacío (None) si no hay ruta.
+    """
+    if not ruta_cache_clasificacion:
+        return nullcontext()
+    from cache_clasificacion import CacheClasificacion
+    return CacheClasificacion(ruta_cache_clasificacion)
 
-    archivos_csv = glob.glob(os.path.join(carpeta_csv, "*.csv"))
 
-    for archivo_csv_ruta in archivos_csv:
-        nombre_archivo = os.path.basename(archivo_csv_ruta)
-        if nombre_archivo not in archivos_procesados:
-            df = pd.read_csv(archivo_csv_ruta)
-            procesar_archivo_actividad(df, nombre_archivo, carpeta_posiciones)
-            archivos_procesados.append(nombre_archivo)
-            with open(archivo_procesados, 'a') as f:
-                f.write(nombre_archivo + '\n')
-            # Mover el archivo a la carpeta 'procesados'
-            shutil.move(archivo_csv_ruta, os.path.join(carpeta_csv, "procesados", nombre_archivo))
+def _filtro_archivo(registro, hash_contenido, archivar):
+    """
+    Devuelve (filtro, transacciones): el FiltroTransacciones del archivo (del registro, si se indica) y, si
+    archivar es True, la lista de bloques de columnas de las filas nuevas para el archivo columnar, que se llena
+    a medida que el filtro procesa el archivo (el filtro va envuelto en un ColectorColumnar).
+    """
+    filtro = registro.filtro_transacciones(hash_contenido) if registro is not None else FiltroTransacciones()
+    if not archivar:
+        return filtro, None
+    # archivo_columnar importa este módulo: se importa recién al usarlo
+    from archivo_columnar import ColectorColumnar
+    colector = ColectorColumnar(filtro)
+    return colector, colector.bloques
 
 
-def procesar_archivo_actividad(df, nombre_archivo, carpeta_posiciones="data/yaml/posiciones_activas/"):
+def _contexto_perfil(archivo_csv_ruta, perfilar_archivo, carpeta_perfil):
     """
-    Procesa un único DataFrame (ya leído desde el CSV) y crea archivos YAML de posiciones.
+    Devuelve el contexto de perfilar si archivo_csv_ruta es el archivo a perfilar, o uno que no hace nada.
     """
+    nombre_archivo = os.path.basename(archivo_csv_ruta)
+    if perfilar_archivo and nombre_archivo == os.path.basename(perfilar_archivo):
+        return perfilar(os.path.join(carpeta_perfil or '.', 'perfil_' + os.path.splitext(nombre_archivo)[0]))
+    return nullcontext()
 
-    trades_agrupados = agrupar_trades(df)
 
-    for subyacente_base, trade_data in trades_agrupados.items():
-        crear_archivo_yaml_posicion(df, subyacente_base, trade_data, carpeta_posiciones)
+def iterar_posiciones_actividad(archivo_csv_ruta, decisiones_calendar=None, chunksize=None, filtro=None,
+                                metricas=None, cierres=None, cache_clasificacion=None, revision=None):
+    """
+    Genera las tuplas (nombre_archivo_yaml, posicion_data) de un archivo CSV de actividad.
+    Con chunksize el archivo se procesa en streaming y cada posición se genera en cuanto su trade se cierra.
+    Si se indica un filtro (por ejemplo un FiltroTransacciones), se aplica a las filas antes de agruparlas.
+    Si se indica una lista cierres, los trades con patas de cierre se agregan a ella en lugar de generar una
+    posición. Con un cache_clasificacion, las estrategias se toman de ahí cuando la firma ya se conoce.
+    Con una lista revision, los candidatos a Calendar que quedan para revisión se agregan a ella en lugar de
+    anotarse en la cola (ver agrupar_calendars).
+    """
+    if metricas is None:
+        metricas = Metricas()
+    aciertos = cache_clasificacion.aciertos if cache_clasificacion is not None else 0
 
+    if chunksize:
+        trades = iterar_trades_actividad(archivo_csv_ruta, chunksize, decisiones_calendar=decisiones_calendar,
+                                         filtro=filtro, metricas=metricas, revision=revision)
+    else:
+        with metricas.etapa('lectura_csv'):
+            df = leer_csv_actividad(archivo_csv_ruta)
+        metricas.contar('filas_leidas', len(df))
+        if filtro is not None:
+            df = _aplicar_filtro(df, filtro, metricas)
+        trades = agrupar_trades(df, decisiones_calendar=decisiones_calendar, metricas=metricas,
+                                revision=revision).items()
+
+    for trade_id, trade_data in trades:
+        if cierres is not None and es_trade_de_cierre(trade_data):
+            metricas.contar('trades_de_cierre')
+            cierres.append(trade_data)
+            continue
+        with metricas.etapa('clasificacion'):
+            posicion = construir_posicion(trade_data[0]['Subyacente Base'], trade_data, cache_clasificacion)
+        if posicion:
+            metricas.contar('posiciones')
+            metricas.contar_estrategia(posicion[1]['estrategia'])
+            yield posicion
+    if cache_clasificacion is not None:
+        metricas.contar('clasificaciones_en_cache', cache_clasificacion.aciertos - aciertos)
+
+
+def _aplicar_filtro(df, filtro, metricas):
+    """
+    Aplica el filtro de transacciones a df contando las filas que descarta.
+    """
+    with metricas.etapa('filtro_registro'):
+        filtrado = filtro(df)
+    metricas.contar('filas_ya_ingeridas', len(df) - len(filtrado))
+    return filtrado
 
-def agrupar_trades(df, umbral_tiempo_minutos=3):
+
+def leer_csv_actividad(archivo_csv_ruta, chunksize=None):
     """
-    Agrupa las filas del DataFrame en trades basado en la cercanía en la fecha/hora de ejecución y el subyacente "base".
+    Lee un CSV de actividad de tastytrade cargando solo las columnas de TIPOS_ACTIVIDAD con tipos compactos.
+    Con chunksize devuelve un iterador de DataFrames en lugar de un único DataFrame.
     """
-    trades = defaultdict(list)
+    return pd.read_csv(archivo_csv_ruta, usecols=lambda columna: columna in TIPOS_ACTIVIDAD, dtype=TIPOS_ACTIVIDAD,
+                       chunksize=chunksize)
+
 
-    for index, row in df.iterrows():
-        fecha_hora_str = row['Date']
-        fecha_hora_dt = datetime.fromisoformat(fecha_hora_str)
-        underlying_symbol = row['Underlying Symbol'] if row['Instrument Type'] == 'Future Option' else row['Root Symbol']
-        # Extraer el "símbolo base" del futuro
-        if row['Instrument Type'] == 'Future Option' and underlying_symbol:
-            underlying_symbol_base = underlying_symbol[:-2]
+def iterar_trades_actividad(archivo_csv_ruta, chunksize=50000, umbral_tiempo_minutos=3, separar_por_orden=True,
+                            decisiones_calendar=None, filtro=None, metricas=None, revision=None):
+    """
+    Versión en streaming de agrupar_trades: lee el CSV en bloques de chunksize filas y genera tuplas
+    (trade_id, patas) a medida que cada trade se cierra.
+
+    El archivo debe estar ordenado por fecha (ascendente o descendente, como lo exporta tastytrade). Los trades
+    que todavía pueden recibir ejecuciones del bloque siguiente (el último de cada subyacente, dentro del umbral
+    de tiempo respecto al borde del bloque) se arrastran y se vuelven a agrupar junto con ese bloque, por lo
+    que el resultado coincide con el de agrupar_trades sobre el archivo completo.
+
+    Si se indica un filtro, se aplica a cada bloque (después de validar su orden) antes de agruparlo. revision
+    es la de agrupar_calendars.
+    """
+    if metricas is None:
+        metricas = Metricas()
+    umbral = pd.Timedelta(minutes=umbral_tiempo_minutos)
+    arrastre = None
+    ascendente = None
+    frontera = None
+
+    for bloque in metricas.medir_iterador('lectura_csv', leer_csv_actividad(archivo_csv_ruta, chunksize)):
+        metricas.contar('filas_leidas', len(bloque))
+        with metricas.etapa('agrupar_trades'):
+            fechas_bloque = pd.to_datetime(bloque['Date'], utc=True, format='ISO8601').dropna()
+        if fechas_bloque.empty:
+            continue
+        primera = fechas_bloque.iloc[0] if frontera is None else frontera
+        if ascendente is None and fechas_bloque.iloc[-1] != primera:
+            ascendente = fechas_bloque.iloc[-1] > primera
+        if ascendente is False:
+            ordenado = fechas_bloque.is_monotonic_decreasing and fechas_bloque.iloc[0] <= primera
         else:
-            underlying_symbol_base = underlying_symbol
+            ordenado = fechas_bloque.is_monotonic_increasing and fechas_bloque.iloc[0] >= primera
+        if not ordenado:
+            raise ValueError(f"El archivo {archivo_csv_ruta} no está ordenado por fecha; procesarlo sin chunksize")
+        frontera = fechas_bloque.iloc[-1]
+
+        if filtro is not None:
+            bloque = _aplicar_filtro(bloque, filtro, metricas)
+        if arrastre is not None:
+            bloque = pd.concat([arrastre, bloque], ignore_index=True)
+        if ascendente is None:
+            # Todas las fechas leídas hasta ahora son iguales: todavía no se sabe hacia dónde avanza el archivo
+            arrastre = bloque
+            continue
+
+        with metricas.etapa('agrupar_trades'):
+            clusters = asignar_clusters(bloque, umbral_tiempo_minutos, separar_por_orden)
+
+            # Solo el trade más cercano a la frontera de cada subyacente puede seguir abierto
+            fechas = pd.to_datetime(clusters['Date'], utc=True, format='ISO8601')
+            por_trade = fechas.groupby(clusters['Trade ID'], sort=False)
+            if ascendente:
+                extremo = por_trade.max()
+                candidatos = clusters.groupby('Subyacente Base', sort=False)['Trade ID'].last()
+                abiertos = candidatos[(frontera - extremo.loc[candidatos]).to_numpy() <= umbral]
+            else:
+                extremo = por_trade.min()
+                candidatos = clusters.groupby('Subyacente Base', sort=False)['Trade ID'].first()
+                abiertos = candidatos[(extremo.loc[candidatos] - frontera).to_numpy() <= umbral]
+
+            es_abierto = clusters['Trade ID'].isin(abiertos)
+            arrastre = clusters.loc[es_abierto, bloque.columns]
+        yield from _trades_cerrados(clusters[~es_abierto], decisiones_calendar, metricas, revision)
+
+    if arrastre is not None and not arrastre.empty:
+        with metricas.etapa('agrupar_trades'):
+            clusters = asignar_clusters(arrastre, umbral_tiempo_minutos, separar_por_orden)
+        yield from _trades_cerrados(clusters, decisiones_calendar, metricas, revision)
+
+
+def _trades_cerrados(clusters, decisiones_calendar, metricas, revision=None):
+    """
+    Convierte un DataFrame de clusters cerrados en tuplas (trade_id, patas), pasando por agrupar_calendars.
+    """
+    with metricas.etapa('agrupar_trades'):
+        trades = _separar_clusters(clusters)
+    metricas.contar('trades', len(trades))
+    return agrupar_calendars(clusters, trades, decisiones_calendar, metricas, revision).items()
+
+
+def confirmar_archivo_actividad(archivo_csv_ruta, hash_contenido, posiciones, carpeta_procesados, carpeta_posiciones,
+                                registro, almacen=None, metricas=None, cierres=None, ciclo_vida=None,
+                                archivo_columnar=None, transacciones=None, cache_clasificacion=None,
+                                decisiones_calendar=None, revision=None, cuenta=None):
+    """
+    Escribe las posiciones de un archivo ya preparado (en YAML y, si se indica, en el almacen), lo registra
+    (junto con las claves de transacciones pendientes) en el RegistroIngesta y lo mueve a carpeta_procesados,
+    en ese orden.
+
+    Con un ciclo_vida, las posiciones nuevas se suman a su índice y después se aplican los trades de cierre en
+    orden cronológico (así un cierre encuentra también las posiciones abiertas en el mismo archivo); las
+    posiciones modificadas o cerradas se escriben antes de registrar el archivo.
+
+    Con un archivo_columnar, las transacciones (bloques de archivo_columnar.columnas_transacciones) se le
+    agregan también antes de registrar el archivo. Las posiciones que abren los rolls se clasifican con el
+    cache_clasificacion, si se indica, y las clasificaciones nuevas se guardan en él.
+
+    Los candidatos a Calendar que quedaron para revisión (revision, armada como en iterar_posiciones_actividad
+    solo con las filas nuevas) se agregan a la cola de decisiones_calendar después de escribir las posiciones y
+    antes de registrar el archivo, con la cuenta de su partición (None si no se particiona); la cola omite los
+    que ya tiene, así reintentar un archivo interrumpido no los duplica.
+    """
+    if metricas is None:
+        metricas = Metricas()
+
+    nombre_archivo = os.path.basename(archivo_csv_ruta)
+    guardar_posiciones(posiciones, carpeta_posiciones, almacen, metricas, cierres, ciclo_vida, cache_clasificacion)
+
+    if revision:
+        with metricas.etapa('agrupar_calendars'):
+            decisiones_calendar.enviar_a_revision(revision, cuenta)
+
+    if archivo_columnar is not None and transacciones is not None:
+        with metricas.etapa('archivo_columnar'):
+            archivo_columnar.agregar(transacciones, hash_contenido)
+
+    with metricas.etapa('registro'):
+        registro.registrar_archivo(hash_contenido, nombre_archivo)
+
+    # Mover el archivo a la carpeta 'procesados'
+    with metricas.etapa('mover_archivo'):
+        os.makedirs(carpeta_procesados, exist_ok=True)
+        shutil.move(archivo_csv_ruta, os.path.join(carpeta_procesados, nombre_archivo))
+    metricas.contar('archivos_procesados')
+
+
+def guardar_posiciones(posiciones, carpeta_posiciones, almacen=None, metricas=None, cierres=None, ciclo_vida=None,
+                       cache_clasificacion=None):
+    """
+    Escribe posiciones nuevas (tuplas (nombre_archivo_yaml, Posicion)) en YAML y, si se indica, en el almacen y
+    el índice del ciclo_vida, y aplica los trades de cierre. Es la parte de confirmar_archivo_actividad que no
+    depende del CSV: la usa también resolver_revision_calendars.
+    """
+    if metricas is None:
+        metricas = Metricas()
+
+    lote = LoteYAML()
+    for nombre_yaml, posicion_data in posiciones:
+        _agregar_posicion(lote, carpeta_posiciones, nombre_yaml, posicion_data, almacen, ciclo_vida, metricas)
+
+    if ciclo_vida is not None and cierres:
+        for trade_data in sorted(cierres, key=lambda trade: datetime.fromisoformat(trade[0]['Date'])):
+            with metricas.etapa('ciclo_vida'):
+                aperturas = ciclo_vida.aplicar(trade_data, metricas)
+            if not aperturas:
+                continue
+            # Roll de una posición desconocida: las patas abiertas forman una posición nueva
+            with metricas.etapa('clasificacion'):
+                posicion = construir_posicion(aperturas[0]['Subyacente Base'], aperturas, cache_clasificacion)
+            if posicion:
+                metricas.contar('posiciones')
+                metricas.contar_estrategia(posicion[1]['estrategia'])
+                _agregar_posicion(lote, carpeta_posiciones, *posicion, almacen, ciclo_vida, metricas)
+    _confirmar_lote_yaml(lote, metricas)
+
+    if ciclo_vida is not None:
+        with metricas.etapa('ciclo_vida'):
+            actualizadas = ciclo_vida.confirmar()
+        if almacen is not None:
+            with metricas.etapa('almacen'):
+                for nombre_yaml, posicion_data in actualizadas:
+                    almacen.guardar(nombre_yaml, posicion_data)
+    if almacen is not None:
+        with metricas.etapa('almacen'):
+            almacen.confirmar()
+    if cache_clasificacion is not None:
+        with metricas.etapa('clasificacion'):
+            cache_clasificacion.confirmar()
+
+
+def _agregar_posicion(lote, carpeta_posiciones, nombre_yaml, posicion, almacen, ciclo_vida, metricas):
+    """
+    Agrega una posición nueva (Posicion) al lote de YAML (confirmándolo si llegó a TAMANO_LOTE_YAML), al almacen
+    y al índice del ciclo de vida, si los hay. Todos reciben el mismo diccionario del YAML.
+    """
+    ruta_yaml = os.path.join(carpeta_posiciones, nombre_yaml)
+    with metricas.etapa('serializacion_yaml'):
+        posicion_data = posicion.a_yaml()
+        lote.agregar(ruta_yaml, posicion_data)
+    if almacen is not None:
+        with metricas.etapa('almacen'):
+            almacen.guardar(nombre_yaml, posicion_data)
+    if ciclo_vida is not None:
+        ciclo_vida.registrar(ruta_yaml, posicion_data)
+    if len(lote.pendientes) >= TAMANO_LOTE_YAML:
+        _confirmar_lote_yaml(lote, metricas)
+
+
+def _confirmar_lote_yaml(lote, metricas):
+    """
+    Confirma un LoteYAML informando cada archivo escrito.
+    """
+    with metricas.etapa('escritura_yaml'):
+        rutas = lote.confirmar()
+    metricas.contar('yaml_escritos', len(rutas))
+    for ruta_archivo in rutas:
+        print(f"Archivo YAML creado: {ruta_archivo}")
 
-        trade_id = underlying_symbol_base
 
-        if trade_id not in trades:
-            trades[trade_id] = []
+def procesar_archivo_actividad(df, nombre_archivo, carpeta_posiciones="data/yaml/posiciones_activas/", metricas=None):
+    """
+    Procesa un único DataFrame (ya leído desde el CSV) y crea archivos YAML de posiciones.
+    Devuelve las Metricas del procesamiento (las recibidas en metricas, si se indican).
+    """
+    if metricas is None:
+        metricas = Metricas()
+    metricas.contar('filas_leidas', len(df))
+
+    trades_agrupados = agrupar_trades(df, metricas=metricas)
+
+    for trade_id, trade_data in trades_agrupados.items():
+        with metricas.etapa('clasificacion'):
+            posicion = construir_posicion(trade_data[0]['Subyacente Base'], trade_data)
+        if posicion:
+            nombre_yaml, posicion_data = posicion
+            metricas.contar('posiciones')
+            metricas.contar_estrategia(posicion_data['estrategia'])
+            with metricas.etapa('escritura_yaml'):
+                escribir_archivo_yaml_posicion(os.path.join(carpeta_posiciones, nombre_yaml), posicion_data.a_yaml())
+            metricas.contar('yaml_escritos')
+
+    return metricas
 
-        trades[trade_id].append(row.to_dict())
+
+def calcular_subyacente_base(df):
+    """
+    Calcula de forma vectorizada el subyacente "base" de cada fila.
+    Para opciones sobre futuros se quita el código de vencimiento del futuro (/ESZ4 -> /ES); para el resto
+    se usa el Root Symbol.
+    """
+    es_futuro = df['Instrument Type'] == 'Future Option'
+    return df['Root Symbol'].where(~es_futuro, df['Underlying Symbol'].str[:-2])
+
+
+def asignar_clusters(df, umbral_tiempo_minutos=3, separar_por_orden=True):
+    """
+    Asigna cada fila a un cluster (trade) de forma vectorizada.
+
+    Las filas se ordenan por (subyacente base, Date) y se abre un cluster nuevo cuando cambia el subyacente,
+    cuando la distancia con la fila anterior supera el umbral de tiempo o, si separar_por_orden es True,
+    cuando cambia el Order #. Las filas sin subyacente (movimientos de dinero, ajustes) se descartan.
+
+    Returns:
+        pd.DataFrame: Copia ordenada de df con las columnas 'Subyacente Base' y 'Trade ID'. El Trade ID es
+        estable: se forma con el subyacente base y la fecha/hora UTC de la primera ejecución del cluster.
+    """
+    trabajo = df.assign(**{'Subyacente Base': calcular_subyacente_base(df),
+                           '_fecha': pd.to_datetime(df['Date'], utc=True, format='ISO8601')})
+    trabajo = trabajo[trabajo['Subyacente Base'].notna()]
+    trabajo = trabajo.sort_values(['Subyacente Base', '_fecha'], kind='mergesort').reset_index(drop=True)
+
+    base = trabajo['Subyacente Base']
+    fechas = trabajo['_fecha']
+    inicio = (base != base.shift()) | (fechas.diff() > pd.Timedelta(minutes=umbral_tiempo_minutos))
+    if separar_por_orden:
+        orden = trabajo['Order #'].fillna(-1)
+        inicio |= orden != orden.shift()
+
+    # Identificadores legibles y estables: subyacente + primera ejecución (con sufijo si se repiten)
+    numero_cluster = inicio.cumsum() - 1
+    ids = base[inicio] + '_' + fechas[inicio].dt.strftime('%Y%m%dT%H%M%S')
+    repeticiones = ids.groupby(ids).cumcount()
+    ids = ids.where(repeticiones == 0, ids + '-' + repeticiones.astype(str))
+    trabajo['Trade ID'] = ids.to_numpy()[numero_cluster.to_numpy()]
+
+    return trabajo.drop(columns='_fecha')
+
+
+def agrupar_trades(df, umbral_tiempo_minutos=3, separar_por_orden=True, decisiones_calendar=None, metricas=None,
+                   revision=None):
+    """
+    Agrupa las filas del DataFrame en trades basado en la cercanía en la fecha/hora de ejecución y el subyacente "base".
+    Devuelve un diccionario {trade_id: [patas]} con las patas de cada trade en orden cronológico.
+    """
+    if metricas is None:
+        metricas = Metricas()
+
+    with metricas.etapa('agrupar_trades'):
+        clusters = asignar_clusters(df, umbral_tiempo_minutos, separar_por_orden)
+        trades = _separar_clusters(clusters)
+    metricas.contar('trades', len(trades))
 
     # Verificar y agrupar manualmente los Calendar 1-1-2s (opcional)
-    trades = agrupar_calendars(df, trades)
+    trades = agrupar_calendars(clusters, trades, decisiones_calendar, metricas, revision)
 
     return trades
 
 
-def agrupar_calendars(df, trades):
+def _separar_clusters(clusters):
     """
-    Intenta agrupar los Calendar 1-1-2s. Requiere intervención manual.
+    Parte un DataFrame devuelto por asignar_clusters en un diccionario {trade_id: [patas]}, con cada pata como
+    una Transaccion (solo las columnas que se usan después, en lugar de un diccionario con todas).
     """
-    calendar_trades = defaultdict(list)
-    otros_trades = defaultdict(list)
+    registros = Transaccion.desde_dataframe(clusters)
+    ids = clusters['Trade ID'].to_numpy()
+    limites = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+    inicios = np.concatenate(([0], limites)) if len(ids) else limites
+    finales = np.concatenate((limites, [len(ids)]))
 
-    for trade_id, trade in trades.items():
-        if len(trade) == 3 and all(parse_symbol_improved(t['Symbol'])['tipo'] == 'PUT' for t in trade if
-                                  parse_symbol_improved(t['Symbol'])) and sum(t['Quantity'] for t in trade) == 2 and len(
-                set(parse_symbol_improved(t['Symbol'])['vencimiento'] for t in trade if
-                    parse_symbol_improved(t['Symbol']))) == 2:
-            print(f"\nPosible Calendar 1-1-2: Trade ID(s): {[t['Order #'] for t in trade]}")
-            for t in trade:
-                print(f"- {t['Date']} - {t['Description']}")
-            confirmacion = input("¿Es este un Calendar 1-1-2? (s/n): ")
-            if confirmacion.lower() == 's':
-                calendar_trades[trade_id] = trade  # Mantener el trade_id
-            else:
-                otros_trades[trade_id] = trade
-        else:
-            otros_trades[trade_id] = trade
+    return {ids[inicio]: registros[inicio:fin] for inicio, fin in zip(inicios, finales)}
 
-    trades.clear()
-    trades.update(otros_trades)
-    trades.update(calendar_trades)
+
+def agrupar_calendars(df, trades, decisiones_calendar=None, metricas=None, revision=None):
+    """
+    Intenta agrupar los Calendar 1-1-2s. Requiere intervención manual salvo que se indique otro modo.
+
+    Args:
+        df (pd.DataFrame): Clusters devueltos por asignar_clusters (con la columna 'Trade ID').
+        trades (dict): Diccionario {trade_id: [patas]} de esos clusters.
+        decisiones_calendar (DecisionesCalendar): Cómo decidir cada candidato. Por defecto se pregunta por
+            consola. Los trades confirmados se marcan con 'Calendar Confirmado' en sus patas; los que quedan
+            para revisión se quitan del diccionario.
+        revision (list): Si se indica, los trades que quedan para revisión se agregan a ella como tuplas
+            (trade_id, patas), para encolarlos recién al confirmar el archivo (ver confirmar_archivo_actividad);
+            si no, se anotan en la cola en el momento.
+
+    Returns:
+        dict: El diccionario de trades actualizado.
+    """
+    if decisiones_calendar is None:
+        decisiones_calendar = DecisionesCalendar()
+    if metricas is None:
+        metricas = Metricas()
+
+    with metricas.etapa('agrupar_calendars'):
+        for trade_id in detectar_candidatos_calendar(df):
+            metricas.contar('candidatos_calendar')
+            trade = trades[trade_id]
+            decision = decisiones_calendar.decidir(trade_id, trade)
+            if decision is None:
+                metricas.contar('calendars_en_revision')
+                del trades[trade_id]
+                if revision is not None:
+                    revision.append((trade_id, trade))
+                else:
+                    decisiones_calendar.enviar_a_revision([(trade_id, trade)])
+            elif decision:
+                metricas.contar('calendars_confirmados')
+                for pata in trade:
+                    pata['Calendar Confirmado'] = True  # Mantener el trade_id
+            else:
+                metricas.contar('calendars_rechazados')
 
     return trades
 
 
+def detectar_candidatos_calendar(clusters):
+    """
+    Detecta los trades candidatos a Calendar 1-1-2 con la misma prueba que el clasificador
+    (clasificador.es_candidato_calendar sobre la firma de sus patas).
+
+    Una sola pasada vectorizada descarta los trades que no pueden serlo (los que no tienen 3 filas, todas PUT,
+    con cantidad neta de -2 y 2 vencimientos); solo los que quedan se arman como patas para calcular su firma.
+
+    Returns:
+        list: Los Trade ID candidatos, en el orden de clusters.
+    """
+    if clusters.empty:
+        return []
+    detalles = parse_symbols(clusters['Symbol'])
+    es_venta = clusters['Action'].astype('string').str.upper().str.contains('SELL').fillna(False).to_numpy()
+    cantidad = clusters['Quantity'].astype('float64').to_numpy()
+    por_trade = pd.DataFrame({
+        'Trade ID': clusters['Trade ID'].to_numpy(),
+        'es_put': (detalles['tipo'].eq('PUT') | detalles['tipo'].isna()).to_numpy(),
+        'vencimiento': detalles['vencimiento'].to_numpy(),
+        'cantidad': np.where(es_venta, -cantidad, cantidad),
+    }).groupby('Trade ID', sort=False).agg(patas=('es_put', 'size'), todas_put=('es_put', 'all'),
+                                           neto=('cantidad', 'sum'), vencimientos=('vencimiento', 'nunique'))
+    posibles = (por_trade['patas'] == 3) & por_trade['todas_put'] & (por_trade['neto'] == -2) & \
+        (por_trade['vencimientos'] == 2)
+    if not posibles.any():
+        return []
+
+    trades = _separar_clusters(clusters[clusters['Trade ID'].isin(por_trade.index[posibles])])
+    return [trade_id for trade_id, trade in trades.items() if _es_candidato_calendar(trade)]
+
+
+def _es_candidato_calendar(trade):
+    """
+    Aplica clasificador.es_candidato_calendar a las patas de un trade (filas de actividad).
+    """
+    patas = [pata for pata in map(construir_pata, trade) if pata]
+    return es_candidato_calendar(calcular_firma(patas))
+
+
+def resolver_revision_calendars(decisiones_calendar, carpeta_posiciones="data/yaml/posiciones_activas/",
+                                almacen=None, ciclo_vida=None, cache_clasificacion=None, metricas=None, cuenta=None):
+    """
+    Crea las posiciones de los trades de la cola de revisión que ya tienen decisión y deja en la cola solo los
+    que siguen pendientes. Cada trade se decide con el archivo de decisiones o el criterio de
+    decisiones_calendar y, si ninguno decide, con su modo ('aceptar', 'rechazar' o 'interactivo'; con
+    'revisar' sigue pendiente). Los confirmados son Calendar1-1-2; los rechazados se clasifican con las reglas.
+
+    Las posiciones se guardan como en la ingesta (ver guardar_posiciones): en YAML en carpeta_posiciones y, si
+    se indican, en el almacen y el índice del ciclo_vida, clasificadas con el cache_clasificacion. Cada trade va
+    a la partición de la cuenta con la que se encoló (<carpeta_posiciones>/<cuenta>/ y AlmacenCuenta), como en
+    procesar_archivos_actividad con por_cuenta; ciclo_vida puede ser también un diccionario {cuenta: CicloVida}.
+    Con cuenta solo se resuelven los trades de esa cuenta y el resto queda en la cola. La cola se reescribe
+    recién después de guardarlas.
+
+    Returns:
+        int: Cantidad de trades resueltos.
+    """
+    if metricas is None:
+        metricas = Metricas()
+
+    ciclos_vida = ciclo_vida if isinstance(ciclo_vida, dict) else {None: ciclo_vida}
+    pendientes = []
+    posiciones = {}
+    resueltos = 0
+    for item in leer_revision(decisiones_calendar.archivo_revision):
+        if cuenta is not None and item.get('cuenta') != cuenta:
+            pendientes.append(item)
+            continue
+        trade = item['patas']
+        decision = decisiones_calendar.decision_previa(trade)
+        if decision is None and decisiones_calendar.modo != 'revisar':
+            decision = decisiones_calendar.decidir(item['trade_id'], trade)
+        if decision is None:
+            pendientes.append(item)
+            continue
+        resueltos += 1
+        metricas.contar('calendars_confirmados' if decision else 'calendars_rechazados')
+        for pata in trade:
+            pata['Calendar Confirmado'] = decision
+        with metricas.etapa('clasificacion'):
+            posicion = construir_posicion(trade[0]['Subyacente Base'], trade, cache_clasificacion)
+        if posicion:
+            metricas.contar('posiciones')
+            metricas.contar_estrategia(posicion[1]['estrategia'])
+            posiciones.setdefault(item.get('cuenta'), []).append(posicion)
+
+    for cuenta_item, posiciones_cuenta in posiciones.items():
+        carpeta = carpeta_cuenta(carpeta_posiciones, cuenta_item)
+        os.makedirs(carpeta, exist_ok=True)
+        almacen_cuenta = AlmacenCuenta(almacen, cuenta_item) if almacen is not None and cuenta_item else almacen
+        guardar_posiciones(posiciones_cuenta, carpeta, almacen_cuenta, metricas,
+                           ciclo_vida=ciclos_vida.get(cuenta_item), cache_clasificacion=cache_clasificacion)
+    if resueltos:
+        guardar_revision(pendientes, decisiones_calendar.archivo_revision)
+    return resueltos
+
+
 def crear_archivo_yaml_posicion(df, subyacente_base, trade_data, carpeta_posiciones):
     """
     Crea un archivo YAML para una posición agrupada, utilizando el subyacente base en el nombre del archivo.
     Reemplaza caracteres problemáticos en el nombre del archivo.
     """
+    posicion = construir_posicion(subyacente_base, trade_data)
+    if posicion:
+        nombre_archivo, posicion_data = posicion
+        escribir_archivo_yaml_posicion(os.path.join(carpeta_posiciones, nombre_archivo), posicion_data.a_yaml())
+
+
+def construir_posicion(subyacente_base, trade_data, cache_clasificacion=None):
+    """
+    Arma los datos de una posición agrupada y el nombre de su archivo YAML, sin escribir nada en disco.
+    Devuelve una tupla (nombre_archivo, Posicion), o None si no hay datos de trade. Posicion.a_yaml() da el
+    diccionario que se guarda en el YAML. La estrategia se clasifica con cache_clasificacion, si se indica.
+    """
 
     if not trade_data:
-        return  # No hacer nada si no hay datos de trade
+        return None  # No hacer nada si no hay datos de trade
 
     fecha_inicio_str = trade_data[0]['Date'].split('T')[0]
     fecha_inicio = datetime.strptime(fecha_inicio_str, '%Y-%m-%d').strftime('%Y%m%d')
-    estrategia = "Unknown"
 
     patas = []
     total_credito_debito = 0.0
 
     for pata_data in trade_data:
-        pata_symbol = pata_data['Symbol']
-        pata_opcion_details = parse_symbol_improved(pata_symbol)
-        if pata_opcion_details:
-            # vencimiento_str = pata_opcion_details['vencimiento']
-            vencimiento_date = datetime.strptime(pata_data['Expiration Date'], '%m/%d/%y').date() if 'Expiration Date' in pata_data else None  # Usar Expiration Date
-            cantidad = -pata_data['Quantity'] if 'SELL' in str(pata_data['Action']).upper() else pata_data['Quantity']
-            patas.append({
-                'tipo': pata_opcion_details['tipo'],
-                'strike': pata_data['Strike Price'],
-                'vencimiento': vencimiento_date,
-                'cantidad': cantidad,
-                'precio_apertura': pata_data['Average Price'],
-                'precio_actual': pata_data['Average Price'],
-                'fecha_cierre': None,
-                'precio_cierre': None,
-                'accion': str(pata_data['Action']).upper()  # Guardar la acción en mayúsculas
-            })
+        pata = construir_pata(pata_data)
+        if pata:
+            patas.append(pata)
             total_credito_debito += pata_data['Total']
 
     # Determinar la estrategia DESPUÉS de agrupar las patas
-    if len(patas) == 1 and patas[0]['tipo'] == 'PUT' and patas[0]['cantidad'] < 0:
-        estrategia = "NakedPut"
-    elif es_1_1_2(patas):
-        estrategia = "1-1-2"
-        print("DEBUG: ¡Identificado como 1-1-2!")
-    elif es_calendar_1_1_2(patas):
+    if trade_data[0].get('Calendar Confirmado'):
         estrategia = "Calendar1-1-2"
-        print("DEBUG: ¡Identificado como Calendar 1-1-2!")
-    elif es_iron_condor(patas):
-        estrategia = "IronCondor"
-        print("DEBUG: ¡Identificado como Iron Condor!")
-    elif es_strangle(patas):
-        estrategia = "Strangle"
-        print("DEBUG: ¡Identificado como Strangle!")
-    elif es_butterfly(patas):
-        estrategia = "Butterfly"
-        print("DEBUG: ¡Identificado como Butterfly!")
-    elif es_broken_wing_butterfly(patas):
-        estrategia = "BrokenWingButterfly"
-        print("DEBUG: ¡Identificado como Broken Wing Butterfly!")
-    elif es_broken_wing_condor(patas):
-        estrategia = "BrokenWingCondor"
-        print("DEBUG: ¡Identificado como Broken Wing Condor!")
-    elif es_ratio_spread(patas):
-        estrategia = "RatioSpread"
-        print("DEBUG: ¡Identificado como Ratio Spread!")
+    elif cache_clasificacion is not None:
+        estrategia = cache_clasificacion.clasificar_patas(patas, total_credito_debito)
     else:
-        spread_type = identificar_spread(patas, total_credito_debito)
-        if spread_type:
-            estrategia = spread_type
-            print(f"DEBUG: ¡Identificado como {estrategia}!")
-        else:
-            estrategia = "Unknown"
-            print("DEBUG: No se pudo identificar la estrategia")
+        estrategia = clasificar_patas(patas, total_credito_debito)
 
     # Reemplazar caracteres problemáticos en el nombre del archivo
     subyacente_base_seguro = re.sub(r'[\\/*?:"<>|]', '_', subyacente_base)
-    nombre_archivo = f"{subyacente_base_seguro}_{fecha_inicio}_{estrategia}.yaml"
-    ruta_archivo = os.path.join(carpeta_posiciones, nombre_archivo)
-
-    posicion_data = {
-        'id': str(uuid.uuid4()),
-        'fecha_inicio': fecha_inicio,
-        'subyacente': subyacente_base,
-        'estrategia': estrategia,
-        'cantidad_rolls': 0,
-        'credito_debito_inicial': total_credito_debito,
-        'credito_debito_actual': total_credito_debito,
-        'patas': patas,
-        'beta_delta_inicial': None,
-        'delta_inicial': None,
-        'theta_inicial': None,
-        'vega_inicial': None,
-        'ivr_inicial': None,
-        'pop_inicial': None,
-        'log_diario': {
+    # La hora de la primera ejecución (y el sufijo de repetición del Trade ID, si lo hay) distingue dos
+    # posiciones de la misma estrategia abiertas el mismo día sobre el mismo subyacente
+    hora_inicio = trade_data[0]['Date'].split('T')[1][:8].replace(':', '')
+    _, guion, repeticion = str(trade_data[0].get('Trade ID', '')).rpartition('-')
+    sufijo = f"-{repeticion}" if guion and repeticion.isdigit() else ''
+    nombre_archivo = f"{subyacente_base_seguro}_{fecha_inicio}T{hora_inicio}{sufijo}_{estrategia}.yaml"
+
+    posicion_data = Posicion(
+        id=str(uuid.uuid4()),
+        fecha_inicio=fecha_inicio,
+        subyacente=subyacente_base,
+        estrategia=estrategia,
+        cantidad_rolls=0,
+        credito_debito_inicial=total_credito_debito,
+        credito_debito_actual=total_credito_debito,
+        patas=patas,
+        log_diario={
             fecha_inicio: {
                 'credito_debito': total_credito_debito,
                 'mark_precio_spread': None,
-                'dte_cercano': calcular_dte_pata(min(pata['vencimiento'] for pata in patas) if patas else None),
+                'dte_cercano': calcular_dte_pata(min(pata.vencimiento for pata in patas) if patas else None),
                 'beta_delta': None,
                 'delta': None,
                 'theta': None,
@@ -211,18 +831,20 @@ def crear_archivo_yaml_posicion(df, subyacente_base, trade_data, carpeta_posicio
                 'pop_estimado': None,
             }
         },
-        'fecha_cierre': None,
-        'precio_cierre': None,
-        'ganancia_perdida_neta': None,
-        'duracion_dias': None,
-    }
+    )
+
+    return nombre_archivo, posicion_data
+
 
-    with open(ruta_archivo, 'w') as archivo_yaml:
-        yaml.dump(posicion_data, archivo_yaml, default_flow_style=False)
+def escribir_archivo_yaml_posicion(ruta_archivo, posicion_data):
+    """
+    Escribe los datos de una posición en un archivo YAML de forma atómica y fuerza su volcado a disco.
+    """
+    escribir_yaml_atomico(ruta_archivo, posicion_data)
 
     print(f"Archivo YAML creado: {ruta_archivo}")
 
 
 if __name__ == "__main__":
-    archivo_csv = "data/csv/actividad/tastytrade_transactions_history_x5WW34822_241120_to_241120.csv"  # Reemplaza con tu archivo
+    # Atajo de siempre; la línea de comandos completa (con opciones y consultas) está en main.py
     procesar_archivos_actividad()
@@ -0,0 +1,181 @@
+import hashlib
+import os
+import sqlite3
+from datetime import datetime
+
+ESQUEMA_REGISTRO = """
+CREATE TABLE IF NOT EXISTS archivos (
+    hash TEXT PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    fecha_ingesta TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_archivos_nombre ON archivos (nombre);
+CREATE TABLE IF NOT EXISTS archivos_por_nombre (
+    nombre TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS transacciones (
+    clave TEXT PRIMARY KEY,
+    archivo_hash TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def hash_archivo(ruta, tamano_bloque=1 << 20):
+    """
+    Calcula el SHA-256 del contenido de un archivo, leyéndolo por bloques.
+    """
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(tamano_bloque), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def claves_transacciones(df, ocurrencias_previas=None):
+    """
+    Calcula de forma vectorizada la clave de cada transacción: Order #, Date, Symbol, Quantity y el número de
+    ocurrencia de esa combinación dentro del archivo (para no confundir ejecuciones parciales idénticas).
+
+    Args:
+        df (pd.DataFrame): Filas del CSV de actividad.
+        ocurrencias_previas (dict): Ocurrencias ya vistas por clave base (para continuar entre bloques).
+
+    Returns:
+        tuple: (claves, claves_base) como pd.Series de strings con el índice de df.
+    """
+    orden = df['Order #'].astype('Int64').astype('string').fillna('')
+    base = (orden + '|' + df['Date'].astype('string').fillna('') + '|' + df['Symbol'].astype('string').fillna('') +
+            '|' + df['Quantity'].astype('string').fillna(''))
+    ocurrencia = base.groupby(base, sort=False).cumcount()
+    if ocurrencias_previas:
+        ocurrencia += base.map(ocurrencias_previas).fillna(0).astype('int64')
+    return base + '|' + ocurrencia.astype('string'), base
+
+
+class RegistroIngesta:
+    """
+    Registro de ingesta sobre un índice sqlite3.
+
+    Identifica los archivos por el hash de su contenido y cada transacción por su clave (ver
+    claves_transacciones), de modo que un export que se solapa con otros ya ingeridos solo aporta las filas
+    nuevas. Las búsquedas van contra claves primarias: O(1) por fila.
+    """
+
+    def __init__(self, ruta_db="data/registro_ingesta.sqlite"):
+        if os.path.dirname(ruta_db):
+            os.makedirs(os.path.dirname(ruta_db), exist_ok=True)
+        self.conexion = sqlite3.connect(ruta_db)
+        self.conexion.executescript(ESQUEMA_REGISTRO)
+        self.conexion.execute("CREATE TEMP TABLE IF NOT EXISTS consulta (clave TEXT PRIMARY KEY)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_excepcion, excepcion, traza):
+        self.cerrar()
+
+    def cerrar(self):
+        """
+        Descarta lo que no se haya confirmado y cierra la conexión.
+        """
+        self.conexion.rollback()
+        self.conexion.close()
+
+    def importar_procesados_txt(self, archivo_procesados):
+        """
+        Importa los nombres del antiguo procesados.txt. Esos archivos se siguen reconociendo por nombre.
+        """
+        try:
+            with open(archivo_procesados, 'r') as f:
+                nombres = [(nombre,) for nombre in f.read().splitlines() if nombre]
+        except FileNotFoundError:
+            return
+        self.conexion.executemany("INSERT OR IGNORE INTO archivos_por_nombre (nombre) VALUES (?)", nombres)
+        self.conexion.commit()
+
+    def nombre_registrado(self, nombre):
+        """
+        Indica si el archivo figuraba en el antiguo procesados.txt.
+        """
+        fila = self.conexion.execute("SELECT 1 FROM archivos_por_nombre WHERE nombre = ?", (nombre,)).fetchone()
+        return fila is not None
+
+    def archivo_registrado(self, hash_contenido):
+        """
+        Indica si un archivo con este mismo contenido ya fue ingerido.
+        """
+        fila = self.conexion.execute("SELECT 1 FROM archivos WHERE hash = ?", (hash_contenido,)).fetchone()
+        return fila is not None
+
+    def claves_existentes(self, claves):
+        """
+        Devuelve el subconjunto de claves que ya están registradas.
+        """
+        self.conexion.execute("DELETE FROM consulta")
+        self.conexion.executemany("INSERT OR IGNORE INTO consulta (clave) VALUES (?)", ((clave,) for clave in claves))
+        filas = self.conexion.execute("SELECT c.clave FROM consulta c JOIN transacciones t ON t.clave = c.clave")
+        return {clave for clave, in filas}
+
+    def agregar_claves(self, claves, hash_contenido):
+        """
+        Agrega claves de transacciones a la transacción sqlite en curso (sin confirmar).
+        """
+        self.conexion.executemany("INSERT OR IGNORE INTO transacciones (clave, archivo_hash) VALUES (?, ?)",
+                                  ((clave, hash_contenido) for clave in claves))
+
+    def registrar_archivo(self, hash_contenido, nombre):
+        """
+        Registra el archivo y confirma, en una única transacción, todas las claves agregadas hasta ahora.
+        """
+        self.conexion.execute("INSERT OR IGNORE INTO archivos (hash, nombre, fecha_ingesta) VALUES (?, ?, ?)",
+                              (hash_contenido, nombre, datetime.now().isoformat(timespec='seconds')))
+        self.conexion.commit()
+
+    def filtro_transacciones(self, hash_contenido):
+        """
+        Devuelve un FiltroTransacciones que descarta las filas ya ingeridas de un archivo.
+        """
+        return FiltroTransacciones(self, hash_contenido)
+
+
+class FiltroTransacciones:
+    """
+    Filtro con estado para los bloques de un mismo archivo: calcula las claves de cada bloque, descarta las
+    filas ya registradas y agrega las nuevas a la transacción en curso del registro. Sin registro no filtra
+    nada y solo acumula las claves en self.claves.
+    """
+
+    def __init__(self, registro=None, hash_contenido=None):
+        self.registro = registro
+        self.hash_contenido = hash_contenido
+        self.claves = []
+        self.ocurrencias = {}
+        self.ultima_fecha = None
+
+    def __call__(self, bloque):
+        if bloque.empty:
+            return bloque
+        claves, base = claves_transacciones(bloque, self.ocurrencias)
+        self._actualizar_ocurrencias(bloque, base)
+
+        if self.registro is None:
+            self.claves.extend(claves)
+            return bloque
+
+        existentes = self.registro.claves_existentes(claves)
+        nuevas = ~claves.isin(existentes).to_numpy()
+        self.registro.agregar_claves(claves[nuevas], self.hash_contenido)
+        return bloque[nuevas]
+
+    def _actualizar_ocurrencias(self, bloque, base):
+        """
+        Recuerda cuántas veces apareció cada clave base con la última fecha del bloque, por si el bloque
+        siguiente continúa con ejecuciones idénticas del mismo instante.
+        """
+        ultima_fecha = bloque['Date'].iloc[-1]
+        conteo = base[(bloque['Date'] == ultima_fecha).to_numpy()].value_counts()
+        ocurrencias = dict(self.ocurrencias) if ultima_fecha == self.ultima_fecha else {}
+        for clave, cantidad in conteo.items():
+            ocurrencias[clave] = ocurrencias.get(clave, 0) + cantidad
+        self.ocurrencias = ocurrencias
+        self.ultima_fecha = ultima_fecha
@@ -0,0 +1,190 @@
+import argparse
+import math
+import os
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from archivos_yaml import LoteYAML
+from cuentas import iterar_posiciones
+from log_diario import agregar_entradas_diarias, ruta_diario
+from modelo import registros_patas
+from utils import MULTIPLICADORES, MULTIPLICADOR_ACCIONES
+
+# Snapshot local de cotizaciones de opciones: una fila por contrato con subyacente (el subyacente base de las
+# posiciones: SPY, /ES, ...), vencimiento (YYYY-MM-DD), tipo (PUT/CALL), strike y mark, o bid y ask si no hay mark
+ARCHIVO_COTIZACIONES = "data/mercado/cotizaciones.csv"
+
+# Columnas por las que se cruza cada pata con su cotización
+CLAVE_CONTRATO = ['subyacente', 'tipo', 'strike', 'vencimiento']
+
+
+def cargar_cotizaciones(ruta=ARCHIVO_COTIZACIONES):
+    """
+    Lee el snapshot de cotizaciones.
+
+    Returns:
+        pandas.DataFrame: Columnas de CLAVE_CONTRATO y mark (precio por unidad del subyacente, sin
+        multiplicador), un contrato por fila. Sin mark, se usa el punto medio entre bid y ask.
+    """
+    cotizaciones = pd.read_csv(ruta, dtype={'subyacente': 'string', 'tipo': 'string'})
+    if 'mark' not in cotizaciones:
+        cotizaciones['mark'] = np.nan
+    if {'bid', 'ask'} <= set(cotizaciones.columns):
+        cotizaciones['mark'] = cotizaciones['mark'].fillna((cotizaciones['bid'] + cotizaciones['ask']) / 2)
+    cotizaciones['tipo'] = cotizaciones['tipo'].str.upper()
+    cotizaciones['strike'] = cotizaciones['strike'].astype('float64').round(4)
+    cotizaciones['vencimiento'] = pd.to_datetime(cotizaciones['vencimiento']).values.astype('datetime64[D]')
+    return cotizaciones.drop_duplicates(CLAVE_CONTRATO, keep='last')[CLAVE_CONTRATO + ['mark']]
+
+
+def revaluar_posiciones(posiciones, cotizaciones, fecha=None):
+    """
+    Revalúa a mercado todas las posiciones de una vez: las patas abiertas de todas ellas se cruzan con las
+    cotizaciones en un único merge y los totales por posición se suman con bincount.
+
+    Para cada posición, valor_mercado es lo que se cobraría (o pagaría, si es negativo) al cerrar hoy sus patas
+    abiertas, cantidad * mark * multiplicador; ganancia_no_realizada es el flujo de caja hasta ahora
+    (credito_debito_actual) más ese valor; mark_precio_spread es el precio del spread por unidad (la suma de
+    cantidad * mark dividida por la menor cantidad absoluta entre sus patas), y dte_cercano son los días desde
+    fecha hasta el vencimiento más cercano.
+
+    Args:
+        posiciones (list): Posiciones (Posicion o diccionarios con el esquema del YAML).
+        cotizaciones (pandas.DataFrame): Resultado de cargar_cotizaciones.
+        fecha (date): Fecha de referencia para el DTE (por defecto, hoy).
+
+    Returns:
+        tuple: (DataFrame con una fila por posición: valor_mercado, ganancia_no_realizada, mark_precio_spread,
+        dte_cercano y patas_sin_cotizacion, con NaN si a la posición le falta alguna cotización o no tiene
+        patas abiertas; DataFrame de las patas abiertas con posicion, indice (dentro de la posición), mark y
+        precio_actual, este último con la convención de precio_apertura: por contrato y positivo si se compró)
+    """
+    fecha = np.datetime64(fecha or date.today(), 'D')
+    cantidad_posiciones = len(posiciones)
+    resultado = pd.DataFrame(np.nan, index=range(cantidad_posiciones),
+                             columns=['valor_mercado', 'ganancia_no_realizada', 'mark_precio_spread', 'dte_cercano',
+                                      'patas_sin_cotizacion'])
+
+    registros = registros_patas(posiciones)
+    patas = pd.DataFrame({campo: registros[campo] for campo in ('posicion', 'tipo', 'strike', 'vencimiento',
+                                                                'cantidad', 'fecha_cierre')})
+    patas['indice'] = patas.groupby('posicion').cumcount()
+    patas = patas[patas['fecha_cierre'].isna() & patas['vencimiento'].notna() & (patas['cantidad'] != 0)]
+    subyacentes = np.array([str(posicion['subyacente']) for posicion in posiciones], dtype=object)
+    patas = patas.assign(subyacente=subyacentes[patas['posicion'].to_numpy()] if len(patas) else [],
+                         strike=patas['strike'].round(4))
+    patas = patas.merge(cotizaciones, on=CLAVE_CONTRATO, how='left', validate='many_to_one')
+    if patas.empty:
+        return resultado, patas.assign(precio_actual=[])[['posicion', 'indice', 'mark', 'precio_actual']]
+
+    posicion = patas['posicion'].to_numpy()
+    cantidad = patas['cantidad'].to_numpy()
+    mark = patas['mark'].to_numpy(dtype='float64')
+    multiplicador = patas['subyacente'].map(MULTIPLICADORES).fillna(MULTIPLICADOR_ACCIONES).to_numpy(dtype='float64')
+    patas['precio_actual'] = np.sign(cantidad) * mark * multiplicador
+
+    sin_cotizacion = np.bincount(posicion, np.isnan(mark), cantidad_posiciones)
+    con_patas = np.bincount(posicion, minlength=cantidad_posiciones) > 0
+    valuables = con_patas & (sin_cotizacion == 0)
+    mark = np.nan_to_num(mark)
+    valor_mercado = np.bincount(posicion, cantidad * mark * multiplicador, cantidad_posiciones)
+    unidades = np.full(cantidad_posiciones, np.inf)
+    np.minimum.at(unidades, posicion, np.abs(cantidad))
+    vencimiento_cercano = np.full(cantidad_posiciones, np.datetime64('9999-12-31', 'D'))
+    np.minimum.at(vencimiento_cercano, posicion, patas['vencimiento'].to_numpy().astype('datetime64[D]'))
+
+    flujo = np.array([posicion_data.get('credito_debito_actual') or 0.0 for posicion_data in posiciones])
+    resultado['valor_mercado'] = np.where(valuables, valor_mercado, np.nan)
+    resultado['ganancia_no_realizada'] = resultado['valor_mercado'] + flujo
+    resultado['mark_precio_spread'] = np.where(
+        valuables, np.bincount(posicion, cantidad * mark, cantidad_posiciones) / unidades, np.nan)
+    resultado['dte_cercano'] = np.where(con_patas, (vencimiento_cercano - fecha).astype('float64'), np.nan)
+    resultado['patas_sin_cotizacion'] = np.where(con_patas, sin_cotizacion, np.nan)
+    return resultado, patas[['posicion', 'indice', 'mark', 'precio_actual']]
+
+
+def revaluar_carpeta(carpeta_posiciones="data/yaml/posiciones_activas/", cotizaciones=None, fecha=None,
+                     actualizar_patas=False):
+    """
+    Revalúa todas las posiciones activas de una carpeta (y de sus particiones por cuenta, ver
+    cuentas.iterar_posiciones) y registra el resultado en su log_diario.
+
+    Cada posición con todas sus patas abiertas cotizadas recibe una entrada para la fecha (credito_debito,
+    mark_precio_spread, valor_mercado, ganancia_no_realizada y dte_cercano, conservando los demás datos que ya
+    tuviera ese día, como las griegas), que se agrega a su diario sin reescribir el YAML. Con
+    actualizar_patas=True se actualiza además el precio_actual de cada pata, y entonces los YAML se reescriben
+    en un lote con la entrada ya incluida.
+
+    Args:
+        carpeta_posiciones (str): Carpeta de las posiciones activas.
+        cotizaciones: Ruta del snapshot de cotizaciones o DataFrame de cargar_cotizaciones.
+        fecha (date): Fecha de referencia (por defecto, hoy).
+        actualizar_patas (bool): Si es True, guarda el precio_actual de las patas en los YAML.
+
+    Returns:
+        pandas.DataFrame: La revaluación por posición, indexada por nombre de archivo (relativo a la carpeta).
+    """
+    if cotizaciones is None or isinstance(cotizaciones, str):
+        cotizaciones = cargar_cotizaciones(cotizaciones or ARCHIVO_COTIZACIONES)
+    fecha = fecha or date.today()
+    fecha_texto = fecha.strftime('%Y%m%d')
+
+    posiciones = list(iterar_posiciones(carpeta_posiciones))
+    resultado, patas = revaluar_posiciones([posicion_data for _, posicion_data in posiciones], cotizaciones, fecha)
+    resultado.index = [nombre_archivo for nombre_archivo, _ in posiciones]
+    precios = dict(zip(zip(patas['posicion'].tolist(), patas['indice'].tolist()), patas['precio_actual'].tolist()))
+
+    lote = LoteYAML()
+    entradas = []
+    for numero, ((nombre_archivo, posicion_data), fila) in enumerate(zip(posiciones,
+                                                                         resultado.itertuples(index=False))):
+        if math.isnan(fila.valor_mercado):
+            continue
+        ruta = os.path.join(carpeta_posiciones, nombre_archivo)
+        log_diario = posicion_data.get('log_diario') or {}
+        entrada = {
+            **(log_diario.get(fecha_texto) or {}),
+            'credito_debito': posicion_data.get('credito_debito_actual'),
+            'mark_precio_spread': round(float(fila.mark_precio_spread), 4),
+            'valor_mercado': round(float(fila.valor_mercado), 2),
+            'ganancia_no_realizada': round(float(fila.ganancia_no_realizada), 2),
+            'dte_cercano': int(fila.dte_cercano),
+        }
+        if actualizar_patas:
+            for indice, pata in enumerate(posicion_data.get('patas') or []):
+                if (numero, indice) in precios:
+                    pata['precio_actual'] = round(precios[numero, indice], 2)
+            posicion_data['log_diario'] = {**log_diario, fecha_texto: entrada}
+            lote.agregar(ruta, posicion_data)
+        else:
+            entradas.append((ruta, fecha_texto, entrada))
+
+    # Los YAML reescritos ya incluyen las entradas de sus diarios (cargar_posicion las aplicó)
+    for ruta in lote.confirmar():
+        try:
+            os.remove(ruta_diario(ruta))
+        except FileNotFoundError:
+            pass
+    agregar_entradas_diarias(entradas)
+
+    revaluadas = int(resultado['valor_mercado'].notna().sum())
+    sin_cotizacion = int((resultado['patas_sin_cotizacion'] > 0).sum())
+    print(f"Posiciones revaluadas al {fecha_texto}: {revaluadas} de {len(posiciones)} ({sin_cotizacion} con "
+          f"patas sin cotización; {len(patas)} patas abiertas)")
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Revalúa a mercado las posiciones activas con un snapshot de "
+                                                 "cotizaciones.")
+    parser.add_argument('--carpeta', default="data/yaml/posiciones_activas/", help="Carpeta de posiciones activas")
+    parser.add_argument('--cotizaciones', default=ARCHIVO_COTIZACIONES,
+                        help="CSV de cotizaciones: subyacente,vencimiento,tipo,strike,mark (o bid,ask)")
+    parser.add_argument('--fecha', default=None, help="Fecha de referencia YYYYMMDD (por defecto, hoy)")
+    parser.add_argument('--actualizar-patas', action='store_true', help="Guardar el precio_actual de las patas")
+    argumentos = parser.parse_args()
+
+    fecha = datetime.strptime(argumentos.fecha, '%Y%m%d').date() if argumentos.fecha else None
+    revaluar_carpeta(argumentos.carpeta, argumentos.cotizaciones, fecha, argumentos.actualizar_patas)
@@ -1,72 +1,155 @@
+import re
 from datetime import datetime
+from functools import lru_cache
+
+from modelo import Pata
+
+# pandas se importa solo en parse_symbols (la versión vectorizada): el resto del módulo no lo necesita y así
+# importar utils no cuesta el medio segundo de pandas
+
+# Símbolos de tastytrade:
+#   - opciones sobre acciones/ETFs (formato OCC): "SPY   241220P00580000" (strike * 1000 en 8 dígitos)
+#   - opciones sobre futuros: "./ESZ4 EW3X4 241122P5800" (strike tal cual)
+PATRON_SIMBOLO = re.compile(r'^(?P<raiz>\./\S+|\S+?)\s*(?:\s(?P<opcion_futuro>\S+)\s+)?'
+                            r'(?P<vencimiento>\d{6})(?P<tipo>[CP])(?P<strike>\d+(?:\.\d+)?)$')
+CAMPOS_SIMBOLO = ('subyacente', 'vencimiento', 'tipo', 'strike')
+
+# Multiplicador de los contratos por subyacente; las opciones sobre acciones y ETFs usan 100
+MULTIPLICADORES = {'/ES': 50, '/MES': 5, '/NQ': 20, '/MNQ': 2, '/RTY': 50, '/M2K': 5, '/YM': 5, '/MYM': 0.5,
+                   '/CL': 1000, '/MCL': 100, '/GC': 100, '/MGC': 10, '/SI': 5000, '/ZB': 1000, '/ZN': 1000}
+MULTIPLICADOR_ACCIONES = 100
+
 
 def parse_symbol_improved(symbol):
     """
     Parsea el symbol de Tastytrade para extraer detalles, incluyendo opciones sobre futuros.
     Devuelve None si no se puede parsear.
+
+    Los resultados se memorizan (LRU acotado) porque los mismos símbolos se repiten en muchas filas.
+    """
+    detalles = _parse_symbol_cacheado(symbol)
+    return dict(zip(CAMPOS_SIMBOLO, detalles)) if detalles else None
+
+
+@lru_cache(maxsize=16384)
+def _parse_symbol_cacheado(symbol):
     """
+    Parsea un símbolo y devuelve la tupla (subyacente, vencimiento, tipo, strike), o None.
+    """
+    if not isinstance(symbol, str):
+        return None
+    coincidencia = PATRON_SIMBOLO.match(symbol.strip())
+    if not coincidencia:
+        return None
     try:
-        parts = symbol.split()
-        if len(parts) > 1:
-            subyacente = parts[0].split('/')[1] if '/' in parts[0] else parts[0]
-            vencimiento_str = parts[1][:6] if len(parts[1]) >= 6 else None
-            vencimiento = datetime.strptime(vencimiento_str, '%y%m%d').strftime('%Y-%m-%d') if vencimiento_str else None
-            tipo = "PUT" if "P" in symbol else "CALL" if "C" in symbol else None
-            strike_str = ''.join(filter(str.isdigit, parts[-1])) if parts else None
-            strike = float(strike_str) / 100.0 if strike_str else None
-            return {'subyacente': subyacente.strip(), 'vencimiento': vencimiento, 'tipo': tipo, 'strike': strike}
-        else:
-            return None
-    except (ValueError, IndexError, TypeError) as e:
+        vencimiento = datetime.strptime(coincidencia['vencimiento'], '%y%m%d').strftime('%Y-%m-%d')
+    except ValueError as e:
         print(f"Error al parsear el símbolo '{symbol}': {e}")
         return None
+    subyacente = coincidencia['raiz'].split('/')[-1]
+    tipo = "PUT" if coincidencia['tipo'] == 'P' else "CALL"
+    strike = float(coincidencia['strike'])
+    if _es_strike_occ(coincidencia['opcion_futuro'], coincidencia['strike']):
+        strike /= 1000.0
+    return subyacente, vencimiento, tipo, strike
+
+
+def _es_strike_occ(opcion_futuro, strike_str):
+    """
+    Indica si el strike está codificado en formato OCC (8 dígitos con 3 decimales implícitos).
+    """
+    return opcion_futuro is None and len(strike_str) == 8 and strike_str.isdigit()
+
+
+def parse_symbols(simbolos):
+    """
+    Versión vectorizada de parse_symbol_improved para una columna completa de símbolos.
+
+    Args:
+        simbolos (pd.Series): Serie de símbolos de Tastytrade.
+
+    Returns:
+        pd.DataFrame: Con el mismo índice que simbolos y las columnas 'subyacente', 'vencimiento' (YYYY-MM-DD),
+                      'tipo' ('PUT'/'CALL') y 'strike'. Las filas que no se pueden parsear quedan en NaN.
+    """
+    import pandas as pd
+
+    partes = simbolos.astype('string').str.strip().str.extract(PATRON_SIMBOLO)
+    vencimiento = pd.to_datetime(partes['vencimiento'], format='%y%m%d', errors='coerce')
+    valido = vencimiento.notna()
+
+    strike = partes['strike'].astype('float64')
+    es_occ = partes['opcion_futuro'].isna() & partes['strike'].str.fullmatch(r'\d{8}').fillna(False)
+    strike = strike.where(~es_occ, strike / 1000.0)
+
+    resultado = pd.DataFrame({
+        'subyacente': partes['raiz'].str.split('/').str[-1],
+        'vencimiento': vencimiento.dt.strftime('%Y-%m-%d'),
+        'tipo': partes['tipo'].map({'P': 'PUT', 'C': 'CALL'}),
+        'strike': strike,
+    }, index=simbolos.index)
+    return resultado.where(valido)
+
 
 def calcular_dte_pata(vencimiento):
     hoy = datetime.now().date()
     return (vencimiento - hoy).days if vencimiento else None
 
+
+def construir_pata(pata_data):
+    """
+    Arma la pata (Pata) de una posición a partir de una fila de actividad.
+    Devuelve None si el símbolo no se puede parsear.
+    """
+    pata_opcion_details = parse_symbol_improved(pata_data['Symbol'])
+    if not pata_opcion_details:
+        return None
+    vencimiento_date = datetime.strptime(pata_data['Expiration Date'], '%m/%d/%y').date() if pata_data.get('Expiration Date') else None  # Usar Expiration Date
+    cantidad = -pata_data['Quantity'] if 'SELL' in str(pata_data['Action']).upper() else pata_data['Quantity']
+    return Pata(
+        tipo=pata_opcion_details['tipo'],
+        strike=pata_data['Strike Price'],
+        vencimiento=vencimiento_date,
+        cantidad=cantidad,
+        precio_apertura=pata_data['Average Price'],
+        precio_actual=pata_data['Average Price'],
+        fecha_cierre=None,
+        precio_cierre=None,
+        accion=str(pata_data['Action']).upper()  # Guardar la acción en mayúsculas
+    )
+
+
 def es_1_1_2(patas):
     """
     Identifica la estrategia 1-1-2.
 
     Args:
-        patas (list): Una lista de diccionarios, donde cada diccionario representa una pata de la operación.
+        patas (list): Las patas de la operación (Pata o diccionarios con los mismos campos).
 
     Returns:
         bool: True si las patas corresponden a una estrategia 1-1-2, False en caso contrario.
     """
-    print("DEBUG: es_1_1_2 - Inicio")
     if len(patas) != 3 or not all(pata['tipo'] == 'PUT' for pata in patas):
-        print("DEBUG: No es 1-1-2 (Número de patas o tipos incorrectos)")
         return False
 
     cantidades = [pata['cantidad'] for pata in patas]
-    print(f"DEBUG: Cantidades: {cantidades}")
     if sum(cantidades) != -2:
-        print("DEBUG: No es 1-1-2 (Cantidades incorrectas)")
         return False
 
     vencimientos = [pata['vencimiento'] for pata in patas]
-    print(f"DEBUG: Vencimientos: {vencimientos}")
     if len(set(vencimientos)) != 1:  # Corrección: Verificar que haya solo 1 vencimiento
-        print("DEBUG: No es 1-1-2 (Vencimientos incorrectos)")
         return False
 
     strikes = [pata['strike'] for pata in patas]
-    print(f"DEBUG: Strikes: {strikes}")
     if len(set(strikes)) != 3:  # Corrección: Verificar que haya 3 strikes diferentes
-        print("DEBUG: No es 1-1-2 (Número de strikes incorrecto)")
         return False
 
     # Ordenar las patas por strike
     patas_ordenadas = sorted(patas, key=lambda pata: pata['strike'])
-    print(f"DEBUG: Patas Ordenadas: {patas_ordenadas}")
 
     if patas_ordenadas[0]['strike'] < patas_ordenadas[1]['strike'] and patas_ordenadas[1]['strike'] < patas_ordenadas[2]['strike']:  # Corrección: Verificar la secuencia creciente de strikes
-        print("DEBUG: Es 1-1-2")
         return True
     else:
-        print("DEBUG: No es 1-1-2 (Condición final incorrecta)")
         return False
 
     return False
@@ -76,42 +159,32 @@ def es_calendar_1_1_2(patas):
     Identifica la estrategia Calendar 1-1-2.
 
     Args:
-        patas (list): Una lista de diccionarios, donde cada diccionario representa una pata de la operación.
+        patas (list): Las patas de la operación (Pata o diccionarios con los mismos campos).
 
     Returns:
         bool: True si las patas corresponden a una estrategia Calendar 1-1-2, False en caso contrario.
     """
-    print("DEBUG: es_calendar_1_1_2 - Inicio")
     if len(patas) != 3 or not all(pata['tipo'] == 'PUT' for pata in patas):
-        print("DEBUG: No es Calendar 1-1-2 (Número de patas o tipos incorrectos)")
         return False
 
     cantidades = [pata['cantidad'] for pata in patas]
-    print(f"DEBUG: Cantidades: {cantidades}")
     if sum(cantidades) != -2:  # Corrección: Verificar que la suma sea -2
-        print("DEBUG: No es Calendar 1-1-2 (Cantidades incorrectas)")
         return False
 
     vencimientos = [pata['vencimiento'] for pata in patas]
-    print(f"DEBUG: Vencimientos: {vencimientos}")
     if len(vencimientos) != 3 or len(set(vencimientos)) != 2:
-        print("DEBUG: No es Calendar 1-1-2 (Vencimientos incorrectos)")
         return False
 
     # Ordenar las patas por fecha de vencimiento
     patas_ordenadas = sorted(patas, key=lambda pata: pata['vencimiento'])
-    print(f"DEBUG: Patas Ordenadas: {patas_ordenadas}")
 
     # Verificar que haya 2 ventas y 1 compra
     if cantidades.count(-2) != 0 and cantidades.count(-1) != 2 and cantidades.count(1) != 1:
-        print("DEBUG: No es Calendar 1-1-2 (Cantidad de ventas o compras incorrecta)")
         return False
 
     if patas_ordenadas[0]['strike'] < patas_ordenadas[2]['strike']:
-        print("DEBUG: Es Calendar 1-1-2")
         return True
     else:
-        print("DEBUG: No es Calendar 1-1-2 (Strikes incorrectos)")
         return False
 
 def es_iron_condor(patas):
@@ -119,7 +192,7 @@ def es_iron_condor(patas):
     Identifica la estrategia Iron Condor.
 
     Args:
-        patas (list): Una lista de diccionarios, donde cada diccionario representa una pata de la operación.
+        patas (list): Las patas de la operación (Pata o diccionarios con los mismos campos).
 
     Returns:
         bool: True si las patas corresponden a una estrategia Iron Condor, False en caso contrario.
@@ -157,7 +230,7 @@ def es_strangle(patas):
     Identifica la estrategia Strangle.
 
     Args:
-        patas (list): Una lista de diccionarios, donde cada diccionario representa una pata de la operación.
+        patas (list): Las patas de la operación (Pata o diccionarios con los mismos campos).
 
     Returns:
         bool: True si las patas corresponden a una estrategia Strangle, False en caso contrario.
@@ -188,7 +261,7 @@ def identificar_spread(patas, total):
     Identifica si las patas corresponden a una estrategia Spread (Vertical).
 
     Args:
-        patas (list): Una lista de diccionarios, donde cada diccionario representa una pata de la operación.
+        patas (list): Las patas de la operación (Pata o diccionarios con los mismos campos).
         total (float): El Total (crédito o débito) de la operación.
 
     Returns:
@@ -225,7 +298,7 @@ def es_broken_wing_condor(patas):
     Identifica la estrategia Broken Wing Condor (con PUTs).
 
     Args:
-        patas (list): Una lista de diccionarios, donde cada diccionario representa una pata de la operación.
+        patas (list): Las patas de la operación (Pata o diccionarios con los mismos campos).
 
     Returns:
         bool: True si las patas corresponden a una estrategia Broken Wing Condor, False en caso contrario.
@@ -264,7 +337,7 @@ def es_butterfly(patas):
     Identifica la estrategia Butterfly (adaptada para 3 patas).
 
     Args:
-        patas (list): Una lista de diccionarios, donde cada diccionario representa una pata de la operación.
+        patas (list): Las patas de la operación (Pata o diccionarios con los mismos campos).
 
     Returns:
         bool: True si las patas corresponden a una estrategia Butterfly, False en caso contrario.
@@ -297,40 +370,32 @@ def es_broken_wing_butterfly(patas):
     Identifica la estrategia Broken Wing Butterfly (adaptada para 3 patas).
 
     Args:
-        patas (list): Una lista de diccionarios, donde cada diccionario representa una pata de la operación.
+        patas (list): Las patas de la operación (Pata o diccionarios con los mismos campos).
 
     Returns:
         bool: True si las patas corresponden a una estrategia Broken Wing Butterfly, False en caso contrario.
     """
-    print("DEBUG: es_broken_wing_butterfly - Inicio")
     if len(patas) != 3 or not all(pata['tipo'] == patas[0]['tipo'] for pata in patas): #Corrección: Puede ser CALL o PUT
-        print("DEBUG: No es Broken Wing Butterfly (Número de patas o tipos incorrectos)")
         return False
 
     vencimientos = [pata['vencimiento'] for pata in patas]
     if len(set(vencimientos)) != 1:
-        print("DEBUG: No es Broken Wing Butterfly (Vencimientos incorrectos)")
         return False
 
     cantidades = [pata['cantidad'] for pata in patas]
     if sum(cantidades) != 0 or cantidades.count(1) != 2 or cantidades.count(-2) != 1: #Corrección: Cantidades
-        print("DEBUG: No es Broken Wing Butterfly (Cantidades incorrectas)")
         return False
 
     strikes = [pata['strike'] for pata in patas]
     if len(set(strikes)) != 3:
-        print("DEBUG: No es Broken Wing Butterfly (Número de strikes incorrecto)")
         return False
 
     # Ordenar las patas por strike
     patas_ordenadas = sorted(patas, key=lambda pata: pata['strike'])
-    print(f"DEBUG: Patas Ordenadas: {patas_ordenadas}")
 
     if patas_ordenadas[1]['strike'] - patas_ordenadas[0]['strike'] != patas_ordenadas[2]['strike'] - patas_ordenadas[1]['strike']:
-        print("DEBUG: Es Broken Wing Butterfly (Strikes no equidistantes)")
         return True
     else:
-        print("DEBUG: No es Broken Wing Butterfly (Strikes equidistantes)")
         return False
 
 def es_ratio_spread(patas):
@@ -338,7 +403,7 @@ def es_ratio_spread(patas):
     Identifica la estrategia Ratio Spread.
 
     Args:
-        patas (list): Una lista de diccionarios, donde cada diccionario representa una pata de la operación.
+        patas (list): Las patas de la operación (Pata o diccionarios con los mismos campos).
 
     Returns:
         bool: True si las patas corresponden a una estrategia Ratio Spread, False en caso contrario.
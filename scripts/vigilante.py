@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import glob
+import os
+import signal
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from ciclo_vida import CicloVida
+from decisiones_calendar import DecisionesCalendar, MODOS_CALENDAR
+from procesar_actividad import procesar_archivos_actividad
+
+
+class Vigilante:
+    """
+    Vigila la carpeta de exports de actividad e ingiere cada CSV nuevo en cuanto termina de escribirse.
+
+    La carpeta se revisa por polling cada intervalo segundos. Un archivo se considera completo cuando su tamaño
+    y fecha de modificación no cambiaron durante espera segundos (debounce para los exports que todavía se
+    están copiando). La ingesta corre en un hilo aparte, fuera del event loop, y siempre en el mismo proceso,
+    así que entre un archivo y otro quedan cargados pandas, el cache de símbolos parseados y el índice de
+    posiciones abiertas del CicloVida (que se refresca antes de cada ingesta por si otro proceso cambió las
+    posiciones).
+
+    Las opciones de ingesta (carpetas, almacen, chunksize, etc.) se pasan tal cual a procesar_archivos_actividad.
+    Los candidatos a Calendar 1-1-2 no se pueden preguntar por consola: por defecto van a la cola de revisión.
+    """
+
+    def __init__(self, carpeta_csv="data/csv/actividad/", intervalo=1.0, espera=2.0, decisiones_calendar=None,
+                 carpeta_posiciones="data/yaml/posiciones_activas/",
+                 carpeta_cerradas="data/yaml/posiciones_cerradas/", **opciones_ingesta):
+        if decisiones_calendar is None:
+            decisiones_calendar = DecisionesCalendar('revisar')
+        elif decisiones_calendar.modo == 'interactivo':
+            raise ValueError("El vigilante no puede usar el modo interactivo de Calendars")
+        self.carpeta_csv = carpeta_csv
+        self.intervalo = intervalo
+        self.espera = espera
+        self.opciones_ingesta = dict(opciones_ingesta, decisiones_calendar=decisiones_calendar,
+                                     carpeta_posiciones=carpeta_posiciones, carpeta_cerradas=carpeta_cerradas)
+        os.makedirs(carpeta_posiciones, exist_ok=True)
+        self.ciclo_vida = CicloVida(carpeta_posiciones, carpeta_cerradas) if carpeta_cerradas else None
+        # ruta -> (tamaño, mtime) del último cambio visto y momento (time.monotonic) en que se vio
+        self.estados = {}
+        # ruta -> (tamaño, mtime) de los CSV que fallaron o no se movieron: se reintentan solo si cambian
+        self.fallidos = {}
+        self.ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingesta')
+        self.ingeridos = 0
+
+    def revisar(self, ahora=None):
+        """
+        Revisa la carpeta una vez y devuelve los CSV completos (sin cambios durante espera segundos).
+        """
+        ahora = time.monotonic() if ahora is None else ahora
+        listos = []
+        vistos = set()
+        for ruta in glob.glob(os.path.join(self.carpeta_csv, '*.csv')):
+            try:
+                estado = os.stat(ruta)
+            except FileNotFoundError:
+                continue
+            firma = (estado.st_size, estado.st_mtime_ns)
+            vistos.add(ruta)
+            anterior = self.estados.get(ruta)
+            if anterior is None or anterior[0] != firma:
+                self.estados[ruta] = (firma, ahora)
+            elif estado.st_size and ahora - anterior[1] >= self.espera and self.fallidos.get(ruta) != firma:
+                listos.append(ruta)
+        for ruta in set(self.estados) - vistos:
+            del self.estados[ruta]
+        return sorted(listos)
+
+    def ingerir(self, rutas):
+        """
+        Ingiere los CSV indicados con procesar_archivos_actividad, reutilizando el índice del ciclo de vida.
+        Corre en el hilo de ingesta.
+        """
+        if self.ciclo_vida is not None:
+            self.ciclo_vida.refrescar()
+        firmas = {ruta: self.estados[ruta][0] for ruta in rutas if ruta in self.estados}
+        try:
+            metricas = procesar_archivos_actividad(self.carpeta_csv, archivos=rutas, ciclo_vida=self.ciclo_vida,
+                                                   **self.opciones_ingesta)
+        except Exception:
+            traceback.print_exc()
+            self.fallidos.update(firmas)
+            print(f"Error al ingerir {', '.join(os.path.basename(ruta) for ruta in rutas)}; se reintentará si "
+                  f"el archivo cambia")
+            return None
+        self.ingeridos += metricas.contadores.get('archivos_procesados', 0)
+        # Un archivo que no se movió (ya registrado por nombre) no debe volver a ingerirse en cada revisión
+        for ruta in rutas:
+            if os.path.exists(ruta):
+                self.fallidos[ruta] = firmas.get(ruta)
+        return metricas
+
+    async def vigilar(self, detener=None):
+        """
+        Revisa la carpeta hasta que se active el evento detener (o para siempre) e ingiere los archivos listos.
+        Mientras se ingiere un lote, la revisión sigue y los archivos nuevos esperan al lote siguiente.
+        """
+        if detener is None:
+            detener = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        ingesta = None
+        print(f"Vigilando {self.carpeta_csv} (cada {self.intervalo:g} s, espera {self.espera:g} s)")
+        try:
+            while not detener.is_set():
+                if ingesta is not None and ingesta.done():
+                    ingesta = None
+                if ingesta is None:
+                    listos = self.revisar()
+                    if listos:
+                        ingesta = loop.run_in_executor(self.ejecutor, self.ingerir, listos)
+                else:
+                    self.revisar()
+                try:
+                    await asyncio.wait_for(detener.wait(), self.intervalo)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if ingesta is not None:
+                await ingesta
+            self.ejecutor.shutdown(wait=True)
+            print(f"Vigilante detenido ({self.ingeridos} archivos ingeridos)")
+
+
+async def ejecutar(vigilante):
+    """
+    Corre el vigilante hasta recibir SIGINT o SIGTERM, terminando antes la ingesta en curso.
+    """
+    detener = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for senal in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(senal, detener.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: Ctrl+C llega como KeyboardInterrupt
+    await vigilante.vigilar(detener)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingiere automáticamente los CSV de actividad nuevos.")
+    parser.add_argument('--carpeta', default="data/csv/actividad/", help="Carpeta de exports de actividad")
+    parser.add_argument('--procesados', default="data/csv/actividad/procesados/", help="Carpeta de CSV procesados")
+    parser.add_argument('--posiciones', default="data/yaml/posiciones_activas/", help="Carpeta de posiciones activas")
+    parser.add_argument('--cerradas', default="data/yaml/posiciones_cerradas/", help="Carpeta de posiciones cerradas")
+    parser.add_argument('--intervalo', type=float, default=1.0, help="Segundos entre revisiones de la carpeta")
+    parser.add_argument('--espera', type=float, default=2.0, help="Segundos sin cambios para dar un CSV por completo")
+    parser.add_argument('--chunksize', type=int, default=None, help="Filas por bloque al leer cada CSV")
+    parser.add_argument('--calendars', choices=[modo for modo in MODOS_CALENDAR if modo != 'interactivo'],
+                        default='revisar', help="Qué hacer con los candidatos a Calendar 1-1-2")
+    argumentos = parser.parse_args()
+
+    asyncio.run(ejecutar(Vigilante(argumentos.carpeta, argumentos.intervalo, argumentos.espera,
+                                    DecisionesCalendar(argumentos.calendars), argumentos.posiciones,
+                                    argumentos.cerradas, carpeta_procesados=argumentos.procesados,
+                                    chunksize=argumentos.chunksize)))
@@ -0,0 +1,52 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+from generar_actividad import COLUMNAS_ACTIVIDAD, SUBYACENTES, _filas_trade  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def carpeta_trabajo(tmp_path, monkeypatch):
+    """
+    Cada test corre en su propia carpeta, así las rutas por defecto (data/...) no se comparten.
+    """
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def filas_orden(orden, fecha, patas, al_abrir=True, root='QQQ'):
+    """
+    Filas del CSV de actividad de una orden, con el formato de generar_actividad.
+
+    Args:
+        orden (int): Número de orden (el Order # es 300000000 + orden).
+        fecha (str): Fecha y hora de ejecución, 'YYYY-MM-DD HH:MM:SS'.
+        patas (list): Tuplas (tipo, strike, vencimiento 'YYYY-MM-DD', cantidad con signo, precio).
+        al_abrir (bool): Órdenes de apertura (XXX_TO_OPEN) o de cierre (XXX_TO_CLOSE).
+        root (str): Subyacente, uno de generar_actividad.SUBYACENTES.
+    """
+    n = len(patas)
+    tipo, strike, vencimiento, cantidad, precio = (np.array(valores) for valores in zip(*patas))
+    return _filas_trade(np.full(n, orden), np.full(n, [s[0] for s in SUBYACENTES].index(root)),
+                        pd.DatetimeIndex([fecha] * n), tipo, strike.astype('float64'),
+                        vencimiento.astype('datetime64[ns]'), cantidad.astype('int64'), precio.astype('float64'),
+                        al_abrir)
+
+
+def escribir_actividad(ruta, ordenes):
+    """
+    Escribe un CSV de actividad con las filas de varias órdenes (ver filas_orden), de la más nueva a la más
+    vieja como los exports de tastytrade.
+    """
+    df = pd.concat(ordenes, ignore_index=True)
+    df = df.sort_values('Date', ascending=False, kind='mergesort').reset_index(drop=True)
+    df['Date'] = np.char.add(np.datetime_as_string(df['Date'].to_numpy(), unit='s'), '-0500')
+    if os.path.dirname(ruta):
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    df.reindex(columns=COLUMNAS_ACTIVIDAD).to_csv(ruta, index=False, float_format='%.2f')
+    return ruta
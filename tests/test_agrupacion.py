@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from decisiones_calendar import DecisionesCalendar
+from generar_actividad import ESTRATEGIAS, escribir_actividad_sintetica
+from log_diario import cargar_posicion
+from procesar_actividad import agrupar_trades, iterar_trades_actividad, leer_csv_actividad, \
+    procesar_archivos_actividad
+
+
+def _resumen(patas):
+    return [(pata['Date'], pata['Symbol'], pata['Action'], pata['Quantity'], pata['Order #']) for pata in patas]
+
+
+@pytest.mark.parametrize('chunksize', [37, 250, 100000])
+def test_streaming_coincide_con_agrupar_trades(chunksize):
+    ruta = escribir_actividad_sintetica('actividad.csv', filas=2000, semilla=3)
+
+    completo = agrupar_trades(leer_csv_actividad(ruta), decisiones_calendar=DecisionesCalendar('rechazar'))
+    por_bloques = dict(iterar_trades_actividad(ruta, chunksize, decisiones_calendar=DecisionesCalendar('rechazar')))
+
+    assert set(por_bloques) == set(completo)
+    for trade_id, patas in completo.items():
+        assert _resumen(por_bloques[trade_id]) == _resumen(patas)
+
+
+def test_streaming_rechaza_archivo_desordenado():
+    ruta = escribir_actividad_sintetica('actividad.csv', filas=500, semilla=4)
+    with open(ruta) as archivo:
+        encabezado, *lineas = archivo.readlines()
+    with open(ruta, 'w') as archivo:
+        archivo.writelines([encabezado] + lineas[len(lineas) // 2:] + lineas[:len(lineas) // 2])
+
+    with pytest.raises(ValueError):
+        list(iterar_trades_actividad(ruta, 50, decisiones_calendar=DecisionesCalendar('rechazar')))
+
+
+def _ingerir(base, workers, chunksize):
+    carpeta_csv = os.path.join(base, 'csv')
+    for semilla in range(3):
+        escribir_actividad_sintetica(os.path.join(carpeta_csv, f'actividad_{semilla}.csv'), filas=600,
+                                     semilla=semilla, fecha_inicio=f'2024-0{semilla + 1}-02 09:30')
+    carpeta_posiciones = os.path.join(base, 'activas')
+    os.makedirs(carpeta_posiciones)
+    procesar_archivos_actividad(carpeta_csv, os.path.join(base, 'procesados'), carpeta_posiciones,
+                                archivo_procesados=os.path.join(base, 'procesados.txt'), workers=workers,
+                                chunksize=chunksize, archivo_registro=os.path.join(base, 'registro.sqlite'),
+                                decisiones_calendar=DecisionesCalendar('rechazar'), carpeta_metricas=None,
+                                carpeta_cerradas=os.path.join(base, 'cerradas'))
+    resultado = {}
+    for carpeta in ('activas', 'cerradas'):
+        for nombre in sorted(os.listdir(os.path.join(base, carpeta))):
+            if nombre.endswith('.yaml'):
+                posicion = cargar_posicion(os.path.join(base, carpeta, nombre))
+                resultado[(carpeta, nombre)] = (posicion['estrategia'], len(posicion['patas']),
+                                                posicion.get('ganancia_perdida_neta'))
+    return resultado
+
+
+def test_workers_y_bloques_coinciden_con_serie():
+    serie = _ingerir('serie', None, None)
+
+    assert serie
+    assert _ingerir('workers', 2, None) == serie
+    assert _ingerir('bloques', None, 100) == serie
+
+
+def test_actividad_sintetica_cubre_todas_las_estrategias():
+    escribir_actividad_sintetica('data/csv/actividad/actividad.csv', filas=1500, semilla=8)
+    os.makedirs('data/yaml/posiciones_activas')
+    procesar_archivos_actividad(decisiones_calendar=DecisionesCalendar('aceptar'), carpeta_metricas=None)
+
+    estrategias = [cargar_posicion(os.path.join(carpeta, nombre))['estrategia']
+                   for carpeta in ('data/yaml/posiciones_activas', 'data/yaml/posiciones_cerradas')
+                   for nombre in os.listdir(carpeta) if nombre.endswith('.yaml')]
+    assert "Unknown" not in estrategias
+    assert set(estrategias) == set(ESTRATEGIAS)
@@ -0,0 +1,77 @@
+import sqlite3
+from datetime import date
+
+from cache_clasificacion import CacheClasificacion, clave_firma, firma_de_clave, version_reglas
+from clasificador import REGLAS, calcular_firma, clasificar_patas, registrar_regla
+
+VENCIMIENTO = date(2024, 4, 19)
+PATAS = [
+    {'tipo': 'PUT', 'strike': 450.0, 'vencimiento': VENCIMIENTO, 'cantidad': -1, 'accion': 'SELL_TO_OPEN'},
+    {'tipo': 'PUT', 'strike': 440.0, 'vencimiento': VENCIMIENTO, 'cantidad': 1, 'accion': 'BUY_TO_OPEN'},
+]
+
+
+def _versiones(ruta):
+    with sqlite3.connect(ruta) as conexion:
+        return sorted(version for version, in conexion.execute("SELECT DISTINCT version FROM clasificaciones"))
+
+
+def test_clave_de_firma_ida_y_vuelta():
+    firma = calcular_firma(PATAS, 120.0)
+
+    assert firma_de_clave(clave_firma(firma)) == firma
+
+
+def test_cache_persiste_entre_aperturas(tmp_path):
+    ruta = str(tmp_path / 'cache.sqlite')
+    with CacheClasificacion(ruta) as cache:
+        assert cache.clasificar_patas(PATAS, 120.0) == "Credit Put Spread"
+        assert cache.calculadas == 1
+
+    with CacheClasificacion(ruta) as cache:
+        assert cache.clasificar_patas(PATAS, 120.0) == "Credit Put Spread"
+        assert (cache.aciertos, cache.calculadas) == (1, 0)
+        # Otra firma (otro signo del total) se calcula
+        assert cache.clasificar_patas(PATAS, -120.0) == "Debit Put Spread"
+        assert cache.calculadas == 1
+
+
+def test_otra_version_descarta_las_clasificaciones(tmp_path):
+    ruta = str(tmp_path / 'cache.sqlite')
+    with CacheClasificacion(ruta, version='a') as cache:
+        cache.clasificar_patas(PATAS, 120.0)
+    assert _versiones(ruta) == ['a']
+
+    with CacheClasificacion(ruta, version='b') as cache:
+        assert cache.estrategias == {}
+        cache.clasificar_patas(PATAS, 120.0)
+        assert cache.calculadas == 1
+    assert _versiones(ruta) == ['b']
+
+
+def test_version_cambia_con_las_reglas():
+    version = version_reglas()
+
+    assert version_reglas() == version
+    assert version_reglas(list(reversed(REGLAS))) != version
+    assert version_reglas(REGLAS[:-1]) != version
+    assert version_reglas(REGLAS[:1] + [("1-1-2", lambda f: False)] + REGLAS[2:]) != version
+
+
+def test_registrar_regla_invalida_el_cache(tmp_path):
+    ruta = str(tmp_path / 'cache.sqlite')
+    with CacheClasificacion(ruta) as cache:
+        assert cache.clasificar_patas(PATAS, 120.0) == "Credit Put Spread"
+
+    reglas = list(REGLAS)
+    try:
+        registrar_regla("SpreadAngosto", lambda f: len(f.tipos) == 2 and f.n_strikes == 2, antes_de="Strangle")
+        with CacheClasificacion(ruta) as cache:
+            assert cache.clasificar_patas(PATAS, 120.0) == "SpreadAngosto"
+            assert (cache.aciertos, cache.calculadas) == (0, 1)
+    finally:
+        REGLAS[:] = reglas
+
+    with CacheClasificacion(ruta) as cache:
+        assert cache.clasificar_patas(PATAS, 120.0) == clasificar_patas(PATAS, 120.0) == "Credit Put Spread"
+        assert cache.calculadas == 1
@@ -0,0 +1,87 @@
+import glob
+import os
+
+import pytest
+
+from conftest import escribir_actividad, filas_orden
+from decisiones_calendar import DecisionesCalendar
+from log_diario import cargar_posicion
+from procesar_actividad import procesar_archivos_actividad
+
+CARPETA_ACTIVAS = 'data/yaml/posiciones_activas'
+CARPETA_CERRADAS = 'data/yaml/posiciones_cerradas'
+
+APERTURA = [('PUT', 450, '2024-04-19', -2, 3.00), ('PUT', 440, '2024-04-19', 2, 1.50)]
+CIERRE_PARCIAL = [('PUT', 450, '2024-04-19', 1, 2.00), ('PUT', 440, '2024-04-19', -1, 1.00)]
+CIERRE_RESTO = [('PUT', 450, '2024-04-19', 1, 1.20), ('PUT', 440, '2024-04-19', -1, 0.40)]
+ROLL_APERTURA = [('PUT', 445, '2024-05-17', -1, 3.50), ('PUT', 435, '2024-05-17', 1, 1.80)]
+ROLL_CIERRE = [('PUT', 445, '2024-05-17', 1, 0.50), ('PUT', 435, '2024-05-17', -1, 0.10)]
+
+
+def _ingerir(nombre, *ordenes):
+    escribir_actividad(os.path.join('data/csv/actividad', nombre), ordenes)
+    os.makedirs(CARPETA_ACTIVAS, exist_ok=True)
+    procesar_archivos_actividad(decisiones_calendar=DecisionesCalendar('rechazar'), carpeta_metricas=None)
+    return sorted(glob.glob(os.path.join(CARPETA_ACTIVAS, '*.yaml'))), \
+        sorted(glob.glob(os.path.join(CARPETA_CERRADAS, '*.yaml')))
+
+
+def _patas(posicion):
+    # Las patas abiertas, con fecha_cierre '' para poder ordenarlas junto con las cerradas
+    return sorted((float(pata['strike']), str(pata['vencimiento']), pata['cantidad'], pata['fecha_cierre'] or '')
+                  for pata in posicion['patas'])
+
+
+@pytest.fixture
+def spread_abierto():
+    activas, cerradas = _ingerir('1_apertura.csv', filas_orden(1, '2024-03-01 10:00:00', APERTURA))
+    assert len(activas) == 1 and cerradas == []
+    return activas[0]
+
+
+def test_cierre_parcial_parte_las_patas(spread_abierto):
+    activas, cerradas = _ingerir('2_cierre.csv', filas_orden(2, '2024-03-05 10:00:00', CIERRE_PARCIAL, False))
+
+    assert activas == [spread_abierto] and cerradas == []
+    posicion = cargar_posicion(spread_abierto)
+    assert posicion['cantidad_rolls'] == 0
+    assert _patas(posicion) == [
+        (440.0, '2024-04-19', 1, ''), (440.0, '2024-04-19', 1, '20240305'),
+        (450.0, '2024-04-19', -1, ''), (450.0, '2024-04-19', -1, '20240305'),
+    ]
+
+
+def test_roll_suma_patas_a_la_posicion(spread_abierto):
+    _ingerir('2_cierre.csv', filas_orden(2, '2024-03-05 10:00:00', CIERRE_PARCIAL, False))
+    activas, cerradas = _ingerir('3_roll.csv', filas_orden(3, '2024-03-10 10:00:00', CIERRE_RESTO, False),
+                                 filas_orden(3, '2024-03-10 10:00:00', ROLL_APERTURA))
+
+    assert activas == [spread_abierto] and cerradas == []
+    posicion = cargar_posicion(spread_abierto)
+    assert posicion['cantidad_rolls'] == 1
+    abiertas = [pata for pata in _patas(posicion) if not pata[3]]
+    assert abiertas == [(435.0, '2024-05-17', 1, ''), (445.0, '2024-05-17', -1, '')]
+    assert len(posicion['patas']) == 6
+
+
+def test_cierre_total_mueve_a_cerradas(spread_abierto):
+    _ingerir('2_cierre.csv', filas_orden(2, '2024-03-05 10:00:00', CIERRE_PARCIAL, False))
+    _ingerir('3_roll.csv', filas_orden(3, '2024-03-10 10:00:00', CIERRE_RESTO, False),
+             filas_orden(3, '2024-03-10 10:00:00', ROLL_APERTURA))
+    activas, cerradas = _ingerir('4_cierre.csv', filas_orden(4, '2024-03-20 10:00:00', ROLL_CIERRE, False))
+
+    assert activas == []
+    assert [os.path.basename(ruta) for ruta in cerradas] == [os.path.basename(spread_abierto)]
+    posicion = cargar_posicion(cerradas[0])
+    assert all(pata['fecha_cierre'] is not None for pata in posicion['patas'])
+    assert posicion['fecha_cierre'] == '20240320'
+    # Flujo neto de los cuatro trades (con comisiones y fees)
+    creditos = 2 * (300 - 150) - (200 - 100) - (120 - 40) + (350 - 180) - (50 - 10)
+    costos = 4 * 1.00 + 2 * 1.00 + (4 + 2 + 4 + 2) * 0.12
+    assert posicion['ganancia_perdida_neta'] == pytest.approx(creditos - costos)
+
+
+def test_cierre_sin_posicion_no_crea_nada():
+    activas, cerradas = _ingerir('cierre.csv', filas_orden(1, '2024-03-05 10:00:00', CIERRE_PARCIAL, False))
+
+    assert activas == [] and cerradas == []
@@ -0,0 +1,108 @@
+import random
+from datetime import date
+from math import gcd
+
+import pytest
+
+from clasificador import REGLAS, calcular_firma, clasificar_lote, clasificar_patas, es_candidato_calendar, \
+    registrar_regla
+from utils import es_1_1_2, es_broken_wing_butterfly, es_broken_wing_condor, es_butterfly, es_calendar_1_1_2, \
+    es_iron_condor, es_ratio_spread, es_strangle, identificar_spread
+
+CERCANO = date(2024, 4, 19)
+LEJANO = date(2024, 5, 17)
+
+
+def _pata(tipo, strike, cantidad, vencimiento=CERCANO):
+    return {'tipo': tipo, 'strike': float(strike), 'vencimiento': vencimiento, 'cantidad': cantidad,
+            'accion': 'SELL_TO_OPEN' if cantidad < 0 else 'BUY_TO_OPEN'}
+
+
+def _clasificar_como_antes(patas, total):
+    """
+    La cadena de predicados de utils que usaba construir_posicion antes de la tabla de reglas, sin el paso de
+    Calendar 1-1-2 (que ahora solo sale de DecisionesCalendar).
+    """
+    if len(patas) == 1 and patas[0]['tipo'] == 'PUT' and patas[0]['cantidad'] < 0:
+        return "NakedPut"
+    for estrategia, predicado in (("1-1-2", es_1_1_2), ("IronCondor", es_iron_condor), ("Strangle", es_strangle),
+                                  ("Butterfly", es_butterfly), ("BrokenWingButterfly", es_broken_wing_butterfly),
+                                  ("BrokenWingCondor", es_broken_wing_condor), ("RatioSpread", es_ratio_spread)):
+        if predicado(patas):
+            return estrategia
+    return identificar_spread(patas, total) or "Unknown"
+
+
+def _patas_al_azar(rng):
+    while True:
+        patas = [_pata(rng.choice(['PUT', 'CALL']), rng.choice([90, 95, 100, 105, 110, 120]),
+                       rng.choice([-2, -1, 1, 2]), rng.choice([CERCANO, LEJANO]))
+                 for _ in range(rng.randint(1, 4))]
+        # Posiciones de 1 lote (cantidades ya reducidas): ahí las reglas deben coincidir con los es_* de utils
+        divisor = 0
+        for pata in patas:
+            divisor = gcd(divisor, abs(pata['cantidad']))
+        if divisor == 1:
+            return patas
+
+
+def test_reglas_coinciden_con_predicados_de_utils():
+    rng = random.Random(7)
+    diferencias = []
+    for _ in range(20000):
+        patas = _patas_al_azar(rng)
+        total = rng.choice([-150.0, 0.0, 150.0])
+        esperada = _clasificar_como_antes(patas, total)
+        if clasificar_patas(patas, total) != esperada:
+            diferencias.append((patas, total, esperada))
+        if es_calendar_1_1_2(patas):
+            assert es_candidato_calendar(calcular_firma(patas, total))
+    assert diferencias == []
+
+
+@pytest.mark.parametrize('cantidades, estrategia', [
+    ((1, -1, -2), "1-1-2"),
+    ((2, -2, -2), "1-1-2"),
+    ((2, -2, -4), "Unknown"),
+])
+def test_1_1_2_usa_la_cantidad_neta_sin_reducir(cantidades, estrategia):
+    patas = [_pata('PUT', strike, cantidad) for strike, cantidad in zip((450, 440, 430), cantidades)]
+
+    assert clasificar_patas(patas, 100.0) == estrategia
+    assert (estrategia == "1-1-2") == es_1_1_2(patas)
+
+
+def test_calendar_no_sale_de_las_reglas():
+    patas = [_pata('PUT', 450, 1, LEJANO), _pata('PUT', 440, -1, LEJANO), _pata('PUT', 430, -2, CERCANO)]
+    firma = calcular_firma(patas, 100.0)
+
+    assert es_candidato_calendar(firma)
+    assert es_calendar_1_1_2(patas)
+    assert clasificar_patas(patas, 100.0) != "Calendar1-1-2"
+    assert all(estrategia != "Calendar1-1-2" for estrategia, _ in REGLAS)
+
+
+def test_candidato_calendar_requiere_cantidad_neta_de_menos_2():
+    patas = [_pata('PUT', 450, 2, LEJANO), _pata('PUT', 440, -2, LEJANO), _pata('PUT', 430, -4, CERCANO)]
+
+    assert not es_candidato_calendar(calcular_firma(patas))
+    assert not es_calendar_1_1_2(patas)
+
+
+def test_lote_coincide_con_clasificacion_individual():
+    rng = random.Random(11)
+    posiciones = [(_patas_al_azar(rng), rng.choice([-1.0, 1.0])) for _ in range(500)]
+
+    assert clasificar_lote(posiciones) == [clasificar_patas(patas, total) for patas, total in posiciones]
+
+
+def test_registrar_regla():
+    reglas = list(REGLAS)
+    try:
+        registrar_regla("CallSuelto", lambda f: f.tipos == ('CALL',) and f.ratios[0] < 0, antes_de="Strangle")
+        assert clasificar_patas([_pata('CALL', 480, -1)]) == "CallSuelto"
+        assert [estrategia for estrategia, _ in REGLAS].index("CallSuelto") == \
+            [estrategia for estrategia, _ in REGLAS].index("Strangle") - 1
+    finally:
+        REGLAS[:] = reglas
+    assert clasificar_patas([_pata('CALL', 480, -1)]) == "Unknown"
@@ -0,0 +1,164 @@
+import glob
+import os
+
+import pytest
+
+from almacen_posiciones import AlmacenSQLite
+from conftest import escribir_actividad, filas_orden
+from decisiones_calendar import DecisionesCalendar, leer_revision
+from log_diario import cargar_posicion
+from procesar_actividad import agrupar_trades, leer_csv_actividad, procesar_archivos_actividad, \
+    resolver_revision_calendars
+
+CARPETA_ACTIVAS = 'data/yaml/posiciones_activas'
+ARCHIVO_REVISION = 'data/revision_calendars.jsonl'
+
+# Orden 1: Calendar 1-1-2 de 1 lote (candidato); orden 2: la misma forma con 2 lotes (neto -4, no candidato);
+# orden 3: un 1-1-2 común
+CALENDAR = [('PUT', 450, '2024-05-17', 1, 9.00), ('PUT', 440, '2024-05-17', -1, 6.50),
+            ('PUT', 430, '2024-04-19', -2, 2.10)]
+CALENDAR_2_LOTES = [(tipo, strike, vencimiento, 2 * cantidad, precio)
+                    for tipo, strike, vencimiento, cantidad, precio in CALENDAR]
+UNO_UNO_DOS = [('PUT', 450, '2024-04-19', 1, 6.00), ('PUT', 440, '2024-04-19', -1, 3.50),
+               ('PUT', 430, '2024-04-19', -2, 2.10)]
+
+
+@pytest.fixture
+def actividad():
+    return escribir_actividad('data/csv/actividad/actividad.csv', [
+        filas_orden(1, '2024-03-01 10:00:00', CALENDAR),
+        filas_orden(2, '2024-03-01 11:00:00', CALENDAR_2_LOTES),
+        filas_orden(3, '2024-03-01 12:00:00', UNO_UNO_DOS),
+    ])
+
+
+def _estrategias(carpeta=CARPETA_ACTIVAS):
+    return sorted(cargar_posicion(ruta)['estrategia'] for ruta in glob.glob(os.path.join(carpeta, '*.yaml')))
+
+
+def _ingerir(decisiones_calendar, almacen=None):
+    os.makedirs(CARPETA_ACTIVAS, exist_ok=True)
+    metricas = procesar_archivos_actividad(decisiones_calendar=decisiones_calendar, almacen=almacen,
+                                           carpeta_metricas=None)
+    return _estrategias(), metricas.contadores
+
+
+def test_modo_desconocido():
+    with pytest.raises(ValueError):
+        DecisionesCalendar('quizas')
+
+
+@pytest.mark.parametrize('modo, decision', [('aceptar', True), ('rechazar', False)])
+def test_modos_sin_revision(actividad, modo, decision):
+    trades = agrupar_trades(leer_csv_actividad(actividad), decisiones_calendar=DecisionesCalendar(modo))
+
+    confirmados = [trade_id for trade_id, patas in trades.items() if patas[0].get('Calendar Confirmado')]
+    assert len(trades) == 3
+    assert len(confirmados) == (1 if decision else 0)
+    assert not os.path.exists(ARCHIVO_REVISION)
+
+
+def test_aceptar_crea_calendar_solo_para_el_candidato(actividad):
+    estrategias, contadores = _ingerir(DecisionesCalendar('aceptar'))
+
+    assert estrategias == ['1-1-2', 'Calendar1-1-2', 'Unknown']
+    assert contadores['candidatos_calendar'] == 1
+
+
+def test_rechazar_clasifica_con_las_reglas(actividad):
+    estrategias, contadores = _ingerir(DecisionesCalendar('rechazar'))
+
+    assert estrategias == ['1-1-2', 'Unknown', 'Unknown']
+    assert contadores['calendars_rechazados'] == 1
+
+
+def test_archivo_de_decisiones_y_criterio(actividad):
+    with open('decisiones.yaml', 'w') as archivo:
+        archivo.write('300000001: s\n')
+
+    decisiones = DecisionesCalendar('rechazar', archivo_decisiones='decisiones.yaml')
+    assert _ingerir(decisiones)[0] == ['1-1-2', 'Calendar1-1-2', 'Unknown']
+
+    trades = agrupar_trades(leer_csv_actividad('data/csv/actividad/procesados/actividad.csv'),
+                            decisiones_calendar=DecisionesCalendar('aceptar', criterio=lambda trade: False))
+    assert not any(patas[0].get('Calendar Confirmado') for patas in trades.values())
+
+
+def test_revisar_deja_el_candidato_en_la_cola_y_resolver_lo_crea(actividad, tmp_path):
+    almacen = AlmacenSQLite(str(tmp_path / 'posiciones.sqlite'))
+    estrategias, contadores = _ingerir(DecisionesCalendar('revisar'), almacen)
+
+    assert estrategias == ['1-1-2', 'Unknown']
+    assert contadores['calendars_en_revision'] == 1
+    pendientes = leer_revision(ARCHIVO_REVISION)
+    assert [item['ordenes'] for item in pendientes] == [[300000001]]
+
+    # Sin decisión sigue pendiente
+    assert resolver_revision_calendars(DecisionesCalendar('revisar'), almacen=almacen) == 0
+    assert len(leer_revision(ARCHIVO_REVISION)) == 1
+
+    with open('decisiones.yaml', 'w') as archivo:
+        archivo.write('300000001: s\n')
+    resueltos = resolver_revision_calendars(DecisionesCalendar('revisar', archivo_decisiones='decisiones.yaml'),
+                                            almacen=almacen)
+
+    assert resueltos == 1
+    assert leer_revision(ARCHIVO_REVISION) == []
+    assert _estrategias() == ['1-1-2', 'Calendar1-1-2', 'Unknown']
+    assert [posicion['estrategia'] for posicion in almacen.buscar(estrategia='Calendar1-1-2')] == ['Calendar1-1-2']
+
+
+def test_resolver_con_modo_rechazar(actividad):
+    _ingerir(DecisionesCalendar('revisar'))
+
+    assert resolver_revision_calendars(DecisionesCalendar('rechazar')) == 1
+    assert leer_revision(ARCHIVO_REVISION) == []
+    assert _estrategias() == ['1-1-2', 'Unknown', 'Unknown']
+
+
+def test_exports_solapados_con_workers_encolan_una_vez():
+    for nombre in ('actividad_1.csv', 'actividad_2.csv'):
+        escribir_actividad(os.path.join('data/csv/actividad', nombre), [
+            filas_orden(1, '2024-03-01 10:00:00', CALENDAR),
+            filas_orden(3, '2024-03-01 12:00:00', UNO_UNO_DOS),
+        ] + ([filas_orden(4, '2024-03-02 10:00:00', UNO_UNO_DOS)] if nombre == 'actividad_2.csv' else []))
+    os.makedirs(CARPETA_ACTIVAS, exist_ok=True)
+
+    procesar_archivos_actividad(workers=2, decisiones_calendar=DecisionesCalendar('revisar'), carpeta_metricas=None)
+
+    assert [item['ordenes'] for item in leer_revision(ARCHIVO_REVISION)] == [[300000001]]
+    assert resolver_revision_calendars(DecisionesCalendar('aceptar')) == 1
+    assert _estrategias() == ['1-1-2', '1-1-2', 'Calendar1-1-2']
+
+
+def test_cola_omite_trades_ya_encolados(actividad):
+    trades = agrupar_trades(leer_csv_actividad(actividad), decisiones_calendar=DecisionesCalendar('rechazar'))
+    decisiones = DecisionesCalendar('revisar')
+    candidato = [(trade_id, patas) for trade_id, patas in trades.items() if len(patas) == 3][:1]
+
+    assert decisiones.enviar_a_revision(candidato) == 1
+    assert decisiones.enviar_a_revision(candidato) == 0
+    assert len(leer_revision(ARCHIVO_REVISION)) == 1
+
+
+def test_resolver_respeta_la_cuenta_de_cada_trade(tmp_path):
+    for orden, cuenta in ((1, 'CUENTA1'), (5, 'CUENTA2')):
+        escribir_actividad(f'data/csv/actividad/tastytrade_transactions_history_{cuenta}_240301_to_240301.csv',
+                           [filas_orden(orden, f'2024-03-01 1{orden}:00:00', CALENDAR)])
+    os.makedirs(CARPETA_ACTIVAS, exist_ok=True)
+    procesar_archivos_actividad(decisiones_calendar=DecisionesCalendar('revisar'), carpeta_metricas=None,
+                                por_cuenta=True)
+    assert sorted(item['cuenta'] for item in leer_revision(ARCHIVO_REVISION)) == ['CUENTA1', 'CUENTA2']
+
+    almacen = AlmacenSQLite(str(tmp_path / 'posiciones.sqlite'))
+    assert resolver_revision_calendars(DecisionesCalendar('aceptar'), almacen=almacen, cuenta='CUENTA2') == 1
+    assert [item['cuenta'] for item in leer_revision(ARCHIVO_REVISION)] == ['CUENTA1']
+    assert _estrategias(os.path.join(CARPETA_ACTIVAS, 'CUENTA1')) == []
+    assert _estrategias(os.path.join(CARPETA_ACTIVAS, 'CUENTA2')) == ['Calendar1-1-2']
+
+    assert resolver_revision_calendars(DecisionesCalendar('aceptar'), almacen=almacen) == 1
+    assert _estrategias(os.path.join(CARPETA_ACTIVAS, 'CUENTA1')) == ['Calendar1-1-2']
+    assert _estrategias() == []
+    for cuenta in ('CUENTA1', 'CUENTA2'):
+        nombre, = os.listdir(os.path.join(CARPETA_ACTIVAS, cuenta))
+        assert almacen.cargar_archivo(f'{cuenta}/{nombre}')['estrategia'] == 'Calendar1-1-2'
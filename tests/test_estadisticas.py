@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from almacen_posiciones import AlmacenSQLite
+from archivos_yaml import escribir_yaml_atomico
+from estadisticas import cargar_tabla_posiciones
+
+CARPETA = 'data/yaml/posiciones_activas'
+
+
+def _pata(strike, cantidad, vencimiento='2024-04-19', fecha_cierre=None):
+    return {'tipo': 'PUT', 'strike': strike, 'vencimiento': vencimiento, 'cantidad': cantidad,
+            'fecha_cierre': fecha_cierre}
+
+
+def _posicion(id_posicion, patas, credito, fecha_cierre=None):
+    return {'id': id_posicion, 'subyacente': 'QQQ', 'estrategia': 'Credit Put Spread', 'fecha_inicio': '20240301',
+            'fecha_cierre': fecha_cierre, 'cantidad_rolls': 1, 'credito_debito_inicial': credito,
+            'credito_debito_actual': credito, 'patas': patas}
+
+
+# Spread 450/440 con un cierre parcial y un roll del resto a 445/435: abiertas solo -1 445 y +1 435
+ROLEADA = _posicion('roleada', [
+    _pata(450, -1, fecha_cierre='20240305'), _pata(440, 1, fecha_cierre='20240305'),
+    _pata(450, -1, fecha_cierre='20240310'), _pata(440, 1, fecha_cierre='20240310'),
+    _pata(445, -1, '2024-05-17'), _pata(435, 1, '2024-05-17'),
+], 150.0)
+SIMPLE = _posicion('simple', [_pata(445, -1, '2024-05-17'), _pata(435, 1, '2024-05-17')], 150.0)
+
+
+@pytest.mark.parametrize('desde_sqlite', [False, True])
+def test_capital_de_abiertas_usa_solo_patas_abiertas(tmp_path, desde_sqlite):
+    os.makedirs(CARPETA)
+    for posicion in (ROLEADA, SIMPLE):
+        escribir_yaml_atomico(os.path.join(CARPETA, f"{posicion['id']}.yaml"), posicion, sincronizar=False)
+    fuente = CARPETA
+    if desde_sqlite:
+        fuente = AlmacenSQLite(str(tmp_path / 'posiciones.sqlite'))
+        for posicion in (ROLEADA, SIMPLE):
+            fuente.guardar(f"{posicion['id']}.yaml", posicion)
+        fuente.confirmar()
+
+    capital = cargar_tabla_posiciones(fuente).set_index('id')['capital']
+
+    # Ancho de 10 por 100 de multiplicador, menos el crédito
+    assert capital['simple'] == pytest.approx(850.0)
+    assert capital['roleada'] == pytest.approx(850.0)
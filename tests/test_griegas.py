@@ -0,0 +1,88 @@
+import math
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from griegas import DIAS_ANIO, MotorGriegas, black_scholes
+
+
+def _opcion(es_call, spot=100.0, strike=100.0, anios=1.0, iv=0.2, tasa=0.05, futuro=False):
+    resultado = black_scholes(es_call, spot, strike, anios, iv, tasa, futuro)
+    return {clave: float(valor) for clave, valor in resultado.items()}
+
+
+def test_valores_de_referencia_black_scholes():
+    call = _opcion(True)
+    put = _opcion(False)
+
+    assert call['precio'] == pytest.approx(10.4506, abs=1e-3)
+    assert put['precio'] == pytest.approx(5.5735, abs=1e-3)
+    assert call['delta'] == pytest.approx(0.6368, abs=1e-3)
+    assert put['delta'] == pytest.approx(-0.3632, abs=1e-3)
+    assert call['vega'] == pytest.approx(0.3752, abs=1e-3)
+    assert call['theta'] == pytest.approx(-6.414 / DIAS_ANIO, abs=1e-4)
+
+
+@pytest.mark.parametrize('futuro', [False, True])
+def test_paridad_put_call(futuro):
+    spot, strike, anios, tasa = 95.0, 100.0, 0.5, 0.04
+    call = _opcion(True, spot, strike, anios, 0.3, tasa, futuro)
+    put = _opcion(False, spot, strike, anios, 0.3, tasa, futuro)
+
+    # Sobre acciones C - P = S - K e^(-rT); sobre futuros (Black-76) C - P = (F - K) e^(-rT)
+    esperado = (spot - strike) * math.exp(-tasa * anios) if futuro else spot - strike * math.exp(-tasa * anios)
+    assert call['precio'] - put['precio'] == pytest.approx(esperado, abs=1e-5)
+    assert call['delta'] - put['delta'] == pytest.approx(math.exp(-tasa * anios) if futuro else 1.0, abs=1e-6)
+
+
+@pytest.mark.parametrize('es_call', [True, False])
+@pytest.mark.parametrize('futuro', [False, True])
+def test_griegas_coinciden_con_diferencias_finitas(es_call, futuro):
+    h = 1e-3
+    base = _opcion(es_call, 103.0, 100.0, 0.25, 0.25, 0.045, futuro)
+
+    def precio(**cambios):
+        datos = dict(spot=103.0, strike=100.0, anios=0.25, iv=0.25, tasa=0.045, futuro=futuro)
+        datos.update(cambios)
+        return _opcion(es_call, **datos)['precio']
+
+    assert base['delta'] == pytest.approx((precio(spot=103.0 + h) - precio(spot=103.0 - h)) / (2 * h), abs=1e-4)
+    assert base['vega'] == pytest.approx((precio(iv=0.25 + h) - precio(iv=0.25 - h)) / (2 * h) / 100, abs=1e-4)
+    assert base['theta'] == pytest.approx(-(precio(anios=0.25 + h) - precio(anios=0.25 - h)) / (2 * h) / DIAS_ANIO,
+                                          abs=1e-4)
+    assert (0 <= base['delta'] <= 1) if es_call else (-1 <= base['delta'] <= 0)
+
+
+def test_vencidas_valen_su_intrinseco():
+    resultado = black_scholes(np.array([True, True, False, False]), 100.0, np.array([90.0, 110.0, 90.0, 110.0]),
+                              0.0, 0.2, 0.05, False)
+
+    assert resultado['precio'].tolist() == [10.0, 0.0, 0.0, 10.0]
+    assert resultado['delta'].tolist() == [1.0, 0.0, 0.0, -1.0]
+    assert resultado['theta'].tolist() == [0.0] * 4
+    assert resultado['vega'].tolist() == [0.0] * 4
+
+
+def test_motor_suma_patas_con_multiplicador_y_cantidad():
+    mercado = pd.DataFrame({'precio': [480.0], 'iv': [0.2], 'tasa': [0.045]},
+                           index=pd.Index(['QQQ'], name='subyacente'))
+    motor = MotorGriegas(mercado, fecha=date(2024, 3, 1))
+    vencimiento = date(2024, 4, 19)
+    posicion = {'subyacente': 'QQQ', 'credito_debito_actual': 150.0, 'patas': [
+        {'tipo': 'PUT', 'strike': 470.0, 'vencimiento': vencimiento, 'cantidad': -2, 'fecha_cierre': None},
+        {'tipo': 'PUT', 'strike': 460.0, 'vencimiento': vencimiento, 'cantidad': 2, 'fecha_cierre': None},
+        {'tipo': 'PUT', 'strike': 450.0, 'vencimiento': vencimiento, 'cantidad': 1, 'fecha_cierre': '20240215'},
+    ]}
+
+    resultado = motor.valuar_posiciones([posicion]).iloc[0]
+
+    anios = (vencimiento - date(2024, 3, 1)).days / DIAS_ANIO
+    corta = _opcion(False, 480.0, 470.0, anios, 0.2, 0.045)
+    larga = _opcion(False, 480.0, 460.0, anios, 0.2, 0.045)
+    for griega in ('delta', 'theta', 'vega'):
+        assert resultado[griega] == pytest.approx(200 * (larga[griega] - corta[griega]))
+    assert resultado['dte_cercano'] == (vencimiento - date(2024, 3, 1)).days
+    assert 0 < resultado['pop'] < 1
+    assert motor.calculadas == 2
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from archivos_yaml import escribir_yaml_atomico
+from indice_posiciones import IndicePosiciones
+from log_diario import agregar_entrada_diaria
+
+CARPETA = 'data/yaml/posiciones_activas'
+
+
+def _posicion(id_posicion, subyacente='QQQ', estrategia='NakedPut', vencimiento='2024-04-19'):
+    return {'id': id_posicion, 'fecha_inicio': '20240301', 'subyacente': subyacente, 'estrategia': estrategia,
+            'cantidad_rolls': 0, 'patas': [{'tipo': 'PUT', 'strike': 450.0, 'vencimiento': vencimiento,
+                                            'cantidad': -1, 'fecha_cierre': None}],
+            'log_diario': {'20240301': {'credito_debito': 300.0}}}
+
+
+def _escribir(nombre, posicion, carpeta=CARPETA):
+    os.makedirs(carpeta, exist_ok=True)
+    ruta = os.path.join(carpeta, nombre)
+    escribir_yaml_atomico(ruta, posicion, sincronizar=False)
+    return ruta
+
+
+@pytest.fixture
+def indice():
+    _escribir('QQQ_1.yaml', _posicion('1'))
+    _escribir('IWM_2.yaml', _posicion('2', 'IWM', 'Strangle', '2024-05-17'))
+    _escribir('QQQ_3.yaml', _posicion('3', estrategia='Strangle'), os.path.join(CARPETA, 'CUENTA1'))
+    return IndicePosiciones(CARPETA)
+
+
+def test_carga_inicial_con_particiones(indice):
+    assert len(indice) == 3
+    assert indice.contar(subyacente='QQQ') == 2
+    assert sorted(posicion['id'] for posicion in indice.buscar(estrategia='Strangle')) == ['2', '3']
+    assert indice.cargar('3')['subyacente'] == 'QQQ'
+    assert indice.refrescar() == 0
+
+
+def test_refresca_yaml_modificado(indice):
+    ruta = os.path.join(CARPETA, 'QQQ_1.yaml')
+    mtime = os.stat(ruta).st_mtime_ns
+    _escribir('QQQ_1.yaml', _posicion('1', estrategia='Credit Put Spread'))
+    # Mismo mtime, otro tamaño: alcanza con el tamaño para detectar el cambio
+    os.utime(ruta, ns=(mtime, mtime))
+
+    assert indice.refrescar() == 1
+    assert indice.contar(estrategia='NakedPut') == 0
+    assert indice.cargar('1')['estrategia'] == 'Credit Put Spread'
+
+
+def test_refresca_yaml_con_mismo_tamano_y_otro_mtime(indice):
+    ruta = os.path.join(CARPETA, 'IWM_2.yaml')
+    _escribir('IWM_2.yaml', _posicion('2', 'IWM', 'Strangle', '2024-06-21'))
+    estado = os.stat(ruta)
+    os.utime(ruta, ns=(estado.st_atime_ns, estado.st_mtime_ns + 10 ** 9))
+
+    assert indice.refrescar() == 1
+    assert indice.rutas(vencimiento_desde='2024-06-01') == [ruta]
+
+
+def test_refresca_diario(indice):
+    ruta = os.path.join(CARPETA, 'QQQ_1.yaml')
+    agregar_entrada_diaria(ruta, '20240305', {'credito_debito': 150.0}, sincronizar=False)
+
+    assert indice.refrescar() == 1
+    assert indice.cargar('1')['log_diario']['20240305'] == {'credito_debito': 150.0}
+    assert indice.refrescar() == 0
+
+
+def test_altas_y_bajas(indice):
+    os.remove(os.path.join(CARPETA, 'IWM_2.yaml'))
+    _escribir('QQQ_4.yaml', _posicion('4', vencimiento='2024-03-15'))
+
+    assert indice.refrescar() == 2
+    assert indice.cargar('2') is None
+    assert [posicion['id'] for posicion in indice.buscar(subyacente='QQQ', vencimiento_hasta='2024-03-31')] == ['4']
+    assert len(indice) == 3
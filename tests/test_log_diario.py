@@ -0,0 +1,57 @@
+import os
+
+import log_diario
+from archivos_yaml import cargar_yaml, escribir_yaml_atomico
+from log_diario import SUFIJO_COMPACTANDO, agregar_entrada_diaria, cargar_posicion, compactar_carpeta, \
+    compactar_diario, ruta_diario
+
+CARPETA = 'data/yaml/posiciones_activas'
+RUTA = os.path.join(CARPETA, 'QQQ_1.yaml')
+
+
+def _escribir_posicion():
+    os.makedirs(CARPETA, exist_ok=True)
+    escribir_yaml_atomico(RUTA, {'id': '1', 'log_diario': {'20240301': {'credito_debito': 300.0}}},
+                          sincronizar=False)
+
+
+def test_compactar_pasa_el_diario_al_yaml():
+    _escribir_posicion()
+    agregar_entrada_diaria(RUTA, '20240304', {'credito_debito': 250.0}, sincronizar=False)
+    agregar_entrada_diaria(RUTA, '20240305', {'credito_debito': 200.0}, sincronizar=False)
+
+    assert compactar_diario(RUTA) == 2
+    assert sorted(cargar_yaml(RUTA)['log_diario']) == ['20240301', '20240304', '20240305']
+    assert os.listdir(CARPETA) == ['QQQ_1.yaml']
+
+
+def test_entrada_agregada_durante_la_compactacion_no_se_pierde(monkeypatch):
+    _escribir_posicion()
+    agregar_entrada_diaria(RUTA, '20240304', {'credito_debito': 250.0}, sincronizar=False)
+    cargar_original = log_diario.cargar_yaml
+
+    def cargar_y_agregar(ruta):
+        # Una revaluación escribe entre la lectura del diario y el borrado
+        agregar_entrada_diaria(RUTA, '20240305', {'credito_debito': 200.0}, sincronizar=False)
+        return cargar_original(ruta)
+
+    with monkeypatch.context() as parche:
+        parche.setattr(log_diario, 'cargar_yaml', cargar_y_agregar)
+        assert compactar_diario(RUTA) == 1
+
+    assert sorted(cargar_yaml(RUTA)['log_diario']) == ['20240301', '20240304']
+    assert sorted(cargar_posicion(RUTA)['log_diario']) == ['20240301', '20240304', '20240305']
+    assert compactar_diario(RUTA) == 1
+    assert sorted(cargar_yaml(RUTA)['log_diario']) == ['20240301', '20240304', '20240305']
+
+
+def test_compactacion_cortada_se_retoma():
+    _escribir_posicion()
+    agregar_entrada_diaria(RUTA, '20240304', {'credito_debito': 250.0}, sincronizar=False)
+    os.replace(ruta_diario(RUTA), ruta_diario(RUTA) + SUFIJO_COMPACTANDO)
+    agregar_entrada_diaria(RUTA, '20240305', {'credito_debito': 200.0}, sincronizar=False)
+
+    assert sorted(cargar_posicion(RUTA)['log_diario']) == ['20240301', '20240304', '20240305']
+    assert compactar_carpeta(CARPETA) == 1
+    assert sorted(cargar_yaml(RUTA)['log_diario']) == ['20240301', '20240304', '20240305']
+    assert os.listdir(CARPETA) == ['QQQ_1.yaml']
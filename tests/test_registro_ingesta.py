@@ -0,0 +1,84 @@
+import os
+import shutil
+
+from decisiones_calendar import DecisionesCalendar
+from generar_actividad import generar_actividad
+from procesar_actividad import procesar_archivos_actividad
+from registro_ingesta import RegistroIngesta, hash_archivo
+
+CARPETA_CSV = 'data/csv/actividad'
+CARPETA_POSICIONES = 'data/yaml/posiciones_activas'
+
+
+def _ingerir():
+    os.makedirs(CARPETA_POSICIONES, exist_ok=True)
+    metricas = procesar_archivos_actividad(decisiones_calendar=DecisionesCalendar('rechazar'), carpeta_metricas=None,
+                                           carpeta_cerradas=None)
+    return sorted(nombre for nombre in os.listdir(CARPETA_POSICIONES) if nombre.endswith('.yaml')), metricas
+
+
+def _escribir(nombre, df):
+    os.makedirs(CARPETA_CSV, exist_ok=True)
+    ruta = os.path.join(CARPETA_CSV, nombre)
+    df.to_csv(ruta, index=False, float_format='%.2f')
+    return ruta
+
+
+def test_registro_de_archivos_y_claves(tmp_path):
+    ruta = _escribir('a.csv', generar_actividad(200, semilla=1))
+    with RegistroIngesta(str(tmp_path / 'registro.sqlite')) as registro:
+        hash_contenido = hash_archivo(ruta)
+        assert not registro.archivo_registrado(hash_contenido)
+        registro.agregar_claves(['k1', 'k2'], hash_contenido)
+        registro.registrar_archivo(hash_contenido, 'a.csv')
+
+    with RegistroIngesta(str(tmp_path / 'registro.sqlite')) as registro:
+        assert registro.archivo_registrado(hash_contenido)
+        assert registro.claves_existentes(['k2', 'k3'])
+        assert not registro.claves_existentes(['k3'])
+
+
+def test_mismo_contenido_con_otro_nombre_no_se_reingiere():
+    df = generar_actividad(400, semilla=2, fraccion_cierres=0)
+    _escribir('export_1.csv', df)
+    posiciones, _ = _ingerir()
+    assert posiciones
+
+    shutil.copy(os.path.join(CARPETA_CSV, 'procesados', 'export_1.csv'), os.path.join(CARPETA_CSV, 'copia.csv'))
+    posiciones_despues, metricas = _ingerir()
+
+    assert posiciones_despues == posiciones
+    assert metricas.contadores['archivos_duplicados'] == 1
+    assert os.path.exists(os.path.join(CARPETA_CSV, 'procesados', 'copia.csv'))
+
+
+def test_export_solapado_solo_ingiere_filas_nuevas(tmp_path):
+    df = generar_actividad(600, semilla=5, fraccion_cierres=0)
+    ordenes = df['Order #'].dropna().unique()
+    primeras = df[df['Order #'].isin(ordenes[len(ordenes) // 2:]) | df['Order #'].isna()]
+
+    # Referencia: el export completo ingerido de una vez
+    _escribir('completo.csv', df)
+    referencia, _ = _ingerir()
+    shutil.rmtree('data')
+
+    _escribir('parte_1.csv', primeras)
+    parciales, _ = _ingerir()
+    _escribir('parte_2.csv', df)
+    posiciones, metricas = _ingerir()
+
+    assert len(parciales) < len(referencia)
+    assert posiciones == referencia
+    assert metricas.contadores['filas_ya_ingeridas'] == len(primeras)
+
+
+def test_respeta_procesados_txt():
+    _escribir('viejo.csv', generar_actividad(200, semilla=6))
+    os.makedirs('data', exist_ok=True)
+    with open('data/procesados.txt', 'w') as archivo:
+        archivo.write('viejo.csv\n')
+
+    posiciones, _ = _ingerir()
+
+    assert posiciones == []
+    assert os.path.exists(os.path.join(CARPETA_CSV, 'viejo.csv'))